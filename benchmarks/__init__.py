@@ -0,0 +1,10 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Benchmarks for the CLEAN parser and Akoma Ntoso generator.
+#
+# Run them from the root of the repository with
+#
+#   python -m benchmarks --sections 5 -o results.json
+#
+# and compare two runs with
+#
+#   python -m benchmarks --sections 5 --compare results.json
@@ -0,0 +1,4 @@
+import sys
+from .bench import main
+
+sys.exit(main())
@@ -0,0 +1,127 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Time each stage of converting a synthetic act, and measure its memory.
+#
+# The stages are the ones generate_akn runs: addExplicitIndents, then
+# act.parseString, then generate_act. Each is timed on its own, given the
+# output of the stage before. Peak memory is measured by tracemalloc in a
+# separate run, because tracing slows the code it measures.
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import pyparsing
+from clean.clean import act, addExplicitIndents, generate_act, parse
+from .synthetic import synthetic_act
+
+def stages(text, fast=False):
+  """Return a (name, function, argument) triple for each stage of
+  converting text. With fast, add the hand-written parser's parse."""
+  indented = addExplicitIndents(text)
+  result = [
+    ("addExplicitIndents", addExplicitIndents, text),
+    ("act.parseString", act.parseString, indented),
+    ("generate_act", generate_act, act.parseString(indented)),
+  ]
+  if fast:
+    result.append(("parse", parse, text))
+  return result
+
+def peak_memory(function, argument):
+  """Return the most memory, in bytes, allocated while running function."""
+  tracemalloc.start()
+  try:
+    base = tracemalloc.get_traced_memory()[0]
+    function(argument)
+    return tracemalloc.get_traced_memory()[1] - base
+  finally:
+    tracemalloc.stop()
+
+def measure(text, repeat=3, fast=False):
+  """Return the times and peak memory of each stage of converting text."""
+  results = {}
+  for name, function, argument in stages(text, fast):
+    times = []
+    for _ in range(repeat):
+      start = time.perf_counter()
+      function(argument)
+      times.append(time.perf_counter() - start)
+    results[name] = {'seconds': times, 'best': min(times),
+      'median': statistics.median(times), 'peak memory': peak_memory(function, argument)}
+  return results
+
+def benchmark(repeat=3, fast=False, **options):
+  """Benchmark a synthetic act made with options, which are passed to
+  synthetic_act, and return the results as a dict that can be saved as
+  JSON."""
+  text = synthetic_act(**options)
+  return {
+    'time': datetime.now(timezone.utc).isoformat(),
+    'python': platform.python_version(),
+    'pyparsing': pyparsing.__version__,
+    'platform': platform.platform(),
+    'options': options,
+    'characters': len(text),
+    'lines': text.count("\n"),
+    'stages': measure(text, repeat, fast),
+  }
+
+def compare(old, new):
+  """Return lines comparing the stages of two benchmark results."""
+  lines = []
+  for name, stage in new['stages'].items():
+    if name not in old['stages']:
+      continue
+    before = old['stages'][name]
+    lines.append("%-20s %8.4fs -> %8.4fs (%5.2fx)  %10d -> %10d bytes (%5.2fx)" % (
+      name, before['best'], stage['best'], stage['best'] / before['best'],
+      before['peak memory'], stage['peak memory'],
+      stage['peak memory'] / max(before['peak memory'], 1)))
+  return lines
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="benchmarks",
+    description="Benchmark the conversion of a synthetic CLEAN act.")
+  parser.add_argument("--sections", type=int, default=5)
+  parser.add_argument("--depth", type=int, default=3,
+    help="levels of parts, from 1 (sections) to 4 (sub-paragraphs)")
+  parser.add_argument("--children", type=int, default=3,
+    help="the number of parts in each part below the top level")
+  parser.add_argument("--insert-density", type=float, default=0.1,
+    help="the chance that a part is followed by an inserted part")
+  parser.add_argument("--span-depth", type=int, default=1,
+    help="how deeply spans are nested in legal text")
+  parser.add_argument("--line-length", type=int, default=80)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--repeat", type=int, default=3,
+    help="the number of times to time each stage")
+  parser.add_argument("--fast", action="store_true",
+    help="also time the hand-written parser")
+  parser.add_argument("-o", "--output",
+    help="the file to write JSON results to (default: standard output)")
+  parser.add_argument("--compare",
+    help="a file of earlier results to compare these with")
+  args = parser.parse_args(argv)
+
+  results = benchmark(args.repeat, args.fast, sections=args.sections,
+    depth=args.depth, children=args.children, insert_density=args.insert_density,
+    span_depth=args.span_depth, line_length=args.line_length, seed=args.seed)
+  if args.output:
+    with open(args.output, "w") as file:
+      json.dump(results, file, indent=2)
+      file.write("\n")
+  else:
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+  if args.compare:
+    with open(args.compare) as file:
+      old = json.load(file)
+    if old['options'] != results['options']:
+      print("Warning: the acts were made with different options", file=sys.stderr)
+    for line in compare(old, results):
+      print(line, file=sys.stderr)
+  return 0
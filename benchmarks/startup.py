@@ -0,0 +1,99 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Measure how long clean takes to start: to import, and to convert a first
+# small act with each engine.
+#
+# A module is only imported once in a process, so each measurement runs
+# in a new Python process, as a short command-line call or a serverless
+# cold start would. Run it from the root of the repository with
+#
+#   python -m benchmarks.startup
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from importlib.util import find_spec
+from clean.clean import ENGINES
+
+# Run in the new process, with the engine as its argument. It prints the
+# times as JSON, along with whether pyparsing was imported.
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import clean.clean
+imported = time.perf_counter()
+imported_pyparsing = 'pyparsing' in sys.modules
+if sys.argv[1] != 'none':
+  clean.clean.generate_akn("Act\\n\\nHeading\\n1. Section\\n  (a) [s]{span}", engine=sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first conversion': done - imported,
+  'pyparsing at import': imported_pyparsing, 'pyparsing': 'pyparsing' in sys.modules}))
+"""
+
+def _environment():
+  # Let the new process import clean from where this one did.
+  root = os.path.dirname(os.path.dirname(find_spec("clean").origin))
+  environment = dict(os.environ)
+  environment["PYTHONPATH"] = os.pathsep.join(filter(None, [root, environment.get("PYTHONPATH")]))
+  return environment
+
+def run(engine="none", python_options=()):
+  """Run the script in a new process, and return what it printed, with
+  the time the whole process took."""
+  command = [sys.executable, *python_options, "-c", _SCRIPT, engine]
+  start = time.perf_counter()
+  completed = subprocess.run(command, env=_environment(), capture_output=True, text=True, check=True)
+  result = json.loads(completed.stdout.splitlines()[-1])
+  result['process'] = time.perf_counter() - start
+  result['stderr'] = completed.stderr
+  return result
+
+def import_times(count=10):
+  """Return the count modules that take longest to import with clean.clean,
+  as (module, seconds on its own, seconds with its imports), from
+  python -X importtime."""
+  times = []
+  for line in run(python_options=("-X", "importtime"))['stderr'].splitlines():
+    if not line.startswith("import time:") or "[us]" in line:
+      continue
+    own, cumulative, module = line[len("import time:"):].split("|")
+    times.append((module.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+  times.sort(key=lambda time: time[1], reverse=True)
+  return times[:count]
+
+def startup(repeat=5, engines=ENGINES):
+  """Return the best and median times to import clean.clean, and to convert
+  a first act with each engine, over repeat new processes each."""
+  results = {}
+  for engine in ("none",) + tuple(engines):
+    runs = [run(engine) for _ in range(repeat)]
+    name = "import only" if engine == "none" else engine
+    results[name] = {'pyparsing at import': runs[0]['pyparsing at import'],
+      'pyparsing': runs[0]['pyparsing']}
+    for key in ('import', 'first conversion', 'process'):
+      times = [r[key] for r in runs]
+      results[name][key] = {'best': min(times), 'median': statistics.median(times)}
+  return results
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="benchmarks.startup",
+    description="Measure how long clean takes to import and to convert a first act.")
+  parser.add_argument("--repeat", type=int, default=5,
+    help="the number of new processes to time for each engine")
+  parser.add_argument("--engine", action="append", choices=ENGINES,
+    help="an engine to time a first conversion with (default: all of them)")
+  parser.add_argument("--imports", type=int, default=10,
+    help="how many of the slowest imports to list")
+  args = parser.parse_args(argv)
+
+  results = {'startup': startup(args.repeat, args.engine or ENGINES),
+    'slowest imports': import_times(args.imports)}
+  json.dump(results, sys.stdout, indent=2)
+  sys.stdout.write("\n")
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,105 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# A generator of synthetic CLEAN acts, for benchmarks.
+#
+# The acts are made of headed sections, which contain sub-sections, then
+# paragraphs, then sub-paragraphs, as deep as the depth asked for. Parts
+# can be followed by inserted parts with insert indexes, and legal text can
+# contain nested spans.
+
+import random
+
+WORDS = ("the", "legal", "practitioner", "must", "not", "accept", "any",
+  "executive", "appointment", "in", "a", "business", "which", "is",
+  "prohibited", "by", "these", "rules", "or", "made", "under", "act;")
+
+def roman(number):
+  """Return number as a lowercase roman numeral."""
+  numerals = ""
+  for value, letters in ((1000, "m"), (900, "cm"), (500, "d"), (400, "cd"),
+      (100, "c"), (90, "xc"), (50, "l"), (40, "xl"), (10, "x"), (9, "ix"),
+      (5, "v"), (4, "iv"), (1, "i")):
+    while number >= value:
+      numerals += letters
+      number -= value
+  return numerals
+
+def letters(number):
+  """Return number as a paragraph index: a to z, then aa, ab, and so on."""
+  index = ""
+  while number > 0:
+    number, letter = divmod(number - 1, 26)
+    index = chr(ord('a') + letter) + index
+  return index
+
+# The index format and numbering of each level of a section.
+_LEVELS = (
+  ("%s.", str),
+  ("(%s)", str),
+  ("(%s)", letters),
+  ("(%s)", roman),
+)
+
+class _Generator:
+  def __init__(self, depth, children, insert_density, span_depth, line_length, seed):
+    self.depth = depth
+    self.children = children
+    self.insert_density = insert_density
+    self.span_depth = span_depth
+    self.line_length = line_length
+    self.random = random.Random(seed)
+    self.spans = 0
+
+  def words(self, length):
+    words = []
+    while length > 0:
+      word = self.random.choice(WORDS)
+      words.append(word)
+      length -= len(word) + 1
+    return words
+
+  def span(self, depth, length):
+    self.spans += 1
+    name = "term%d" % self.spans
+    words = self.words(length)
+    if depth > 1:
+      words.insert(len(words) // 2, self.span(depth - 1, length // 2))
+    return "[%s]{%s}" % (name, " ".join(words))
+
+  def text(self, length):
+    words = self.words(length)
+    if self.span_depth:
+      words.insert(len(words) // 2, self.span(self.span_depth, length // 4))
+    return " ".join(words)
+
+  def part(self, lines, level, index, indent):
+    lines.append(indent + _LEVELS[level][0] % index + " " + self.text(self.line_length - len(indent) - 6))
+    if level + 1 < self.depth:
+      self.parts(lines, level + 1, indent + "  ")
+
+  def parts(self, lines, level, indent):
+    numbering = _LEVELS[level][1]
+    for number in range(1, self.children + 1):
+      index = numbering(number)
+      self.part(lines, level, index, indent)
+      if self.random.random() < self.insert_density:
+        self.part(lines, level, index + ".1", indent)
+
+def synthetic_act(sections=100, depth=3, children=3, insert_density=0.1,
+    span_depth=1, line_length=80, seed=0):
+  """Return the text of a synthetic CLEAN act.
+
+  The act has the given number of top-level sections, each with a heading.
+  depth is how many levels of parts there are, from 1 for sections alone
+  to 4 for sections down to sub-paragraphs, and every part below the top
+  level has the given number of children. insert_density is the chance
+  that a part is followed by an inserted part. Legal text is about
+  line_length characters long, with spans nested span_depth deep in it."""
+  if not 1 <= depth <= len(_LEVELS):
+    raise ValueError("depth must be between 1 and " + str(len(_LEVELS)))
+  generator = _Generator(depth, children, insert_density, span_depth, line_length, seed)
+  lines = ["Synthetic Act"]
+  for number in range(1, sections + 1):
+    lines.append("")
+    lines.append("Heading " + " ".join(generator.words(20)))
+    generator.part(lines, 0, str(number), "")
+  return "\n".join(lines) + "\n"
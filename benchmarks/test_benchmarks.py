@@ -0,0 +1,33 @@
+import pytest
+from clean.clean import *
+from .synthetic import synthetic_act, roman, letters
+from .bench import benchmark, compare
+
+def test_numbering():
+    assert [roman(n) for n in (1, 4, 9, 14, 40)] == ['i', 'iv', 'ix', 'xiv', 'xl']
+    assert [letters(n) for n in (1, 26, 27)] == ['a', 'z', 'aa']
+
+@pytest.mark.parametrize("depth",[1,2,3,4])
+def test_synthetic_act_parses(depth):
+    text = synthetic_act(sections=2, depth=depth, children=2, insert_density=0.5,
+        span_depth=2, line_length=30)
+    parsed = parse(text)
+    assert [sec.index for sec in parsed.body] == ['1', '2']
+    assert generate_akn(text) == generate_act(parsed)
+
+def test_synthetic_act_depth():
+    with pytest.raises(ValueError):
+        synthetic_act(depth=5)
+
+def test_benchmark_results():
+    results = benchmark(repeat=1, fast=True, sections=1, depth=2, children=1, line_length=20)
+    assert list(results['stages']) == ["addExplicitIndents", "act.parseString", "generate_act", "parse"]
+    assert all(stage['peak memory'] > 0 for stage in results['stages'].values())
+    assert len(compare(results, results)) == 4
+
+def test_startup_imports_pyparsing_only_when_used():
+    from .startup import run
+    fast = run("fast")
+    assert not fast['pyparsing at import'] and not fast['pyparsing']
+    assert run("pyparsing")['pyparsing']
+    assert fast['import'] > 0 and fast['first conversion'] > 0
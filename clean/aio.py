@@ -0,0 +1,101 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# asyncio entry points, which convert documents in a process pool so that
+# a conversion never blocks the event loop.
+#
+#   akn = await generate_akn_async(text)
+#
+#   async for index, akn in generate_akn_many(texts, concurrency=8):
+#     ...
+#
+# generate_akn_many takes the next text only when one of its conversions
+# is done, so a slow consumer, or a source of texts larger than memory,
+# never has more than concurrency documents in flight.
+#
+# Cancelling a conversion that has not started yet removes it from the
+# pool. One that has already started runs to the end in its worker, but
+# its result is thrown away.
+
+import asyncio
+import os
+from collections import deque
+from .clean import generate_akn
+
+_executor = None
+
+def default_executor():
+  """The process pool that conversions use when they are not given one. It
+  is started the first time it is used, with a worker for each CPU."""
+  global _executor
+  if _executor is None:
+    from concurrent.futures import ProcessPoolExecutor
+    _executor = ProcessPoolExecutor()
+  return _executor
+
+def _submit(loop, executor, text, engine):
+  return loop.run_in_executor(executor or default_executor(), generate_akn, text, engine)
+
+async def generate_akn_async(text, engine="fast", executor=None):
+  """generate_akn, run in executor, a process pool by default."""
+  return await _submit(asyncio.get_running_loop(), executor, text, engine)
+
+async def _aiter(texts):
+  # Read texts, whether it is an iterable or an asynchronous iterable.
+  if hasattr(texts, '__aiter__'):
+    async for text in texts:
+      yield text
+  else:
+    for text in texts:
+      yield text
+
+async def _result(future, return_exceptions):
+  try:
+    return await future
+  except Exception as error:
+    if return_exceptions:
+      return error
+    raise
+
+async def generate_akn_many(texts, concurrency=None, engine="fast", ordered=True,
+    return_exceptions=False, executor=None):
+  """Convert each of texts, an iterable or asynchronous iterable, with at
+  most concurrency conversions running at once (by default, one for each
+  CPU). Yields (index, akn) for each text, in the order of texts, or with
+  ordered=False, as soon as each is done.
+
+  If a conversion fails, its exception is raised, and the rest are
+  cancelled, unless return_exceptions is true, when the exception is
+  yielded in place of the Akoma Ntoso. The conversions that are still
+  pending are also cancelled when the generator is closed early."""
+  loop = asyncio.get_running_loop()
+  concurrency = concurrency or os.cpu_count() or 1
+  source = _aiter(texts)
+  pending = deque() # (index, future), in the order of texts
+  count = 0
+  more = True
+  try:
+    while True:
+      while more and len(pending) < concurrency:
+        try:
+          text = await source.__anext__()
+        except StopAsyncIteration:
+          more = False
+        else:
+          pending.append((count, _submit(loop, executor, text, engine)))
+          count += 1
+      if not pending:
+        return
+      if ordered:
+        index, future = pending.popleft()
+        yield index, await _result(future, return_exceptions)
+      else:
+        await asyncio.wait([future for _, future in pending], return_when=asyncio.FIRST_COMPLETED)
+        for index, future in [item for item in pending if item[1].done()]:
+          pending.remove((index, future))
+          yield index, await _result(future, return_exceptions)
+  finally:
+    for _, future in pending:
+      if future.done() and not future.cancelled():
+        future.exception() # Its error, if any, is not reported.
+      else:
+        future.cancel()
+    await source.aclose()
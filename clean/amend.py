@@ -0,0 +1,227 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Amending a parsed act in place, with the insert indexes that CLEAN has
+# for the purpose: a part inserted after 3 is numbered 3.1, and one
+# inserted between 3.1 and 3.2 is numbered 3.1.1.
+#
+# Parts are named by their eIds, such as "sec_3__subsec_1__para_b". The
+# parts in each list of siblings are kept in an ordered index, keyed by
+# their number and insert indexes, so that (3, ()) < (3, (1,)) <
+# (3, (1, 1)) < (3, (2,)) < (4, ()). The index finds a part, or the place
+# for a new one, by bisection, and an amendment that would put the parts
+# out of order is refused.
+#
+# An AmendableAct keeps the Akoma Ntoso of each section, and an amendment
+# only generates the section it changed again.
+
+from bisect import bisect_left
+from .clean import write_act, write_cached_section
+from .fastparse import parse_legal_text
+from .nodes import Act, Section, SubSection, Paragraph, SubParagraph, LegalText
+from .walk import EID_PREFIXES
+
+_ROMAN = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100, 'd': 500, 'm': 1000}
+
+def roman_value(numeral):
+  """The value of a lowercase roman numeral."""
+  value = 0
+  for i, digit in enumerate(numeral):
+    if i + 1 < len(numeral) and _ROMAN[digit] < _ROMAN[numeral[i + 1]]:
+      value -= _ROMAN[digit]
+    else:
+      value += _ROMAN[digit]
+  return value
+
+def letters_value(letters):
+  """The value of a paragraph number: a to z are 1 to 26, aa is 27."""
+  value = 0
+  for letter in letters:
+    value = value * 26 + ord(letter) - ord('a') + 1
+  return value
+
+# How to read the number of each kind of part.
+_NUMBERS = {
+  Section: int,
+  SubSection: int,
+  Paragraph: letters_value,
+  SubParagraph: roman_value,
+}
+_PREFIXES = {prefix: cls for cls, prefix in EID_PREFIXES.items()}
+# The list of children of each kind that each kind of part holds.
+_CHILDREN = {
+  (Act, Section): 'body',
+  (Section, SubSection): 'sub_sections',
+  (Section, Paragraph): 'paragraphs',
+  (SubSection, Paragraph): 'paragraphs',
+  (Paragraph, SubParagraph): 'sub_paragraphs',
+}
+
+def index_key(index, cls):
+  """The sort key of the index of a part of a class: its number, and a
+  tuple of its insert numbers. "3.1" is (3, (1,)), and "b.2" (2, (2,))."""
+  number, *inserts = "".join(index.split()).split('.')
+  return _NUMBERS[cls](number), tuple(int(insert) for insert in inserts)
+
+def _eId_steps(eId):
+  # Split an eId into (class, index) steps.
+  steps = []
+  for step in eId.split("__"):
+    prefix, _, index = step.partition("_")
+    if prefix not in _PREFIXES or not index:
+      raise KeyError(eId)
+    steps.append((_PREFIXES[prefix], index.replace('_', '.')))
+  return steps
+
+class _Siblings:
+  # The ordered index of one list of parts.
+
+  def __init__(self, parent, name, cls):
+    self.parent = parent
+    self.name = name
+    self.cls = cls
+    self.parts = getattr(parent, name) or []
+    self.keys = [index_key(part.index, cls) for part in self.parts]
+    if any(a >= b for a, b in zip(self.keys, self.keys[1:])):
+      raise ValueError("The parts of %s are not in order" % name)
+
+  def find(self, key):
+    # The position of the part with key, or None.
+    i = bisect_left(self.keys, key)
+    return i if i < len(self.keys) and self.keys[i] == key else None
+
+  def insert(self, part, after=None):
+    key = index_key(part.index, self.cls)
+    i = bisect_left(self.keys, key)
+    if i < len(self.keys) and self.keys[i] == key:
+      raise ValueError("There is already a part numbered " + part.index)
+    if after is not None and i != after + 1:
+      raise ValueError("A part numbered %s can't follow %s" % (part.index, self.parts[after].index))
+    if not self.parts:
+      setattr(self.parent, self.name, self.parts)
+    self.parts.insert(i, part)
+    self.keys.insert(i, key)
+
+  def remove(self, i):
+    del self.parts[i]
+    del self.keys[i]
+    if not self.parts and self.name != 'body':
+      setattr(self.parent, self.name, None)
+
+def _has_wrapup(part):
+  # Whether the write_* functions write the post text of part, which they
+  # do only for parts with indented parts.
+  if isinstance(part, Section):
+    return part.sub_sections is not None or part.paragraphs is not None
+  if isinstance(part, SubSection):
+    return bool(part.paragraphs)
+  return bool(part.sub_paragraphs)
+
+class AmendableAct:
+  """An Act that can be amended in place: parts can be inserted after
+  others, repealed, and have their text replaced. akn() generates only the
+  sections that changed since it was last called."""
+
+  def __init__(self, act):
+    if not isinstance(act, Act):
+      act = Act.from_results(act)
+    act.body = list(act.body or [])
+    self.act = act
+    self._siblings = {} # (id of parent, list name) -> _Siblings
+    self._akn = {} # id of section -> (section, Akoma Ntoso)
+
+  def _children(self, parent, cls):
+    name = _CHILDREN.get((type(parent), cls))
+    if name is None:
+      raise ValueError("A %s can't hold a %s" % (type(parent).__name__, cls.__name__))
+    siblings = self._siblings.get((id(parent), name))
+    if siblings is None:
+      # A section holds sub-sections or paragraphs, but not both.
+      if isinstance(parent, Section) and getattr(parent, 'paragraphs' if name == 'sub_sections' else 'sub_sections'):
+        raise ValueError("A section can't hold both sub-sections and paragraphs")
+      siblings = self._siblings[(id(parent), name)] = _Siblings(parent, name, cls)
+    return siblings
+
+  def _find(self, eId):
+    # Return the section, the siblings and the position of the part with eId.
+    parent = self.act
+    for cls, index in _eId_steps(eId):
+      siblings = self._children(parent, cls)
+      i = siblings.find(index_key(index, cls))
+      if i is None:
+        raise KeyError(eId)
+      parent = siblings.parts[i]
+      if cls is Section:
+        section = parent
+    return section, siblings, i
+
+  def _changed(self, section):
+    # The section's source_hash no longer describes it, so section_cache
+    # must not be used for it either.
+    section.source_hash = None
+    self._akn.pop(id(section), None)
+
+  def part(self, eId):
+    """The part with eId. Raises KeyError if there is none."""
+    _, siblings, i = self._find(eId)
+    return siblings.parts[i]
+
+  def insert_after(self, eId, part):
+    """Insert part, of the same kind as the part with eId, just after it.
+    Its index must come between those of the part and the next one."""
+    section, siblings, i = self._find(eId)
+    if not isinstance(part, siblings.cls):
+      raise ValueError("Expected a %s, not a %s" % (siblings.cls.__name__, type(part).__name__))
+    siblings.insert(part, after=i)
+    if siblings.cls is not Section:
+      self._changed(section)
+
+  def insert(self, eId, part):
+    """Insert part among the children of the part with eId, or with eId
+    None, among the sections, in the place its index gives it."""
+    if eId is None:
+      self._children(self.act, type(part)).insert(part)
+      return
+    section, siblings, i = self._find(eId)
+    self._children(siblings.parts[i], type(part)).insert(part)
+    self._changed(section)
+
+  def repeal(self, eId):
+    """Remove the part with eId."""
+    section, siblings, i = self._find(eId)
+    part = siblings.parts[i]
+    siblings.remove(i)
+    if part is section:
+      self._akn.pop(id(section), None)
+    else:
+      self._changed(section)
+
+  def replace_text(self, eId, text, post=False):
+    """Replace the text of the part with eId, or with post, the text after
+    its indented parts. text is a LegalText, or a string of CLEAN legal
+    text, which can have spans."""
+    section, siblings, i = self._find(eId)
+    if not isinstance(text, LegalText):
+      text = parse_legal_text(text)
+    part = siblings.parts[i]
+    if post and isinstance(part, SubParagraph):
+      raise ValueError("Sub-paragraphs have no post text")
+    if post and not _has_wrapup(part):
+      raise ValueError("%s has no indented parts, so no post text" % eId)
+    setattr(part, 'post' if post else 'text', text)
+    self._changed(section)
+
+  def _write_section(self, section, write):
+    akn = self._akn.get(id(section))
+    if akn is None:
+      fragments = []
+      write_cached_section(section, fragments.append)
+      akn = "".join(fragments)
+      self._akn[id(section)] = (section, akn)
+    else:
+      akn = akn[1]
+    write(akn)
+
+  def akn(self):
+    """The Akoma Ntoso for the amended act, as generate_act would return it."""
+    fragments = []
+    write_act(self.act, fragments.append, self._write_section)
+    return "".join(fragments)
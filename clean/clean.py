@@ -2,287 +2,831 @@
 # This library includes a parser for CLEAN-formatted plain-text
 # legal documents, and functions to generate Akoma Ntoso versions
 # of the documents expressed in that language.
+#
+# Importing this module does as little as it can: pyparsing is imported,
+# and the grammar built, the first time the pyparsing grammar is used. The
+# hand-written parser needs neither.
 
-from pyparsing import *
-import string
+from types import SimpleNamespace
+from collections import OrderedDict
+from .fastparse import parse_act, parse_stream, parse_title_line, split_pieces, parse_piece, piece_start, scan_legal_text
+from .profiling import Profile
+from .nodes import Act, Section, SubSection, Paragraph, SubParagraph, Span, LegalText
+from .walk import part_eId, span_eId
 
-ParserElement.setDefaultWhitespaceChars(' \t')
 # Define terms for parser
 OPEN = "("
 CLOSE = ")"
 DOT = "."
-NL = Suppress(Literal('\n'))
-BLANK_LINE = line_start + NL
-UP = NL + "INDENT"
-DOWN = NL + "UNDENT"
-SPANNAME_START = Suppress("[")
-SPANNAME_STOP = Suppress("]")
-SPAN_START = Suppress("{")
-SPAN_STOP = Suppress("}")
 lowercase_roman_numerals = ['i','v','x','l','c','d','m']
+# The size of the packrat cache used by the fast grammar.
+PACKRAT_CACHE_SIZE = 128
+# The number of sections whose Akoma Ntoso is kept in section_cache.
+SECTION_CACHE_SIZE = 1024
+# Part of the section_cache keys. Change it when the generated Akoma Ntoso
+# changes, so that output from the older generator is never reused.
+GENERATOR_VERSION = "2"
+# Part of the tree_cache keys. Change it when the parsers read any document
+# into a different tree, so that trees from older parsers are never reused.
+GRAMMAR_VERSION = "1"
 
-text_line = Combine(OneOrMore(Word(printables)),adjacent=False,join_string=" ")
-# text_block = Combine(OneOrMore(text_line),adjacent=False,join_string=" ") + BLANK_LINE
-
-# Parser elements for lowercase roman numerals
-rn_thousands = ZeroOrMore(Literal('m'))
-rn_hundreds_cm = Literal('c') + Literal('m')
-rn_hundreds_c = Literal('c') * (0,3)
-rn_hundreds_cd = Literal('c') + Literal('d')
-rn_hundreds_d = Literal('d')
-rn_hundreds = rn_hundreds_cm ^ rn_hundreds_c ^ rn_hundreds_cd ^ rn_hundreds_d
-rn_tens_x = Literal('x') * (0,3)
-rn_tens_xc = Literal('x') + Literal('c')
-rn_tens_xd = Literal('x') + Literal('d')
-rn_tens_d = Literal('d') + rn_tens_x
-rn_tens = rn_tens_x ^ rn_tens_xc ^ rn_tens_xd ^ rn_tens_d
-rn_ones_i = Literal('i') * (0,3)
-rn_ones_iv = Literal('i') + Literal('v')
-rn_ones_v = Literal('v') + rn_ones_i 
-rn_ones_ix = Literal('i') + Literal('x')
-rn_ones = rn_ones_i ^ rn_ones_iv ^ rn_ones_v ^ rn_ones_ix
-rn = rn_thousands + rn_hundreds + rn_tens + rn_ones
-
-lowercase_roman_number = Word(lowercase_roman_numerals)
-
-# Parser elements for CLEAN
-number = Word(nums) 
-insert_index = Forward()
-insert_index <<= Group(Suppress(DOT) + number("insert number")) + Optional(insert_index)
-paragraph_index = NL + Suppress(OPEN) + original_text_for(Word(string.ascii_lowercase)('paragraph number') + Optional(insert_index)('insert index')) + Suppress(CLOSE)
-section_index = NL + original_text_for(number("section number") + Optional(insert_index)('insert index')) + Suppress(DOT)
-sub_paragraph_index =  NL + Suppress(OPEN) + original_text_for(lowercase_roman_number('sub-paragraph number') + Optional(insert_index)('insert index')) + Suppress(CLOSE)
-sub_section_index = NL + Suppress(OPEN) + original_text_for(number('sub-section number') + Optional(insert_index)('insert index')) + Suppress(CLOSE)
-sub_paragraph = Forward()
-paragraph = Forward()
-sub_section = Forward()
-section = Forward()
-numbered_part = sub_paragraph_index ^ paragraph_index ^ sub_section_index ^ section_index ^ DOWN ^ UP ^ BLANK_LINE
-span_name = SPANNAME_START + Word(alphanums) + SPANNAME_STOP
-span = Forward()
-span <<= Group(Opt(NL) + span_name)('span name') + SPAN_START + Group(ZeroOrMore(Group(span) ^ Combine(OneOrMore((Opt(NL) + Word(printables,exclude_chars="[}"))),join_string=" ",adjacent=False)))('span body') + SPAN_STOP
-# legal_text = Combine(ZeroOrMore( span ^ NL ^ Word(printables), stop_on=numbered_part), adjacent=False, join_string=" ")
-legal_text = \
-  ZeroOrMore( \
-    Group(span) \
-    ^ \
-    Combine(\
-      OneOrMore(\
-        (Opt(NL) + Word(printables)),
-        stop_on=span ^ numbered_part\
-      ), 
-      adjacent=False, 
-      join_string=" "\
-    ),
-    stop_on=numbered_part\
-  )
-# legal_text.set_whitespace_chars(' \t')
-heading = NL + NL + Combine(Word(string.ascii_uppercase, printables) + ZeroOrMore(Word(printables), stop_on=numbered_part), adjacent=False, join_string=" ")('heading text')
-title = lineStart + Combine(Word(string.ascii_uppercase, printables) + ZeroOrMore(Word(printables), stop_on=numbered_part), adjacent=False, join_string=" ")('title text')
-sub_paragraph <<= sub_paragraph_index('sub-paragraph index') + legal_text('sub-paragraph text')
-sub_paragraph_list = OneOrMore(Group(sub_paragraph))
-paragraph <<= \
-  paragraph_index('paragraph index') + \
-  legal_text('paragraph text') + \
-  Optional(
-    (Suppress(UP) + \
-    sub_paragraph_list + \
-    Suppress(DOWN))('sub-paragraphs') + \
-    Optional(legal_text('paragraph post'))
-  )  
-paragraph_list = OneOrMore(Group(paragraph))
-sub_section <<= Optional(heading)('sub-section header') + sub_section_index('sub-section index') + legal_text('sub-section text') + Optional( \
-    (Suppress(UP) + \
-    paragraph_list + \
-    Suppress(DOWN))('paragraphs') + \
-    Optional(legal_text('sub-section post'))
-    )
-sub_section_list = OneOrMore(Group(sub_section))
-empty_section = Optional(heading)('section header') + \
-    section_index('section index') + \
-    Suppress(UP) + \
-    sub_section_list('sub-sections') + \
-    Suppress(DOWN)
-full_section = Optional(heading)('section header') + \
-    section_index('section index') + \
-    legal_text('section text') + \
-    Optional( 
-    (Suppress(UP) + \
-    (sub_section_list('sub-sections') ^ paragraph_list('paragraphs')) + \
-    Suppress(DOWN)) + \
-    Optional(legal_text('section post'))
-    )
-section <<= full_section ^ empty_section
-# Only for sections, the initial text is optional. if it is missing,
-# there can be no post text.
-act = title('title') + (FollowedBy(heading) | NL) + ZeroOrMore(Group(section))('body') + ZeroOrMore(NL)
+def build_grammar(fast=False, watch=None):
+  """Build the parser elements for CLEAN, and return them in a namespace.
+
+  With fast=True, the alternatives where the leading token already decides
+  the branch use first match (|) instead of longest match (^). The result
+  of a parse is the same either way.
+
+  watch, if given, is called with the name and element of each named
+  element, before any copies are made of it, so that it can set debug
+  actions that the copies share."""
+  from pyparsing import ParserElement
+  # Newlines are significant in CLEAN, so only spaces and tabs are
+  # whitespace. Elements take the default when they are made, so it is
+  # restored afterwards for other users of pyparsing.
+  whitespace = ParserElement.DEFAULT_WHITE_CHARS
+  ParserElement.set_default_whitespace_chars(' \t')
+  try:
+    return _grammar(fast, watch)
+  finally:
+    ParserElement.set_default_whitespace_chars(whitespace)
+
+def _grammar(fast, watch):
+  import string
+  from pyparsing import (Combine, FollowedBy, Forward, Group, LineStart, Literal,
+    MatchFirst, OneOrMore, Opt, Optional, Or, ParserElement, ParseResults, Suppress,
+    Token, Word, ZeroOrMore, alphanums, nums, original_text_for, printables)
+  either = MatchFirst if fast else Or
+  watched = set()
+
+  def watch_elements(elements):
+    if watch is not None:
+      for name, element in list(elements.items()):
+        if isinstance(element, ParserElement) and id(element) not in watched:
+          watched.add(id(element))
+          watch(name, element)
+
+  NL = Suppress(Literal('\n'))
+  BLANK_LINE = LineStart() + NL
+  UP = NL + "INDENT"
+  DOWN = NL + "UNDENT"
+  SPANNAME_START = Suppress("[")
+  SPANNAME_STOP = Suppress("]")
+  SPAN_START = Suppress("{")
+  SPAN_STOP = Suppress("}")
+
+  text_line = Combine(OneOrMore(Word(printables)),adjacent=False,join_string=" ")
+  # text_block = Combine(OneOrMore(text_line),adjacent=False,join_string=" ") + BLANK_LINE
+
+  lowercase_roman_number = Word(lowercase_roman_numerals)
+
+  # Parser elements for CLEAN
+  number = Word(nums) 
+  insert_index = Forward()
+  insert_index <<= Group(Suppress(DOT) + number("insert number")) + Optional(insert_index)
+  paragraph_index = NL + Suppress(OPEN) + original_text_for(Word(string.ascii_lowercase)('paragraph number') + Optional(insert_index)('insert index')) + Suppress(CLOSE)
+  section_index = NL + original_text_for(number("section number") + Optional(insert_index)('insert index')) + Suppress(DOT)
+  sub_paragraph_index =  NL + Suppress(OPEN) + original_text_for(lowercase_roman_number('sub-paragraph number') + Optional(insert_index)('insert index')) + Suppress(CLOSE)
+  sub_section_index = NL + Suppress(OPEN) + original_text_for(number('sub-section number') + Optional(insert_index)('insert index')) + Suppress(CLOSE)
+  sub_paragraph = Forward()
+  paragraph = Forward()
+  sub_section = Forward()
+  section = Forward()
+  numbered_part = either([sub_paragraph_index, paragraph_index, sub_section_index, section_index, DOWN, UP, BLANK_LINE])
+  span_name = SPANNAME_START + Word(alphanums) + SPANNAME_STOP
+  span = Forward()
+  span <<= Group(Opt(NL) + span_name)('span name') + SPAN_START + Group(ZeroOrMore(either([Group(span), Combine(OneOrMore((Opt(NL) + Word(printables,exclude_chars="[}"))),join_string=" ",adjacent=False)])))('span body') + SPAN_STOP
+  # legal_text reads what this would, with the same results:
+  #
+  #   ZeroOrMore(either([Group(span), Combine(OneOrMore(Opt(NL) + Word(printables),
+  #     stop_on=either([span, numbered_part])), adjacent=False, join_string=" ")]),
+  #     stop_on=numbered_part)
+  #
+  # but with scan_legal_text, which reads a line without spans at once,
+  # instead of trying span and numbered_part before every word.
+  def text_results(text):
+    tokens = ParseResults([])
+    for element in text:
+      if type(element) == str:
+        tokens += ParseResults([element])
+      else:
+        span_results = ParseResults([ParseResults([element.name])], name='span name')
+        span_results += ParseResults([text_results(element.body)], name='span body')
+        tokens += ParseResults([span_results])
+    return tokens
+
+  class LegalTextScanner(Token):
+    def __init__(self):
+      super().__init__()
+      # The scanner reads the whitespace itself, so that it can tell
+      # whether the text starts on a blank line.
+      self.skipWhitespace = False
+      self.mayReturnEmpty = True
+      self.mayIndexError = False
+      self.saveAsList = True
+
+    def _generateDefaultName(self):
+      return "legal_text"
+
+    def parseImpl(self, instring, loc, do_actions=True):
+      text, loc = scan_legal_text(instring, loc)
+      if not text:
+        return loc, ParseResults([], name=self.resultsName)
+      return loc, text_results(text)
+
+  legal_text = LegalTextScanner()
+  heading = NL + NL + Combine(Word(string.ascii_uppercase, printables) + ZeroOrMore(Word(printables), stop_on=numbered_part), adjacent=False, join_string=" ")('heading text')
+  title = LineStart() + Combine(Word(string.ascii_uppercase, printables) + ZeroOrMore(Word(printables), stop_on=numbered_part), adjacent=False, join_string=" ")('title text')
+  # The parts below use copies of the elements above, with results names.
+  watch_elements(locals())
+  sub_paragraph <<= sub_paragraph_index('sub-paragraph index') + legal_text('sub-paragraph text')
+  sub_paragraph_list = OneOrMore(Group(sub_paragraph))
+  paragraph <<= \
+    paragraph_index('paragraph index') + \
+    legal_text('paragraph text') + \
+    Optional(
+      (Suppress(UP) + \
+      sub_paragraph_list + \
+      Suppress(DOWN))('sub-paragraphs') + \
+      Optional(legal_text('paragraph post'))
+    )  
+  paragraph_list = OneOrMore(Group(paragraph))
+  sub_section <<= Optional(heading)('sub-section header') + sub_section_index('sub-section index') + legal_text('sub-section text') + Optional( \
+      (Suppress(UP) + \
+      paragraph_list + \
+      Suppress(DOWN))('paragraphs') + \
+      Optional(legal_text('sub-section post'))
+      )
+  sub_section_list = OneOrMore(Group(sub_section))
+  empty_section = Optional(heading)('section header') + \
+      section_index('section index') + \
+      Suppress(UP) + \
+      sub_section_list('sub-sections') + \
+      Suppress(DOWN)
+  full_section = Optional(heading)('section header') + \
+      section_index('section index') + \
+      legal_text('section text') + \
+      Optional( 
+      (Suppress(UP) + \
+      either([sub_section_list('sub-sections'), paragraph_list('paragraphs')]) + \
+      Suppress(DOWN)) + \
+      Optional(legal_text('section post'))
+      )
+  section <<= either([full_section, empty_section])
+  # Only for sections, the initial text is optional. if it is missing,
+  # there can be no post text.
+  act = title('title') + (FollowedBy(heading) | NL) + ZeroOrMore(Group(section))('body') + ZeroOrMore(NL)
+  watch_elements(locals())
+
+  return SimpleNamespace(**{name: element for name, element in locals().items() if isinstance(element, ParserElement)})
+
+class Parser:
+  """The pyparsing grammar for CLEAN, built the first time it is used. Its
+  elements are attributes, named as in build_grammar: parser.act,
+  parser.section and so on.
+
+  With fast=True, it is the fast grammar; see fast_grammar."""
+
+  def __init__(self, fast=False):
+    self.fast = fast
+    self._grammar = None
+
+  @property
+  def grammar(self):
+    """The namespace of parser elements, built if it has not been yet."""
+    if self._grammar is None:
+      if self.fast:
+        from pyparsing import ParserElement
+        ParserElement.enable_packrat(cache_size_limit=PACKRAT_CACHE_SIZE)
+      self._grammar = build_grammar(fast=self.fast)
+    return self._grammar
+
+  @property
+  def built(self):
+    """Whether the grammar has been built yet."""
+    return self._grammar is not None
+
+  def __getattr__(self, name):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    return getattr(self.grammar, name)
+
+  def parse_string(self, text):
+    """Parse text, with explicit indents, as an act."""
+    return self.grammar.act.parseString(text)
+
+# The default grammar, whose elements are also available as module-level
+# names: clean.clean.act is parser.act.
+parser = Parser()
+_fast_parser = Parser(fast=True)
+
+def fast_grammar():
+  """Return the fast grammar, building it the first time it is used.
+
+  Using the fast grammar turns on pyparsing's packrat cache, bounded to
+  PACKRAT_CACHE_SIZE entries. The cache is process-wide."""
+  _fast_parser.grammar # Build it now, which turns on the cache.
+  return _fast_parser
+
+def grammar_cache_stats():
+  """Return the packrat cache hits and misses for the most recent parse."""
+  from pyparsing import ParserElement
+  hits, misses = ParserElement.packrat_cache_stats
+  return {'hits': hits, 'misses': misses}
+
+# The names of the elements of the grammar, which build_grammar returns.
+GRAMMAR_NAMES = frozenset(('BLANK_LINE', 'DOWN', 'NL', 'SPANNAME_START', 'SPANNAME_STOP',
+  'SPAN_START', 'SPAN_STOP', 'UP', 'act', 'empty_section', 'full_section', 'heading',
+  'insert_index', 'legal_text', 'lowercase_roman_number', 'number', 'numbered_part',
+  'paragraph', 'paragraph_index', 'paragraph_list', 'section', 'section_index', 'span',
+  'span_name', 'sub_paragraph', 'sub_paragraph_index', 'sub_paragraph_list', 'sub_section',
+  'sub_section_index', 'sub_section_list', 'text_line', 'title'))
+
+def __getattr__(name):
+  # The pyparsing names that this module used to export with "from
+  # pyparsing import *", such as ParseException, are looked up in pyparsing
+  # when they are first used, which imports it. The grammar's elements are
+  # looked up in parser, which builds it, so only they do that.
+  if name == '__all__':
+    import pyparsing
+    names = list(globals()) + sorted(GRAMMAR_NAMES) + pyparsing.__all__
+    return [n for n in names if not n.startswith('_')]
+  if name.startswith('_'):
+    raise AttributeError(name)
+  import pyparsing
+  if name in pyparsing.__all__:
+    return getattr(pyparsing, name)
+  if name in GRAMMAR_NAMES:
+    return getattr(parser.grammar, name)
+  raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+# The write_* functions emit Akoma Ntoso for the typed nodes in nodes.py
+# a fragment at a time, by calling write with each piece of text. The
+# generate_* functions collect those fragments into a string, and also
+# accept ParseResults from the pyparsing grammar.
+
+def _collect(writer, cls, node, *args):
+  if not isinstance(node, cls):
+    node = cls.from_results(node)
+  output = []
+  writer(node, output.append, *args)
+  return "".join(output)
+
+def escape(text):
+  """Escape &, < and > in text for XML."""
+  if '&' in text or '<' in text or '>' in text:
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+  return text
+
+# mark, if given, is called with the eId of each element that has one just
+# before the element is written, and with None just after it, so that
+# sidecar.OffsetWriter can index the output.
+
+def write_span(node, write, prefix="", mark=None):
+  eId = span_eId(node.name, prefix)
+  # The spaces around a span are written separately only when it is
+  # marked, because spans are common enough for the extra writes to show.
+  if mark is None:
+    write(' <span eId="' + eId + '">')
+  else:
+    write(" ")
+    mark(eId)
+    write('<span eId="' + eId + '">')
+  write_legal_text(node.body, write, prefix + node.name, mark)
+  if mark is None:
+    write("</span> ")
+  else:
+    write("</span>")
+    mark(None)
+    write(" ")
 
 def generate_span(node, prefix=""):
-  output = ' <span eId="' + prefix + ("__span_" if prefix else "") + node['span name'][0] + '">'
-  output += generate_legal_text(node['span body'],prefix + node['span name'][0])
-  output += "</span> "
-  return output
+  return _collect(write_span, Span, node, prefix)
 
-def generate_legal_text(node, prefix=""):
-  output = ""
+def write_legal_text(node, write, prefix="", mark=None):
   for element in node:
-    if type(element) == str:
-      output += element
-    else: # the only other option is a span
-      output += generate_span(element,prefix)
-  return output
+    if type(element) is str:
+      # Checked here, rather than in escape, as most strings have none.
+      if '&' in element or '<' in element or '>' in element:
+        element = escape(element)
+      write(element)
+    elif mark is None: # the only other option is a span
+      # Written here, rather than by write_span, as spans are common
+      # enough for the extra call to show.
+      eId = span_eId(element.name, prefix)
+      write(' <span eId="' + eId + '">')
+      write_legal_text(element.body, write, prefix + element.name)
+      write("</span> ")
+    else:
+      write_span(element, write, prefix, mark)
+
+def generate_legal_text(node, prefix=""):
+  return _collect(write_legal_text, LegalText, node, prefix)
+
+def write_sub_paragraph(node, write, prefix="", mark=None):
+  eId = part_eId(node, prefix)
+  if mark is not None:
+    mark(eId)
+  write("<subParagraph eId=\"" + eId + "\"><num>" + node.index + "</num><content><p>")
+  write_legal_text(node.text, write, eId, mark)
+  write("</p></content></subParagraph>")
+  if mark is not None:
+    mark(None)
 
 def generate_sub_paragraph(node, prefix=""):
-  eId = prefix + "__subpara_" + node['sub-paragraph index'][0].replace('.','_')
-  output = "<subParagraph eId=\"" + eId + "\"><num>"
-  output += node['sub-paragraph index'][0]
-  output += "</num><content><p>"
-  output += generate_legal_text(node['sub-paragraph text'],eId)
-  output += "</p></content></subParagraph>"
-  return output
+  return _collect(write_sub_paragraph, SubParagraph, node, prefix)
+
+def write_paragraph(node, write, prefix="", mark=None):
+  p_prefix = part_eId(node, prefix)
+  if mark is not None:
+    mark(p_prefix)
+  write("<paragraph eId=\"" + p_prefix + "\"><num>" + node.index + "</num>")
+  if node.sub_paragraphs:
+    write("<intro><p>")
+    write_legal_text(node.text, write, p_prefix, mark)
+    write("</p></intro>")
+    for sp in node.sub_paragraphs:
+      write_sub_paragraph(sp, write, p_prefix, mark)
+      if len(node.post):
+        write("<wrapup><p>")
+        write_legal_text(node.post, write, p_prefix, mark)
+        write("</p></wrapup>")
+  else:
+    write("<content><p>")
+    write_legal_text(node.text, write, p_prefix, mark)
+    write("</p></content>")
+  write("</paragraph>")
+  if mark is not None:
+    mark(None)
 
 def generate_paragraph(node, prefix=""):
-  p_prefix = prefix + "__para_" + node['paragraph index'][0].replace('.','_')
-  output = "<paragraph eId=\"" + p_prefix + "\"><num>"
-  output += node['paragraph index'][0]
-  output += "</num>"
-  if 'sub-paragraphs' in node and len(node['sub-paragraphs']):
-    output += "<intro><p>"
-    output += generate_legal_text(node['paragraph text'], p_prefix)
-    output += "</p></intro>"
-    subparagraphs_list = node['sub-paragraphs']
-    for sp in subparagraphs_list:
-      output += generate_sub_paragraph(sp, p_prefix)
-      if len(node['paragraph post']):
-        output += "<wrapup><p>"
-        output += generate_legal_text(node['paragraph post'], p_prefix)
-        output += "</p></wrapup>"
+  return _collect(write_paragraph, Paragraph, node, prefix)
+
+def write_sub_section(node, write, prefix="", mark=None):
+  ss_prefix = part_eId(node, prefix)
+  if mark is not None:
+    mark(ss_prefix)
+  write("<subSection eId=\"" + ss_prefix + "\"><num>" + node.index + "</num>")
+  if node.heading:
+    write("<heading>" + escape(node.heading) + "</heading>")
+  if node.paragraphs:
+    write("<intro><p>")
+    write_legal_text(node.text, write, ss_prefix, mark)
+    write("</p></intro>")
+    for p in node.paragraphs:
+      write_paragraph(p, write, ss_prefix, mark)
+    if len(node.post):
+      write("<wrapup><p>")
+      write_legal_text(node.post, write, ss_prefix, mark)
+      write("</p></wrapup>")
   else:
-    output += "<content><p>"
-    output += generate_legal_text(node['paragraph text'],p_prefix)
-    output += "</p></content>"
-  output += "</paragraph>"
-  return output
+    write("<content><p>")
+    write_legal_text(node.text, write, ss_prefix, mark)
+    write("</p></content>")
+  write("</subSection>")
+  if mark is not None:
+    mark(None)
 
 def generate_sub_section(node, prefix=""):
-  ss_prefix = prefix + "__subsec_" + node['sub-section index'][0].replace('.','_')
-  output = "<subSection eId=\"" + ss_prefix + "\"><num>"
-  output += node['sub-section index'][0]
-  output += "</num>"
-  if 'heading text' in node and len(node['heading text']):
-    output += "<heading>"
-    output += node['heading text']
-    output += "</heading>"
-  if 'paragraphs' in node and len(node['paragraphs']):
-    output += "<intro><p>"
-    output += generate_legal_text(node['sub-section text'], ss_prefix)
-    output += "</p></intro>"
-    for p in node['paragraphs']:
-      output += generate_paragraph(p, ss_prefix)
-    if len(node['sub-section post']):
-      output += "<wrapup><p>"
-      output += generate_legal_text(node['sub-section post'], ss_prefix)
-      output += "</p></wrapup>"
+  return _collect(write_sub_section, SubSection, node, prefix)
+
+def write_section(node, write, mark=None):
+  prefix = part_eId(node)
+  if mark is not None:
+    mark(prefix)
+  write("<section eId=\"" + prefix + "\"><num>" + node.index + "</num>")
+  if node.heading:
+    write("<heading>" + escape(node.heading) + "</heading>")
+  if node.sub_sections is not None or node.paragraphs is not None:
+    if len(node.text):
+      write("<intro><p>")
+      write_legal_text(node.text, write, prefix, mark)
+      write("</p></intro>")
+    if node.sub_sections:
+      for p in node.sub_sections:
+        write_sub_section(p, write, prefix, mark)
+    elif node.paragraphs:
+      for p in node.paragraphs:
+        write_paragraph(p, write, prefix, mark)
+    if len(node.post):
+      write("<wrapup><p>")
+      write_legal_text(node.post, write, prefix, mark)
+      write("</p></wrapup>")
   else:
-    output += "<content><p>"
-    output += generate_legal_text(node['sub-section text'], ss_prefix)
-    output += "</p></content>"
-  output += "</subSection>"
-  return output
+    if len(node.text):
+      write("<content><p>")
+      write_legal_text(node.text, write, prefix, mark)
+      write("</p></content>")
+  write("</section>")
+  if mark is not None:
+    mark(None)
 
 def generate_section(node):
-  prefix = "sec_" + node['section index'][0].replace('.','_')
-  output = "<section eId=\"" + prefix + "\"><num>"
-  output += node['section index'][0]
-  output += "</num>"
-  if 'heading text' in node and len(node['heading text']):
-    output += "<heading>"
-    output += node['heading text']
-    output += "</heading>"
-  if 'sub-sections' in node or 'paragraphs' in node:
-    if len(node['section text']):
-      output += "<intro><p>"
-      output += generate_legal_text(node['section text'], prefix)
-      output += "</p></intro>"
-    if 'sub-sections' in node and len(node['sub-sections']):
-      for p in node['sub-sections']:
-        output += generate_sub_section(p, prefix)
-    elif len(node['paragraphs']):
-      for p in node['paragraphs']:
-        output += generate_paragraph(p, prefix)
-    if len(node['section post']):
-      output += "<wrapup><p>"
-      output += generate_legal_text(node['section post'], prefix)
-      output += "</p></wrapup>"
+  return _collect(write_cached_section, Section, node)
+
+class FragmentCache:
+  """A bounded cache of generated Akoma Ntoso, which drops the least
+  recently used fragment when it is full."""
+
+  def __init__(self, size):
+    self.size = size
+    self.hits = 0
+    self.misses = 0
+    self._fragments = OrderedDict()
+
+  def get(self, key, generate):
+    """Return the fragment for key, calling generate() to make it if it is
+    not in the cache."""
+    fragment = self._fragments.get(key)
+    if fragment is not None:
+      self.hits += 1
+      self._fragments.move_to_end(key)
+      return fragment
+    self.misses += 1
+    fragment = self._fragments[key] = generate()
+    if len(self._fragments) > self.size:
+      self._fragments.popitem(last=False)
+    return fragment
+
+  def clear(self):
+    self._fragments.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def stats(self):
+    lookups = self.hits + self.misses
+    return {'hits': self.hits, 'misses': self.misses, 'size': len(self._fragments),
+      'hit rate': self.hits / lookups if lookups else 0.0}
+
+section_cache = FragmentCache(SECTION_CACHE_SIZE)
+
+def write_cached_section(node, write, mark=None):
+  """Like write_section, but reuse the Akoma Ntoso of sections with the
+  same source text from section_cache. Sections that were not read by the
+  hand-written parser have no source_hash, and are always generated, as
+  are sections written with a mark, which needs the offsets inside them."""
+  if node.source_hash is None or mark is not None:
+    write_section(node, write, mark)
   else:
-    if len(node['section text']):
-      output += "<content><p>"
-      output += generate_legal_text(node['section text'], prefix)
-      output += "</p></content>"
-  output += "</section>"
-  return output
+    write(section_cache.get((GENERATOR_VERSION, node.source_hash),
+      lambda: _collect(write_section, Section, node)))
+
+def section_cache_stats():
+  """Return the hits, misses, size and hit rate of section_cache."""
+  return section_cache.stats()
+
+def write_title(node, write):
+  write('<preface><p class="title"><shortTitle>')
+  write(escape(node.title))
+  write("</shortTitle></p></preface>")
 
 def generate_title(node):
-  output = '<preface><p class="title"><shortTitle>'
-  output += node['title text']
-  output += "</shortTitle></p></preface>"
-  return output
+  return _collect(write_title, Act, node)
+
+def write_act(node, write, section_writer=write_cached_section):
+  # section_writer writes each part of the body, so that callers with the
+  # Akoma Ntoso of some sections already generated can write that instead.
+  write('<?xml version="1.0" encoding="UTF-8"?><akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0"><act>')
+  if node.title is not None:
+    write_title(node, write)
+  if node.body is not None:
+    write("<body>")
+    for sec in node.body:
+      section_writer(sec, write)
+    write("</body>")
+  write("</act></akomaNtoso>")
 
 def generate_act(node):
-  output = '<?xml version="1.0" encoding="UTF-8"?><akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0"><act>'
-  if 'title' in node:
-    output += generate_title(node)
-  if 'body' in node:
-    output += "<body>"
-    for sec in node['body']:
-      output += generate_section(sec)
-    output += "</body>"
-  output += "</act></akomaNtoso>"
-  return output
-
-def generate_akn(text):
+  return _collect(write_act, Act, node)
+
+# Finding a provision by eId computes each part's eId as the writers do,
+# and only looks inside parts whose eId the target starts with. Spans
+# inside spans are named after the outer span's prefix and name, without
+# a "__", so legal text is searched whenever the target starts with the
+# prefix of the part it is in. Each _find_* function returns the writer,
+# node and prefix that render the provision, or None.
+
+def _find_in_text(text, prefix, eId):
+  for element in text:
+    if type(element) != str:
+      own = span_eId(element.name, prefix)
+      if own == eId:
+        return write_span, element, prefix
+      if eId.startswith(prefix + element.name):
+        found = _find_in_text(element.body, prefix + element.name, eId)
+        if found is not None:
+          return found
+  return None
+
+def _find_in_part(node, own, eId, texts, parts):
+  # Search the legal texts of a part, then its child parts, which are
+  # given as (find function, children) pairs.
+  for text in texts:
+    found = _find_in_text(text, own, eId)
+    if found is not None:
+      return found
+  if eId.startswith(own + "__"):
+    for find, children in parts:
+      for child in children or ():
+        found = find(child, own, eId)
+        if found is not None:
+          return found
+  return None
+
+def _find_sub_paragraph(node, prefix, eId):
+  own = part_eId(node, prefix)
+  if own == eId:
+    return write_sub_paragraph, node, prefix
+  if eId.startswith(own):
+    return _find_in_text(node.text, own, eId)
+  return None
+
+def _find_paragraph(node, prefix, eId):
+  own = part_eId(node, prefix)
+  if own == eId:
+    return write_paragraph, node, prefix
+  if eId.startswith(own):
+    return _find_in_part(node, own, eId, (node.text, node.post),
+      ((_find_sub_paragraph, node.sub_paragraphs),))
+  return None
+
+def _find_sub_section(node, prefix, eId):
+  own = part_eId(node, prefix)
+  if own == eId:
+    return write_sub_section, node, prefix
+  if eId.startswith(own):
+    return _find_in_part(node, own, eId, (node.text, node.post),
+      ((_find_paragraph, node.paragraphs),))
+  return None
+
+def _find_section(node, eId):
+  own = part_eId(node)
+  if own == eId:
+    return write_cached_section, node, None
+  if eId.startswith(own):
+    return _find_in_part(node, own, eId, (node.text, node.post),
+      ((_find_sub_section, node.sub_sections), (_find_paragraph, node.paragraphs)))
+  return None
+
+def write_provision(node, write, eId):
+  """Write the Akoma Ntoso of the part of an Act with eId, as write_act
+  would write it. Where parts share an eId, the first is written. Raises
+  KeyError if there is no part with eId."""
+  for sec in node.body:
+    found = _find_section(sec, eId)
+    if found is not None:
+      writer, part, prefix = found
+      if writer is write_span: # Without the spaces around it.
+        write(_collect(write_span, Span, part, prefix)[1:-1])
+      elif prefix is None:
+        writer(part, write)
+      else:
+        writer(part, write, prefix)
+      return
+  raise KeyError(eId)
+
+def generate_provision(parse, eId):
+  """Return the Akoma Ntoso of one provision of a parsed act, such as
+  "sec_34__subsec_1__para_b", without generating the rest of the act."""
+  return _collect(write_provision, Act, parse, eId)
+
+def write_akn(parse, out):
+  """Write the Akoma Ntoso for a parsed act to out, which is either a
+  text stream or a list that the fragments are appended to."""
+  if not isinstance(parse, Act):
+    parse = Act.from_results(parse)
+  write_act(parse, out.append if isinstance(out, list) else out.write)
+
+def parse(text, jobs=1):
+  """Parse a CLEAN document into an Act, using the hand-written parser.
+  With more than one job, parts of the document are parsed at the same
+  time in that many processes."""
+  if jobs > 1:
+    return _parse_parallel(text, jobs, False)
+  node = parse_stream(explicit_indents(iter_lines(text)))
+  node.body = list(node.body)
+  return node
+
+# The parser engines that generate_akn can use.
+ENGINES = ("pyparsing", "fast_grammar", "fast")
+
+def generate_akn(text, engine="pyparsing", jobs=1, profile=None):
   # Ideally, we would strip blank lines off the end of the indented file.
-  return generate_act(act.parseString(addExplicitIndents(text)))
+  # The "fast" engine is the hand-written parser in fastparse.py, and the
+  # "fast_grammar" engine is the pyparsing grammar built by fast_grammar().
+  # The first use of fast_grammar turns on pyparsing's packrat cache for
+  # the whole process, and so for the "pyparsing" engine and any other
+  # pyparsing grammar too. All of them produce the same output. The fast engine can also use more
+  # than one process; see parse. If profile is a Profile, it is filled in
+  # with the time and memory each stage took; see profiling.py. Otherwise,
+  # the tree is read from tree_cache, if there is one; see use_tree_cache.
+  if engine not in ENGINES:
+    raise ValueError("Unknown parser engine: " + str(engine))
+  if jobs > 1:
+    if engine != "fast" or profile is not None:
+      raise ValueError("Only the fast engine, without a profile, can use more than one job")
+    output = []
+    write_act(_parse_parallel(text, jobs, True), output.append, _write_fragment)
+    return "".join(output)
+  if profile is not None:
+    return _profile_akn(text, engine, profile)
+  return generate_act(parse_cached(text, engine))
 
-import sys
-if __name__ == '__main__':
-  file = open(sys.argv[1])
-  text = file.read()
-  file.close()
-  parsed = act.parseString(text,parse_all=True)
-  print(generate_act(parsed))
+def parse_with(text, engine="pyparsing"):
+  """Parse text with one of ENGINES, as generate_akn does. The pyparsing
+  engines return ParseResults, and the fast engine an Act whose body is a
+  generator of sections."""
+  if engine == "pyparsing":
+    return parser.parse_string(addExplicitIndents(text))
+  elif engine == "fast_grammar":
+    return fast_grammar().parse_string(addExplicitIndents(text))
+  elif engine == "fast":
+    return parse_stream(explicit_indents(iter_lines(text)))
+  raise ValueError("Unknown parser engine: " + str(engine))
+
+# The cache of parse trees on disk that generate_akn and parse_cached use,
+# if any; see use_tree_cache.
+tree_cache = None
+
+def use_tree_cache(directory, max_size=None):
+  """Keep the trees that generate_akn parses in directory, which is made if
+  need be, and read them from it for documents that have not changed. The
+  files take at most about max_size bytes, by default TREE_CACHE_SIZE.
+  With None, stop using it. Return tree_cache."""
+  global tree_cache
+  # Imported here, as most programs never use a tree cache.
+  from .treecache import TreeCache, TREE_CACHE_SIZE
+  if max_size is None:
+    max_size = TREE_CACHE_SIZE
+  if directory is None:
+    tree_cache = None
+  elif tree_cache is None or tree_cache.directory != directory or tree_cache.max_size != max_size:
+    tree_cache = TreeCache(directory, max_size, GRAMMAR_VERSION)
+  return tree_cache
+
+def _parse_act(text, engine):
+  node = parse_with(text, engine)
+  if not isinstance(node, Act):
+    return Act.from_results(node)
+  if node.body is not None:
+    node.body = list(node.body)
+  return node
+
+def parse_cached(text, engine="pyparsing"):
+  """Like parse_with, but if there is a tree_cache, return an Act from it,
+  parsing text and adding its tree only if it has none for text. The
+  engines read every document into the same tree, so a tree from any of
+  them is used."""
+  if tree_cache is None:
+    return parse_with(text, engine)
+  return tree_cache.get(text, lambda: _parse_act(text, engine))
+
+def _profile_akn(text, engine, profile):
+  # generate_akn, one stage at a time.
+  if engine == "fast":
+    tokens = profile.stage("indent", lambda: list(explicit_indents(iter_lines(text))))
+    def parse_tokens():
+      node = parse_stream(tokens)
+      node.body = list(node.body)
+      return node
+    node = profile.stage("parse", parse_tokens)
+  else:
+    if engine == "fast_grammar":
+      fast_grammar() # Turn on the packrat cache.
+    # A separate grammar, so that the shared one is never slowed down.
+    grammar = build_grammar(fast=engine == "fast_grammar", watch=profile.watch)
+    indented = profile.stage("indent", addExplicitIndents, text)
+    node = profile.stage("parse", grammar.act.parseString, indented)
+  return profile.stage("generate", generate_act, node)
+
+def iter_sections(fileobj):
+  """Parse a CLEAN document from a file object, and yield each top-level
+  section as soon as it has been parsed.
+
+  The file is read a line at a time, and only the lines of the sections
+  being parsed are kept, so memory use depends on the size of the largest
+  section, not the whole document. The sections are the same as the body
+  of generate_akn's parse."""
+  return stream_act(fileobj).body
+
+def stream_act(fileobj):
+  """Like iter_sections, but return the whole Act, with the title parsed
+  and the body a generator of sections. This can be passed to
+  generate_act."""
+  return parse_stream(explicit_indents(line for chunk in fileobj for line in chunk.splitlines()))
 
 def addExplicitIndents(string):
   """A function to add explicit indents to a text file for block-based encodings,
-  because most of the indent features of PyParsing don't work properly."""
+  because most of the indent features of PyParsing don't work properly.
 
-  UP = "INDENT\n"
-  DOWN = "UNDENT\n"
+  This returns the document marked up as a string, for the pyparsing
+  grammar. The hand-written parser reads explicit_indents directly."""
+  return "".join(line + "\n" for line, depth in explicit_indents(string.splitlines()))
 
-  levels = [0]
-  output = ""
+def iter_lines(text, chunk_size=1 << 16, keepends=False):
+  """Yield the lines of text one at a time, as text.splitlines(keepends)
+  would return them, without making a list of all of them."""
+  # Split in chunks that end with a newline, so that no line break,
+  # including "\r\n", is divided between two chunks.
+  start = 0
+  while start < len(text):
+    end = text.find('\n', start + chunk_size)
+    end = len(text) if end == -1 else end + 1
+    yield from text[start:end].splitlines(keepends)
+    start = end
 
-  for line in string.splitlines():
-    level = len(line) - len(line.lstrip(' '))
-    if level == levels[-1]: # The level has not changed
-      output += line.lstrip(' ') + '\n'
-    elif level > levels[-1]: # The indent has increased
+def explicit_indents(lines):
+  """Yield a (line, depth) pair for each line that addExplicitIndents
+  would output, including the INDENT and UNDENT lines, where depth is the
+  number of open indents after that line."""
+  levels = [0]
+  for line in lines:
+    stripped = line.lstrip(' ')
+    level = len(line) - len(stripped)
+    if level > levels[-1]: # The indent has increased
       levels.append(level)
-      output += UP
-      output += line.lstrip(' ') + '\n'
+      yield "INDENT", len(levels) - 1
     elif level < levels[-1]: # The indent has gone down
-      if level in levels: #We are returning to a previous level
-        while level != levels[-1]:
-          output += DOWN
-          levels.pop()
-        output += line.lstrip(' ') + '\n'
-      else:
+      if level not in levels:
         raise Exception("Unindent to a level not previously used in " + line)
-  # At this point, it is possible that we have a high indentation level,
-  # and we need to add UNDENTS to close out the blocks
+      while level != levels[-1]:
+        levels.pop()
+        yield "UNDENT", len(levels) - 1
+    yield stripped, len(levels) - 1
   while len(levels) > 1:
-    output += DOWN
     levels.pop()
-  while output.splitlines()[-1] == "\n":
-    output.pop()
-  return output
+    yield "UNDENT", len(levels) - 1
+
+# Parallel parses split the document into chunks where split_pieces
+# would start a piece: at empty lines, or at section lines that can't be
+# inside a span. Each piece ends with its indents closed, so each chunk
+# can be indented and parsed on its own. The chunks are parsed in a process
+# pool, and their sections joined in order.
+CHUNKS_PER_JOB = 4
+
+def _chunks(text, count):
+  # Split text into at most count chunks of about the same size. The first
+  # line after the title starts the body, so it is not a place to split.
+  cuts = [0]
+  title = text[:text.find("\n") + 1]
+  start = len(title.splitlines(True)[0]) if title else 0
+  for i in range(1, count):
+    cut = piece_start(text, start, len(text) * i // count)
+    if cut == -1:
+      break
+    start = cut
+    cuts.append(start)
+  cuts.append(len(text))
+  return [text[cuts[i]:cuts[i+1]] for i in range(len(cuts) - 1)]
+
+def _parse_chunk(chunk, first, last, generate):
+  # Return the title (in the first chunk), the sections of a chunk, or
+  # their Akoma Ntoso if generate is true, and whether the body continues
+  # after the chunk.
+  tokens = explicit_indents(iter_lines(chunk))
+  title = parse_title_line(next(tokens, ("", 0))[0]) if first else None
+  sections = []
+  complete = True
+  for piece, final in split_pieces(tokens):
+    parsed, complete = parse_piece(piece, first, final and last)
+    sections.extend(parsed)
+    first = False
+    if not complete: # The body ends in this chunk.
+      break
+  if generate:
+    sections = ["".join(generate_section(sec) for sec in sections)]
+  return title, sections, complete
+
+def _parse_parallel(text, jobs, generate):
+  from concurrent.futures import ProcessPoolExecutor
+  chunks = _chunks(text, jobs * CHUNKS_PER_JOB)
+  node = Act(None, [])
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    futures = [pool.submit(_parse_chunk, chunk, i == 0, i == len(chunks) - 1, generate)
+      for i, chunk in enumerate(chunks)]
+    try:
+      for future in futures:
+        title, sections, complete = future.result()
+        if title is not None:
+          node.title = title
+        node.body.extend(sections)
+        if not complete:
+          break
+    finally:
+      for future in futures:
+        future.cancel()
+  return node
+
+def _write_fragment(fragment, write):
+  write(fragment)
+
+import sys
+if __name__ == '__main__':
+  # Convert the one file named on the command line. clean.cli converts
+  # batches of files.
+  file = open(sys.argv[1])
+  text = file.read()
+  file.close()
+  # Stream the output, rather than building it as one string.
+  write_akn(parse_with(text), sys.stdout)
+  sys.stdout.write("\n")
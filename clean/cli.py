@@ -0,0 +1,173 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# A command-line converter for batches of CLEAN files.
+#
+#   python -m clean acts/ -o akn/ -j 8
+#
+# converts every .clean file under acts/ to an .xml file in akn/, with the
+# same relative path, using a pool of 8 processes. Files whose output is
+# newer than their source are skipped, unless --force is given. With
+# --index, each .xml file gets a sidecar index of its eIds, and files are
+# only skipped if it is newer than their source too; see sidecar.py.
+# With --lint, files that lint finds mistakes in fail without being
+# parsed; see lint.py. With --cache, the parse trees of the sources are kept
+# in a directory, and sources that have not changed are not parsed again;
+# see treecache.py.
+
+import argparse
+import glob
+import os
+import sys
+import time
+from .clean import ENGINES, generate_akn, parse_cached, use_tree_cache
+from .lint import check
+from .sidecar import index_path, write_indexed_akn
+from .treecache import TREE_CACHE_SIZE
+
+def find_sources(path):
+  """Yield (source, name) for each .clean file that path names, where path
+  is a file, a directory to search, or a glob pattern. name is the path of
+  the source relative to the directory, or the file name of a file."""
+  if os.path.isdir(path):
+    for root, dirs, files in os.walk(path):
+      dirs.sort()
+      for file in sorted(files):
+        if file.endswith(".clean"):
+          source = os.path.join(root, file)
+          yield source, os.path.relpath(source, path)
+  elif os.path.isfile(path):
+    yield path, os.path.basename(path)
+  else:
+    for match in sorted(glob.glob(path, recursive=True)):
+      if os.path.isdir(match) or match.endswith(".clean"):
+        yield from find_sources(match)
+
+def target_for(source, name, output=None):
+  """The .xml file to write for a source found by find_sources."""
+  if output is None:
+    return os.path.splitext(source)[0] + ".xml"
+  return os.path.join(output, os.path.splitext(name)[0] + ".xml")
+
+def _newer(path, source):
+  return os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(source)
+
+def up_to_date(source, target, index=False):
+  """Whether target, and with index, its sidecar index, are newer than
+  source."""
+  return _newer(target, source) and (not index or _newer(index_path(target), source))
+
+def convert(source, target, engine="fast", index=False, lint=False):
+  """Convert one CLEAN file to Akoma Ntoso, and with index, write a
+  sidecar index of it too. With lint, raise LintError instead if lint
+  finds any mistakes in it."""
+  with open(source, encoding="utf-8") as file:
+    text = file.read()
+  if lint:
+    check(text)
+  os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+  # Write to a temporary file first, so that a conversion that is stopped
+  # part way never leaves an output that looks up to date.
+  temporary = target + ".tmp"
+  if index:
+    write_indexed_akn(parse_cached(text, engine), temporary, index_path(temporary))
+    os.replace(index_path(temporary), index_path(target))
+  else:
+    akn = generate_akn(text, engine=engine)
+    with open(temporary, "w", encoding="utf-8") as file:
+      file.write(akn)
+  os.replace(temporary, target)
+
+def _run(source, target, engine, index, lint, cache, cache_size):
+  # Run convert, and return the time it took and the error, if any. The
+  # error is returned as text, because not every exception can be sent
+  # back from a worker process.
+  start = time.perf_counter()
+  try:
+    use_tree_cache(cache, cache_size)
+    convert(source, target, engine, index, lint)
+  except Exception as error:
+    return time.perf_counter() - start, type(error).__name__ + ": " + str(error)
+  return time.perf_counter() - start, None
+
+def _results(jobs, workers):
+  # Yield (source, target, (seconds, error)) for each job as it finishes.
+  if workers <= 1:
+    for job in jobs:
+      yield job[0], job[1], _run(*job)
+    return
+  from concurrent.futures import ProcessPoolExecutor, as_completed
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    futures = {pool.submit(_run, *job): job for job in jobs}
+    for future in as_completed(futures):
+      job = futures[future]
+      yield job[0], job[1], future.result()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="clean",
+    description="Convert CLEAN files to Akoma Ntoso.")
+  parser.add_argument("paths", nargs="+",
+    help=".clean files, directories to search for them, or glob patterns")
+  parser.add_argument("-o", "--output",
+    help="the directory to write .xml files to (default: beside each source)")
+  parser.add_argument("-j", "--jobs", type=int, default=1,
+    help="the number of processes to convert files with (default: 1)")
+  parser.add_argument("--engine", choices=ENGINES, default="fast",
+    help="the parser engine to use (default: fast)")
+  parser.add_argument("-f", "--force", action="store_true",
+    help="convert files even when their output is up to date")
+  parser.add_argument("--index", action="store_true",
+    help="also write a sidecar index of the eIds in each output, as <output>.idx")
+  parser.add_argument("--lint", action="store_true",
+    help="check each file for mistakes first, and fail the ones with any without parsing them")
+  parser.add_argument("--cache", metavar="DIRECTORY",
+    help="keep the parse trees of files in DIRECTORY, and reuse them for files that have not changed")
+  parser.add_argument("--cache-size", type=int, default=TREE_CACHE_SIZE >> 20, metavar="MB",
+    help="the most the cache may take, in megabytes (default: %(default)s)")
+  args = parser.parse_intermixed_args(argv)
+
+  start = time.perf_counter()
+  # The source and job of each target, where the job is None if the
+  # target is up to date. A file named more than once, such as by a
+  # directory and a path in it, is converted once, so that no two jobs
+  # write the same target.
+  jobs = {}
+  skipped = 0
+  failures = []
+  for path in args.paths:
+    found = False
+    for source, name in find_sources(path):
+      found = True
+      target = target_for(source, name, args.output)
+      key = os.path.abspath(target)
+      if key in jobs:
+        if not os.path.samefile(jobs[key][0], source):
+          error = "same output as " + jobs[key][0]
+          failures.append((source, error))
+          print("FAILED %s: %s" % (source, error), file=sys.stderr)
+      elif not args.force and up_to_date(source, target, args.index):
+        skipped += 1
+        jobs[key] = (source, None)
+      else:
+        jobs[key] = (source, (source, target, args.engine, args.index, args.lint,
+          args.cache, args.cache_size << 20))
+    if not found:
+      failures.append((path, "no .clean files found"))
+      print("FAILED " + path + ": no .clean files found", file=sys.stderr)
+
+  converted = 0
+  jobs = [job for source, job in jobs.values() if job is not None]
+  for source, target, (seconds, error) in _results(jobs, args.jobs):
+    if error is None:
+      converted += 1
+      print("%s -> %s (%.3fs)" % (source, target, seconds))
+    else:
+      failures.append((source, error))
+      print("FAILED %s (%.3fs): %s" % (source, seconds, error), file=sys.stderr)
+
+  print("%d converted, %d skipped, %d failed in %.3fs" %
+    (converted, skipped, len(failures), time.perf_counter() - start))
+  if failures:
+    print("Failed:", file=sys.stderr)
+    for source, error in failures:
+      print("  " + source + ": " + error, file=sys.stderr)
+    return 1
+  return 0
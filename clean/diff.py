@@ -0,0 +1,202 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Structural diffs between two versions of an act, by eId.
+#
+#   python -m clean.diff old.clean new.clean
+#
+# Each provision gets two hashes: one of its own contents (its heading and
+# text), and one of its subtree (its own hash, and the indexes and subtree
+# hashes of its parts). A provision's own index is in neither, so a part
+# that was renumbered or moved elsewhere has the same subtree hash.
+#
+# A provision whose eId is in both versions is modified if its own hash
+# changed. Changes to its parts are reported for the parts themselves. A
+# removed provision whose subtree hash is the same as an added one's was
+# moved, and so were its parts.
+#
+# Sections read by the hand-written parser with the same source_hash in
+# both versions are the same, and are skipped without being hashed. The
+# hashes of other sections with a source_hash are kept in hash_cache, so
+# diffing each release of an act against the next hashes each section
+# once.
+
+import argparse
+import json
+import sys
+from collections import deque
+from hashlib import blake2b
+from .clean import SECTION_CACHE_SIZE, FragmentCache, parse_with, ENGINES
+from .nodes import Act, Section, SubSection, Paragraph, SubParagraph
+from .walk import part_eId
+
+hash_cache = FragmentCache(SECTION_CACHE_SIZE)
+
+def _parts(node):
+  # Yield the parts directly inside node.
+  if isinstance(node, Section):
+    yield from node.sub_sections or ()
+  if isinstance(node, (Section, SubSection)):
+    yield from node.paragraphs or ()
+  if isinstance(node, Paragraph):
+    yield from node.sub_paragraphs or ()
+
+def _feed(append, text):
+  # Add legal text to the strings to hash: its strings, and its spans as
+  # their names and bodies.
+  for element in text:
+    if type(element) is str:
+      append(element)
+    else:
+      append("[" + element.name + "]{")
+      _feed(append, element.body)
+      append("}")
+
+def _add(node, eId, table):
+  # Add entries for node and its parts to table, a dict from eId to (own
+  # hash, subtree hash, eIds of parts), in document order. Where parts
+  # share an eId, the first is kept. Returns node's subtree hash.
+  first = eId not in table
+  if first:
+    table[eId] = None # Keeps the parent before its parts.
+  strings = [type(node).__name__, getattr(node, 'heading', None) or ""]
+  _feed(strings.append, node.text)
+  if not isinstance(node, SubParagraph):
+    strings.append("\1")
+    _feed(strings.append, node.post)
+  own = blake2b("\0".join(strings).encode("utf-8"), digest_size=16).digest()
+  tree = blake2b(own, digest_size=16)
+  children = []
+  for part in _parts(node):
+    child = part_eId(part, eId)
+    tree.update(part.index.encode("utf-8") + b"\0" + _add(part, child, table))
+    children.append(child)
+  tree = tree.digest()
+  if first:
+    table[eId] = (own, tree, children)
+  return tree
+
+def section_hashes(node):
+  """Return the hashes of a section and its parts, as a dict from eId to
+  (own hash, subtree hash, eIds of parts)."""
+  def build():
+    table = {}
+    _add(node, part_eId(node), table)
+    return table
+  if node.source_hash is None:
+    return build()
+  return hash_cache.get(node.source_hash, build)
+
+def _sections(node):
+  # The sections of an Act, or of pyparsing results, by eId.
+  if not isinstance(node, Act):
+    node = Act.from_results(node)
+  sections = {}
+  for sec in node.body or ():
+    sections.setdefault(part_eId(sec), sec)
+  return sections
+
+class ActDiff:
+  """The differences between two versions of an act: lists of the eIds of
+  the provisions that were added, removed and modified, and of (old eId,
+  new eId) pairs for the ones that were moved. Added and modified
+  provisions are in the order of the new version, and the rest in the
+  order of the old."""
+
+  def __init__(self, added, removed, modified, moved):
+    self.added = added
+    self.removed = removed
+    self.modified = modified
+    self.moved = moved
+
+  def __bool__(self):
+    return bool(self.added or self.removed or self.modified or self.moved)
+
+  def as_dict(self):
+    return {'added': self.added, 'removed': self.removed,
+      'modified': self.modified, 'moved': self.moved}
+
+  def __repr__(self):
+    return "ActDiff(" + ", ".join(name + "=" + repr(value) for name, value in self.as_dict().items()) + ")"
+
+def diff_acts(old, new):
+  """Return the ActDiff between old and new, each an Act or the results of
+  parsing one."""
+  old_sections = _sections(old)
+  new_sections = _sections(new)
+  old_table = {}
+  new_table = {}
+  for eId in list(old_sections) + [eId for eId in new_sections if eId not in old_sections]:
+    a = old_sections.get(eId)
+    b = new_sections.get(eId)
+    if a is not None and b is not None and a.source_hash is not None and a.source_hash == b.source_hash:
+      continue
+    a = section_hashes(a) if a is not None else {}
+    b = section_hashes(b) if b is not None else {}
+    if eId in a and eId in b and a[eId][1] == b[eId][1]:
+      continue
+    old_table.update(a)
+    new_table.update(b)
+
+  modified = [eId for eId, entry in new_table.items() if eId in old_table and old_table[eId][0] != entry[0]]
+  added = [eId for eId in new_table if eId not in old_table]
+  removed = [eId for eId in old_table if eId not in new_table]
+
+  # Pair each removed subtree with the first added one with the same hash.
+  by_tree = {}
+  for eId in added:
+    by_tree.setdefault(new_table[eId][1], deque()).append(eId)
+  moved = []
+  paired = set()
+  def pair(a, b):
+    moved.append((a, b))
+    paired.add(a)
+    paired.add(b)
+    for a, b in zip(old_table[a][2], new_table[b][2]):
+      pair(a, b)
+  for eId in removed:
+    if eId in paired:
+      continue
+    candidates = by_tree.get(old_table[eId][1], ())
+    while candidates and candidates[0] in paired:
+      candidates.popleft()
+    if candidates:
+      pair(eId, candidates.popleft())
+  return ActDiff([eId for eId in added if eId not in paired],
+    [eId for eId in removed if eId not in paired], modified, moved)
+
+def diff_texts(old, new, engine="fast"):
+  """Return the ActDiff between two CLEAN documents."""
+  return diff_acts(parse_with(old, engine), parse_with(new, engine))
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="clean.diff",
+    description="List the provisions that changed between two versions of a CLEAN act.")
+  parser.add_argument("old", help="the older .clean file")
+  parser.add_argument("new", help="the newer .clean file")
+  parser.add_argument("--engine", choices=ENGINES, default="fast",
+    help="the parser engine to use (default: fast)")
+  parser.add_argument("--json", action="store_true",
+    help="write the differences as a JSON object")
+  args = parser.parse_args(argv)
+
+  texts = []
+  for path in (args.old, args.new):
+    with open(path, encoding="utf-8") as file:
+      texts.append(file.read())
+  diff = diff_texts(*texts, engine=args.engine)
+  if args.json:
+    json.dump(diff.as_dict(), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+  else:
+    for eId in diff.removed:
+      print("- " + eId)
+    for eId in diff.added:
+      print("+ " + eId)
+    for eId in diff.modified:
+      print("~ " + eId)
+    for old, new in diff.moved:
+      print("> %s -> %s" % (old, new))
+  # Like diff, exit with 1 when the versions differ.
+  return 1 if diff else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,351 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# A hand-written parser engine for CLEAN-formatted documents.
+#
+# This is an alternative to the pyparsing `act` grammar in clean.py. It
+# reads the output of addExplicitIndents in a single pass, deciding what
+# to parse at the start of each line from the leading index token, so it
+# never tries more than one alternative at a time. It mirrors the pyparsing
+# grammar closely, including the places where that grammar stops early,
+# so that both engines generate the same Akoma Ntoso.
+#
+# It builds the typed nodes in nodes.py directly.
+
+import re
+from hashlib import blake2b
+from .nodes import Act, Section, SubSection, Paragraph, SubParagraph, Span, LegalText, EMPTY_TEXT
+
+# Whitespace between tokens is spaces and tabs, as in the grammar.
+_INSERT = r'(?:[ \t]*\.[ \t]*[0-9]+)*'
+_NL = re.compile(r'[ \t]*\n')
+_UP = re.compile(r'[ \t]*\n[ \t]*INDENT')
+_DOWN = re.compile(r'[ \t]*\n[ \t]*UNDENT')
+# Index text keeps any whitespace before the closing punctuation, as
+# original_text_for does. The lookahead and backreference make the insert
+# index atomic, because the grammar does not give back an insert index to
+# match the final dot of a section index.
+_SECTION_INDEX = re.compile(r'[ \t]*\n[ \t]*(?=([0-9]+' + _INSERT + r'[ \t]*))\1\.')
+_SUB_SECTION_INDEX = re.compile(r'[ \t]*\n[ \t]*\([ \t]*([0-9]+' + _INSERT + r'[ \t]*)\)')
+_PARAGRAPH_INDEX = re.compile(r'[ \t]*\n[ \t]*\([ \t]*([a-z]+' + _INSERT + r'[ \t]*)\)')
+_SUB_PARAGRAPH_INDEX = re.compile(r'[ \t]*\n[ \t]*\([ \t]*([ivxlcdm]+' + _INSERT + r'[ \t]*)\)')
+# Anything that starts a numbered part, once the newline has been read.
+_NUMBERED_PART = re.compile(
+  r'[ \t]*(?:\([ \t]*(?:[a-z]+|[0-9]+)' + _INSERT + r'[ \t]*\)'
+  r'|(?=([0-9]+' + _INSERT + r'))\1[ \t]*\.'
+  r'|UNDENT|INDENT)')
+_TITLE = re.compile(r'[ \t]*([A-Z][!-~]*)')
+_HEADING = re.compile(r'[ \t]*\n[ \t]*\n[ \t]*([A-Z][!-~]*)')
+_WORD = re.compile(r'[ \t]*([!-~]+)')
+_TEXT_WORD = re.compile(r'[ \t]*(?:\n[ \t]*)?([!-~]+)')
+# The words on the rest of a line, up to any word that contains a [. Each
+# word must end where the line, or its run of printable characters, does.
+_PLAIN_WORDS = re.compile(r'[ \t]*(?:\n[ \t]*)?([!-Z\\-~]+(?![!-~])(?:[ \t]+[!-Z\\-~]+(?![!-~]))*)')
+# The words in a span, which may go on to the next line, up to the next
+# span or the span's end. Inside a span, words stop at '[' and '}'.
+_SPAN_WORDS = re.compile(r'[ \t]*(?:\n[ \t]*)?([!-Z\\-|~]+(?:[ \t]*(?:\n[ \t]*)?[!-Z\\-|~]+)*)')
+_SPAN_START = re.compile(r'[ \t]*(?:\n[ \t]*)?\[[ \t]*([A-Za-z0-9]+)[ \t]*\][ \t]*\{')
+_SPAN_STOP = re.compile(r'[ \t]*\}')
+
+def _at_numbered_part(s, p):
+  m = _NL.match(s, p)
+  if m is None:
+    return False
+  if p == 0 or s[p-1] == '\n': # A blank line
+    return True
+  return _NUMBERED_PART.match(s, m.end()) is not None
+
+def _words(s, p, first):
+  # The rest of the words on a line, joined with spaces.
+  words = [first]
+  m = _WORD.match(s, p)
+  while m is not None:
+    words.append(m.group(1))
+    p = m.end()
+    m = _WORD.match(s, p)
+  return " ".join(words), p
+
+def _span(s, p):
+  # A span, and any spans nested in it, read with a stack of the spans that
+  # are open instead of by recursion. If any of them is not closed, there
+  # is no span at p.
+  m = _SPAN_START.match(s, p)
+  if m is None:
+    return None
+  open_spans = []
+  name, body, p = m.group(1), [], m.end()
+  while True:
+    m = _SPAN_START.match(s, p)
+    if m is not None:
+      open_spans.append((name, body))
+      name, body, p = m.group(1), [], m.end()
+      continue
+    m = _SPAN_WORDS.match(s, p)
+    if m is not None:
+      body.append(" ".join(m.group(1).split()))
+      p = m.end()
+      continue
+    m = _SPAN_STOP.match(s, p)
+    if m is None:
+      return None
+    span = Span(name, LegalText(body))
+    p = m.end()
+    if not open_spans:
+      return span, p
+    name, body = open_spans.pop()
+    body.append(span)
+
+def scan_legal_text(s, p):
+  """Read the legal text in s from p, up to the next numbered part or
+  blank line, and return it as LegalText, with the position after it."""
+  items = []
+  words = [] # Runs of words, for the string being read
+  while not _at_numbered_part(s, p):
+    # Most lines have no spans, so the rest of the line is read at once.
+    m = _PLAIN_WORDS.match(s, p)
+    if m is not None:
+      words.append(m.group(1))
+      p = m.end()
+      continue
+    span = _span(s, p)
+    if span is not None:
+      if words:
+        items.append(" ".join(" ".join(words).split()))
+        words = []
+      items.append(span[0])
+      p = span[1]
+      continue
+    # A word with a [ that does not start a span.
+    m = _TEXT_WORD.match(s, p)
+    if m is None:
+      break
+    words.append(m.group(1))
+    p = m.end()
+  if words:
+    items.append(" ".join(" ".join(words).split()))
+  return (LegalText(items) if items else EMPTY_TEXT), p
+
+def _heading(s, p):
+  m = _HEADING.match(s, p)
+  if m is None:
+    return None
+  return _words(s, m.end(), m.group(1))
+
+def _list(item, s, p):
+  items = []
+  result = item(s, p)
+  while result is not None:
+    items.append(result[0])
+    p = result[1]
+    result = item(s, p)
+  return items, p
+
+def _block(items, s, p):
+  # An indented list of parts: INDENT, one or more parts, UNDENT.
+  m = _UP.match(s, p)
+  if m is None:
+    return None
+  for item in items:
+    parts, q = _list(item, s, m.end())
+    if parts:
+      break
+  else:
+    return None
+  m = _DOWN.match(s, q)
+  if m is None:
+    return None
+  return item, parts, m.end()
+
+def _sub_paragraph(s, p):
+  m = _SUB_PARAGRAPH_INDEX.match(s, p)
+  if m is None:
+    return None
+  text, p = scan_legal_text(s, m.end())
+  return SubParagraph(m.group(1), text), p
+
+def _paragraph(s, p):
+  m = _PARAGRAPH_INDEX.match(s, p)
+  if m is None:
+    return None
+  node = Paragraph(m.group(1))
+  node.text, p = scan_legal_text(s, m.end())
+  block = _block((_sub_paragraph,), s, p)
+  if block is not None:
+    _, node.sub_paragraphs, p = block
+    node.post, p = scan_legal_text(s, p)
+  return node, p
+
+def _headed(s, p, index, cls):
+  # An optional heading, followed by an index.
+  heading = _heading(s, p)
+  if heading is not None:
+    heading, p = heading
+  m = index.match(s, p)
+  if m is None:
+    return None
+  return cls(m.group(1), heading), m.end()
+
+def _sub_section(s, p):
+  headed = _headed(s, p, _SUB_SECTION_INDEX, SubSection)
+  if headed is None:
+    return None
+  node, p = headed
+  node.text, p = scan_legal_text(s, p)
+  block = _block((_paragraph,), s, p)
+  if block is not None:
+    _, node.paragraphs, p = block
+    node.post, p = scan_legal_text(s, p)
+  return node, p
+
+def _section(s, p):
+  start = p
+  headed = _headed(s, p, _SECTION_INDEX, Section)
+  if headed is None:
+    return None
+  node, p = headed
+  node.text, p = scan_legal_text(s, p)
+  block = _block((_sub_section, _paragraph), s, p)
+  if block is not None:
+    item, parts, p = block
+    if item is _sub_section:
+      node.sub_sections = parts
+    else:
+      node.paragraphs = parts
+    node.post, p = scan_legal_text(s, p)
+  node.source_hash = blake2b(s[start:p].encode(), digest_size=16).digest()
+  return node, p
+
+def _error(text, p, message):
+  # Errors are the grammar's ParseException, but pyparsing is only imported
+  # when there is one to raise, so this engine can be used without it.
+  from pyparsing import ParseException
+  return ParseException(text, p, message)
+
+def parse_title(text):
+  m = _TITLE.match(text)
+  if m is None:
+    raise _error(text, 0, "Expected title")
+  return _words(text, m.end(), m.group(1))
+
+def parse_legal_text(text):
+  """Parse text, which can have spans, into a LegalText."""
+  text = text.expandtabs().strip()
+  node, p = scan_legal_text(text, 0)
+  if p != len(text):
+    raise _error(text, p, "Expected legal text")
+  return node
+
+def parse_act(text):
+  """Parse text with explicit indents into an Act, with the same contents
+  as the pyparsing `act` grammar would give."""
+  if '\t' in text:
+    text = text.expandtabs()
+  title, p = parse_title(text)
+  if _heading(text, p) is None:
+    m = _NL.match(text, p)
+    if m is None:
+      raise _error(text, p, "Expected end of title")
+    p = m.end()
+  body, p = _list(_section, text, p)
+  return Act(title, body)
+
+# Streaming parses split the body into pieces at lines where no part of
+# the document can continue from one piece into the next: blank lines at
+# the top level, and top-level section indexes. A span can run past a
+# section index, so a piece with a '{' in it is only split at a blank line.
+_SECTION_LINE = re.compile(r'[ \t]*(?=([0-9]+' + _INSERT + r'[ \t]*))\1\.')
+_HEADING_LINE = re.compile(r'[ \t]*[A-Z]')
+
+def _blank(line):
+  return not line.strip(' \t')
+
+def _piece_ends(piece, line, braces):
+  if _blank(line):
+    return True
+  if braces or _SECTION_LINE.match(line) is None or _blank(piece[-1]):
+    return False
+  # Don't separate a section from its heading.
+  return not (len(piece) > 1 and _blank(piece[-2]) and _HEADING_LINE.match(piece[-1]))
+
+def parse_piece(piece, first, last):
+  """Parse the sections in a piece from split_pieces. Returns the sections,
+  and whether the body continues after the piece."""
+  text = "\n" + "\n".join(piece) + ("\n" if last else "")
+  if '\t' in text:
+    text = text.expandtabs()
+  # The first piece starts after the title's newline, unless a heading
+  # follows the title.
+  p = 1 if first and _heading(text, 0) is None else 0
+  sections, p = _list(_section, text, p)
+  return sections, _blank(text[p:])
+
+def split_pieces(tokens):
+  """Split the (line, depth) tokens of a body into pieces that can be
+  parsed separately. Yields a (lines, last) pair for each piece. Every
+  piece starts with a line at indent level 0."""
+  piece = []
+  braces = False
+  for line, depth in tokens:
+    if depth == 0 and piece and _piece_ends(piece, line, braces):
+      yield piece, False
+      piece = []
+      braces = False
+    piece.append(line)
+    braces = braces or '{' in line
+  if piece:
+    yield piece, True
+
+# A newline before an empty line or a line that starts with a digit.
+_PIECE_BREAK = re.compile(r'\n(?=\r?\n|[0-9])')
+
+def _one_line(line, blank):
+  # Whether line, with its line break, is one line that is blank or not.
+  return len(line.splitlines()) == 1 and _blank(line.rstrip('\r\n')) == blank
+
+def piece_start(text, since, start):
+  """Return the offset of the first line of text, a document, after since
+  and at or after start, where split_pieces is sure to start a piece, or
+  -1 if there is none. since is the offset of a line that starts a piece,
+  or of the line after the title. Pieces start at empty lines, and at
+  section lines at column 0 when no '{' has appeared since the last empty
+  line; a line is left out where that depends on the lines' indents."""
+  blank = max(text.rfind('\n\n', since, start), text.rfind('\n\r\n', since, start))
+  checked = since if blank == -1 else blank + 1
+  braces = False
+  for match in _PIECE_BREAK.finditer(text, max(since, start - 1)):
+    p = match.end()
+    if text[p] != '\n' and not text.startswith('\r\n', p): # A section line
+      braces = braces or text.find('{', checked, p) != -1
+      checked = p
+      if braces or _SECTION_LINE.match(text, p) is None:
+        continue
+      # The line before it is not blank, and is not a heading after a blank line.
+      q = text.rfind('\n', 0, p - 1) + 1
+      if not _one_line(text[q:p], False):
+        continue
+      if _HEADING_LINE.match(text, q) and not _one_line(text[text.rfind('\n', 0, q - 1) + 1:q], False):
+        continue
+    return p
+  return -1
+
+def _iter_body(tokens):
+  first = True
+  for piece, last in split_pieces(tokens):
+    sections, complete = parse_piece(piece, first, last)
+    yield from sections
+    if not complete: # The body ends in this piece.
+      return
+    first = False
+
+def parse_stream(tokens):
+  """Parse (line, depth) tokens from explicit_indents into an Act like
+  parse_act, except that its body is a generator that parses the sections
+  as it reads the tokens."""
+  tokens = iter(tokens)
+  return Act(parse_title_line(next(tokens, ("", 0))[0]), _iter_body(tokens))
+
+def parse_title_line(line):
+  """Parse the first line of a document, which holds only the title."""
+  line = line.expandtabs()
+  title, p = parse_title(line)
+  if not _blank(line[p:]):
+    raise _error(line, p, "Expected end of title")
+  return title
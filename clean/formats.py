@@ -0,0 +1,211 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Several output formats from one walk over a parsed act.
+#
+#   akn, tree, page = render(parse(text), ("akn", "json", "html"))
+#
+# render walks the act once, with walk, and calls the same methods of a
+# Format for each output as it goes. The Formats in FORMATS are:
+#
+#   akn    Akoma Ntoso, the same as generate_act's
+#   json   a tree of provisions, each with its eId, type, num, heading,
+#          text blocks and parts
+#   html   an <article> of nested <section>s, with the eIds as their ids
+#
+# Other formats are subclasses of Format, and can be given to render as
+# instances, or added to FORMATS under a name.
+
+import json
+from .clean import escape, parse_with, write_act
+from .nodes import Act
+from .walk import Format, walk
+
+class AknFormat(Format):
+  """Akoma Ntoso, the same as generate_act's."""
+
+  def __init__(self):
+    self._output = []
+    self.write = self._output.append
+
+  def start_act(self, node):
+    self.write('<?xml version="1.0" encoding="UTF-8"?><akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0"><act>')
+
+  def title(self, title):
+    self.write('<preface><p class="title"><shortTitle>' + escape(title) + "</shortTitle></p></preface>")
+
+  def start_body(self):
+    self.write("<body>")
+
+  def end_body(self):
+    self.write("</body>")
+
+  def end_act(self):
+    self.write("</act></akomaNtoso>")
+
+  def start_part(self, kind, eId, node):
+    self.write("<" + kind + ' eId="' + eId + '"><num>' + node.index + "</num>")
+
+  def heading(self, heading):
+    self.write("<heading>" + escape(heading) + "</heading>")
+
+  def end_part(self, kind, eId, node):
+    self.write("</" + kind + ">")
+
+  def start_block(self, block):
+    self.write("<" + block + "><p>")
+
+  def end_block(self, block):
+    self.write("</p></" + block + ">")
+
+  def text(self, text):
+    # Checked here, rather than in escape, as write_legal_text does.
+    if '&' in text or '<' in text or '>' in text:
+      text = escape(text)
+    self.write(text)
+
+  def start_span(self, eId, name):
+    self.write(' <span eId="' + eId + '">')
+
+  def end_span(self, eId, name):
+    self.write("</span> ")
+
+  def result(self):
+    return "".join(self._output)
+
+class JsonFormat(Format):
+  """A JSON object with the title and body of the act. The body is a list
+  of provisions, each an object with its eId, type (its kind), num,
+  heading if it has one, its intro, content and wrapup blocks, and its
+  parts, a list of provisions. A block is a list of strings and spans,
+  which are objects with an eId, name and text, a list like a block's."""
+
+  def __init__(self, indent=None):
+    # Without an indent, the output is as compact as it can be.
+    self.indent = indent
+    self.act = {}
+    self._parts = [] # The open provisions, after the body's list
+    self._texts = [] # The lists that text is added to
+
+  def title(self, title):
+    self.act['title'] = title
+
+  def start_body(self):
+    self._parts.append(self.act.setdefault('body', []))
+
+  def start_part(self, kind, eId, node):
+    part = {'eId': eId, 'type': kind, 'num': node.index}
+    parent = self._parts[-1]
+    if type(parent) is dict:
+      parent.setdefault('parts', []).append(part)
+    else:
+      parent.append(part)
+    self._parts.append(part)
+
+  def heading(self, heading):
+    self._parts[-1]['heading'] = heading
+
+  def end_part(self, kind, eId, node):
+    self._parts.pop()
+
+  def start_block(self, block):
+    text = self._parts[-1][block] = []
+    self._texts.append(text)
+
+  def end_block(self, block):
+    self._texts.pop()
+
+  def text(self, text):
+    self._texts[-1].append(text)
+
+  def start_span(self, eId, name):
+    span = {'eId': eId, 'name': name, 'text': []}
+    self._texts[-1].append(span)
+    self._texts.append(span['text'])
+
+  def end_span(self, eId, name):
+    self._texts.pop()
+
+  def result(self):
+    return json.dumps(self.act, indent=self.indent, ensure_ascii=False,
+      separators=None if self.indent is not None else (",", ":"))
+
+class HtmlFormat(Format):
+  """An HTML <article> for the act, with a <section> for each provision,
+  whose id is its eId and whose class is its kind. Headings are <h2> in
+  sections and <h3> in sub-sections, blocks are <p>s with their names as
+  classes, and spans are <span class="span">s."""
+
+  _HEADINGS = {'section': 'h2', 'subSection': 'h3'}
+
+  def __init__(self):
+    self._output = []
+    self.write = self._output.append
+    self._kind = None
+
+  def start_act(self, node):
+    self.write('<article class="act">')
+
+  def title(self, title):
+    self.write('<h1 class="title">' + escape(title) + "</h1>")
+
+  def end_act(self):
+    self.write("</article>")
+
+  def start_part(self, kind, eId, node):
+    num = node.index + "." if kind == 'section' else "(" + node.index + ")"
+    self.write('<section class="' + kind + '" id="' + eId + '"><span class="num">' + num + "</span>")
+    self._kind = kind
+
+  def heading(self, heading):
+    tag = self._HEADINGS[self._kind]
+    self.write("<" + tag + ' class="heading">' + escape(heading) + "</" + tag + ">")
+
+  def end_part(self, kind, eId, node):
+    self.write("</section>")
+
+  def start_block(self, block):
+    self.write('<p class="' + block + '">')
+
+  def end_block(self, block):
+    self.write("</p>")
+
+  def text(self, text):
+    # Checked here, rather than in escape, as write_legal_text does.
+    if '&' in text or '<' in text or '>' in text:
+      text = escape(text)
+    self.write(text)
+
+  def start_span(self, eId, name):
+    self.write(' <span class="span" id="' + eId + '" data-name="' + name + '">')
+
+  def end_span(self, eId, name):
+    self.write("</span> ")
+
+  def result(self):
+    return "".join(self._output)
+
+# The formats that render knows by name.
+FORMATS = {'akn': AknFormat, 'json': JsonFormat, 'html': HtmlFormat}
+
+def render(node, formats=("akn",)):
+  """Walk an Act, or the results of parsing one, once, and return a list
+  of its outputs in formats: the names of FORMATS, or Format instances."""
+  if not isinstance(node, Act):
+    node = Act.from_results(node)
+  outputs = []
+  for output in formats:
+    if isinstance(output, str):
+      if output not in FORMATS:
+        raise ValueError("Unknown output format: " + output)
+      output = FORMATS[output]()
+    outputs.append(output)
+  if len(outputs) == 1 and type(outputs[0]) is AknFormat:
+    # Akoma Ntoso alone is written faster by write_act than by the walk.
+    write_act(node, outputs[0].write)
+  else:
+    walk(node, outputs)
+  return [output.result() for output in outputs]
+
+def generate_formats(text, formats=("akn",), engine="pyparsing"):
+  """Parse a CLEAN document with engine, as generate_akn would, and return
+  its outputs in formats, as render does."""
+  return render(parse_with(text, engine), formats)
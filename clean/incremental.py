@@ -0,0 +1,111 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Incremental re-parsing of CLEAN documents, for editors.
+#
+# A Document keeps the text of a document along with its top-level pieces,
+# as fastparse.split_pieces divides them. Every piece starts at indent
+# level 0, so it can be tokenized and parsed without the rest of the text.
+# An edit splits the text again from the piece before the edit, and stops
+# at the first piece boundary after the edit that lines up with a boundary
+# from before it. The pieces after that point, and the Akoma Ntoso already
+# generated for them, are kept as they are. As in parse_stream, the text
+# after the end of the body is not split or parsed.
+
+from bisect import bisect_left, bisect_right
+from .clean import explicit_indents, write_act, write_section
+from .fastparse import parse_title_line, split_pieces, parse_piece
+from .nodes import Act
+
+class _Piece:
+  __slots__ = ('start', 'sections', 'akn')
+
+  def __init__(self, start, sections):
+    self.start = start # The offset of the piece in the text
+    self.sections = sections
+    self.akn = None
+
+def _lines(text, start, chunk_size=1 << 16):
+  # Yield (line, offset) for the lines of text from offset start, split as
+  # text.splitlines() would split them.
+  while start < len(text):
+    end = text.find('\n', start + chunk_size)
+    end = len(text) if end == -1 else end + 1
+    chunk = text[start:end]
+    for line, kept in zip(chunk.splitlines(), chunk.splitlines(True)):
+      yield line, start
+      start += len(kept)
+
+def _write_piece(piece, write):
+  if piece.akn is None:
+    fragments = []
+    for sec in piece.sections:
+      write_section(sec, fragments.append)
+    piece.akn = "".join(fragments)
+  write(piece.akn)
+
+class Document:
+  """A CLEAN document that can be edited in place. An edit parses only the
+  top-level sections around it again, and the Akoma Ntoso of the sections
+  it did not touch is reused."""
+
+  def __init__(self, text):
+    self.text = ""
+    self.title = None
+    self._pieces = []
+    self.edit(0, 0, text)
+
+  def edit(self, start, end, replacement):
+    """Replace self.text[start:end] with replacement, and parse the
+    changed sections. Returns the sections that were parsed again."""
+    if not 0 <= start <= end <= len(self.text):
+      raise IndexError("Edit is outside the document")
+    text = self.text[:start] + replacement + self.text[end:]
+    delta = len(replacement) - (end - start)
+    starts = [piece.start for piece in self._pieces]
+    index = bisect_right(starts, start) - 1
+    # An edit to the first line of a piece can join it to the piece before.
+    if index > 0:
+      lines = _lines(self.text, starts[index])
+      next(lines)
+      if start < next(lines, (None, len(self.text)))[1]:
+        index -= 1
+    index = max(index, 0)
+    offset = starts[index] if index else 0
+    line_start = [offset]
+    def lines():
+      for line, line_start[0] in _lines(text, offset):
+        yield line
+    tokens = explicit_indents(lines())
+    title = self.title
+    if index == 0: # The first piece holds the title.
+      title = parse_title_line(next(tokens, ("", 0))[0])
+    pieces = self._pieces[:index]
+    kept = []
+    for piece, last in split_pieces(tokens):
+      sections, complete = parse_piece(piece, not pieces, last)
+      pieces.append(_Piece(offset, sections))
+      # Like parse_stream, stop reading at the end of the body.
+      if last or not complete:
+        break
+      # The next piece starts on the line that ended this one.
+      offset = line_start[0]
+      old = offset - delta
+      j = bisect_left(starts, old)
+      if old >= end and 0 < j < len(starts) and starts[j] == old:
+        kept = self._pieces[j:]
+        for piece in kept:
+          piece.start += delta
+        break
+    reparsed = [sec for piece in pieces[index:] for sec in piece.sections]
+    self.text, self.title, self._pieces = text, title, pieces + kept
+    return reparsed
+
+  @property
+  def act(self):
+    """The parsed Act, as clean.parse would return it."""
+    return Act(self.title, [sec for piece in self._pieces for sec in piece.sections])
+
+  def akn(self):
+    """The Akoma Ntoso for the document, as generate_akn would return it."""
+    fragments = []
+    write_act(Act(self.title, self._pieces), fragments.append, _write_piece)
+    return "".join(fragments)
@@ -0,0 +1,209 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# A linter that checks a CLEAN document in one pass over its lines, before
+# it is parsed.
+#
+#   python -m clean.lint act.clean
+#
+# A malformed document is not always an error to the parsers: they may
+# backtrack for a long time, and then stop early or report a place far from
+# the mistake. lint reads each line once, and returns a Diagnostic, with a
+# line and column, for each of these mistakes:
+#
+#   indent     an unindent to a level that was not used before it
+#   index      an index of the wrong style for its depth, such as (1)
+#              under a paragraph, or sub-sections and paragraphs mixed
+#   numbering  an index that is not after the one before it, such as (b)
+#              after (c), or 3 after 3.1
+#   roman      a sub-paragraph index that is not a roman numeral, such as
+#              (iivivi)
+#   span       a { that is not closed before a blank line or the end of
+#              the document, or a } that closes nothing
+#
+# The CLI and the server can lint documents first, and reject the ones
+# with diagnostics without parsing them; see their --lint options.
+
+import argparse
+import re
+import sys
+from .amend import index_key
+from .nodes import Section, SubSection, Paragraph, SubParagraph
+
+# The kinds of diagnostics, in the order above.
+KINDS = ('indent', 'index', 'numbering', 'roman', 'span')
+
+_INSERT = r'(?:[ \t]*\.[ \t]*[0-9]+)*'
+# The index at the start of a line, as the parsers read it.
+_SECTION_INDEX = re.compile(r'[ \t]*(?=([0-9]+' + _INSERT + r'[ \t]*))\1\.')
+_BRACKET_INDEX = re.compile(r'[ \t]*\([ \t]*(?:([0-9]+)|([a-z]+))(' + _INSERT + r')[ \t]*\)')
+_ROMAN = re.compile(r'm{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})')
+_ROMAN_DIGITS = frozenset('ivxlcdm')
+_BRACE = re.compile(r'[{}]')
+
+# The kinds of parts that each kind of part can have, and of the parts at
+# the top level (None).
+_PARTS = {
+  None: ('section',),
+  'section': ('sub-section', 'paragraph'),
+  'sub-section': ('paragraph',),
+  'paragraph': ('sub-paragraph',),
+  'sub-paragraph': (),
+}
+_CLASSES = {'section': Section, 'sub-section': SubSection,
+  'paragraph': Paragraph, 'sub-paragraph': SubParagraph}
+_EXAMPLES = {'section': '1.', 'sub-section': '(1)', 'paragraph': '(a)', 'sub-paragraph': '(i)'}
+
+class Diagnostic:
+  """A mistake that lint found in a document: its kind, one of KINDS, and
+  a message, at a line and column counted from 1."""
+  __slots__ = ('line', 'column', 'kind', 'message')
+
+  def __init__(self, line, column, kind, message):
+    self.line = line
+    self.column = column
+    self.kind = kind
+    self.message = message
+
+  def as_dict(self):
+    return {'line': self.line, 'column': self.column, 'kind': self.kind, 'message': self.message}
+
+  def __str__(self):
+    return "%d:%d: %s" % (self.line, self.column, self.message)
+
+  def __repr__(self):
+    return "Diagnostic(%d, %d, %r, %r)" % (self.line, self.column, self.kind, self.message)
+
+class LintError(ValueError):
+  """Raised by check for a document with diagnostics. lineno and col are
+  the line and column of the first, as in pyparsing's exceptions."""
+
+  def __init__(self, diagnostics):
+    more = " (and %d more)" % (len(diagnostics) - 1) if len(diagnostics) > 1 else ""
+    super().__init__(str(diagnostics[0]) + more)
+    self.diagnostics = diagnostics
+    self.lineno = diagnostics[0].line
+    self.col = diagnostics[0].column
+
+def _expected(kinds):
+  return " or ".join("a %s index, such as %s," % (kind, _EXAMPLES[kind]) for kind in kinds)
+
+def lint(text):
+  """Check a CLEAN document, and return a list of its Diagnostics, in the
+  order of their places in it."""
+  diagnostics = []
+  def report(line, column, kind, message):
+    diagnostics.append(Diagnostic(line, column, kind, message))
+  def unclosed(braces, where):
+    for line, column in braces:
+      report(line, column, 'span', "{ is not closed before " + where)
+    del braces[:]
+
+  levels = [0] # The indent levels in use, as in explicit_indents
+  # The parts that are open, from the top level down: each is a list of
+  # its kind, its index, the kind of its parts, and the sort key and index
+  # of the last of them. The first is the document itself.
+  parts = [[None, None, None, None]]
+  braces = [] # The line and column of each { that is open
+  for number, line in enumerate(text.splitlines(), 1):
+    stripped = line.lstrip(' ')
+    level = len(line) - len(stripped)
+    if level > levels[-1]:
+      levels.append(level)
+    elif level < levels[-1]:
+      if level not in levels:
+        report(number, level + 1, 'indent', "Unindent to a level not previously used")
+        # Carry on as if the level had been used.
+        while levels[-1] > level:
+          levels.pop()
+        levels.append(level)
+      else:
+        while levels[-1] != level:
+          levels.pop()
+    if number == 1: # The title
+      continue
+    if not stripped.strip(' \t'):
+      # Spans never continue past a blank line, and the sections after it
+      # follow the ones before it.
+      unclosed(braces, "the blank line on line %d" % number)
+      del parts[1:]
+      continue
+    if '{' in line or '}' in line:
+      for brace in _BRACE.finditer(line):
+        if brace.group() == '{':
+          braces.append((number, brace.start() + 1))
+        elif braces:
+          braces.pop()
+        else:
+          report(number, brace.start() + 1, 'span', "} does not close a span")
+
+    depth = len(levels) - 1
+    del parts[depth + 2:] # The parts deeper than this line are finished.
+    parent = parts[depth] if depth < len(parts) else None
+    m = _SECTION_INDEX.match(stripped)
+    if m is not None:
+      kind, letters, index = 'section', None, m.group(1)
+    else:
+      m = _BRACKET_INDEX.match(stripped)
+      if m is None:
+        continue
+      letters = m.group(2)
+      index = (m.group(1) or letters) + m.group(3)
+      if letters is None:
+        kind = 'sub-section'
+      elif parent is not None and parent[0] == 'paragraph':
+        kind = 'sub-paragraph'
+      else:
+        kind = 'paragraph'
+    del parts[depth + 1:]
+    parts.append([kind, stripped[:m.end()].strip(), None, None])
+    if parent is None: # Indented under a line that is not a part
+      continue
+
+    column = level + len(stripped) - len(stripped.lstrip(' \t')) + 1
+    shown = parts[-1][1]
+    allowed = _PARTS[parent[0]]
+    if kind == 'sub-paragraph' and not _ROMAN_DIGITS.issuperset(letters):
+      kind = None
+    if not allowed:
+      report(number, column, 'index', "%s is inside sub-paragraph %s, which cannot have parts" % (shown, parent[1]))
+    elif kind not in allowed or parent[2] not in (None, kind):
+      expected = _expected(allowed if parent[2] is None else (parent[2],))
+      report(number, column, 'index', "Expected %s not %s" % (expected, shown))
+    elif kind == 'sub-paragraph' and not _ROMAN.fullmatch(letters):
+      report(number, column, 'roman', "%s is not a well-formed roman numeral" % shown)
+      parent[2] = kind
+    else:
+      key = index_key(index, _CLASSES[kind])
+      if parent[3] is not None and key <= parent[3][0]:
+        if key == parent[3][0]:
+          report(number, column, 'numbering', "%s has the same index as the part before it" % shown)
+        else:
+          report(number, column, 'numbering', "%s is out of order after %s" % (shown, parent[3][1]))
+      parent[2] = kind
+      parent[3] = (key, shown)
+  unclosed(braces, "the end of the document")
+  diagnostics.sort(key=lambda diagnostic: (diagnostic.line, diagnostic.column))
+  return diagnostics
+
+def check(text):
+  """Raise LintError if lint finds any mistakes in text."""
+  diagnostics = lint(text)
+  if diagnostics:
+    raise LintError(diagnostics)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="clean.lint",
+    description="Check CLEAN files for mistakes, without parsing them.")
+  parser.add_argument("paths", nargs="+", help="the .clean files to check")
+  args = parser.parse_args(argv)
+
+  found = 0
+  for path in args.paths:
+    with open(path, encoding="utf-8") as file:
+      diagnostics = lint(file.read())
+    for diagnostic in diagnostics:
+      print("%s:%s [%s]" % (path, diagnostic, diagnostic.kind))
+    found += len(diagnostics)
+  return 1 if found else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,130 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Typed nodes for parsed CLEAN documents.
+#
+# These classes use __slots__, so a parsed act takes far less memory than
+# the equivalent pyparsing ParseResults. The hand-written parser builds
+# them directly, and from_results converts a ParseResults tree (or the
+# dicts that use the same keys) from the pyparsing grammar.
+
+class Node:
+  # The _fields of a node are the slots that hold its contents, which
+  # are compared and printed. They are all of the slots unless a class
+  # says otherwise.
+  __slots__ = ()
+
+  def __init_subclass__(cls):
+    if '_fields' not in vars(cls):
+      cls._fields = cls.__slots__
+
+  def __eq__(self, other):
+    return type(self) is type(other) and \
+      all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+  def __repr__(self):
+    return type(self).__name__ + "(" + ", ".join(
+      name + "=" + repr(getattr(self, name)) for name in self._fields) + ")"
+
+class LegalText(tuple):
+  """A run of legal text: a tuple of strings and Spans."""
+  __slots__ = ()
+
+  @classmethod
+  def from_results(cls, node):
+    return cls(element if type(element) == str else Span.from_results(element) for element in node)
+
+  def __repr__(self):
+    return "LegalText(" + tuple.__repr__(self) + ")"
+
+EMPTY_TEXT = LegalText()
+
+def _text(node, name):
+  return LegalText.from_results(node[name]) if name in node else EMPTY_TEXT
+
+def _list(cls, node, name):
+  return [cls.from_results(part) for part in node[name]] if name in node else None
+
+class Span(Node):
+  __slots__ = ('name', 'body')
+
+  def __init__(self, name, body=EMPTY_TEXT):
+    self.name = name
+    self.body = body
+
+  @classmethod
+  def from_results(cls, node):
+    return cls(node['span name'][0], LegalText.from_results(node['span body']))
+
+class SubParagraph(Node):
+  __slots__ = ('index', 'text')
+
+  def __init__(self, index, text=EMPTY_TEXT):
+    self.index = index
+    self.text = text
+
+  @classmethod
+  def from_results(cls, node):
+    return cls(node['sub-paragraph index'][0], _text(node, 'sub-paragraph text'))
+
+class Paragraph(Node):
+  __slots__ = ('index', 'text', 'sub_paragraphs', 'post')
+
+  def __init__(self, index, text=EMPTY_TEXT, sub_paragraphs=None, post=EMPTY_TEXT):
+    self.index = index
+    self.text = text
+    self.sub_paragraphs = sub_paragraphs
+    self.post = post
+
+  @classmethod
+  def from_results(cls, node):
+    return cls(node['paragraph index'][0], _text(node, 'paragraph text'),
+      _list(SubParagraph, node, 'sub-paragraphs'), _text(node, 'paragraph post'))
+
+class SubSection(Node):
+  __slots__ = ('index', 'heading', 'text', 'paragraphs', 'post')
+
+  def __init__(self, index, heading=None, text=EMPTY_TEXT, paragraphs=None, post=EMPTY_TEXT):
+    self.index = index
+    self.heading = heading
+    self.text = text
+    self.paragraphs = paragraphs
+    self.post = post
+
+  @classmethod
+  def from_results(cls, node):
+    return cls(node['sub-section index'][0], node['heading text'] if 'heading text' in node else None,
+      _text(node, 'sub-section text'), _list(Paragraph, node, 'paragraphs'), _text(node, 'sub-section post'))
+
+class Section(Node):
+  """A top-level section. At most one of sub_sections and paragraphs is a
+  list; they are None when the section has no indented parts.
+
+  source_hash is a digest of the text that the hand-written parser read
+  the section from, or None. It is not part of the section's contents."""
+  _fields = ('index', 'heading', 'text', 'sub_sections', 'paragraphs', 'post')
+  __slots__ = _fields + ('source_hash',)
+
+  def __init__(self, index, heading=None, text=EMPTY_TEXT, sub_sections=None, paragraphs=None, post=EMPTY_TEXT, source_hash=None):
+    self.index = index
+    self.heading = heading
+    self.text = text
+    self.sub_sections = sub_sections
+    self.paragraphs = paragraphs
+    self.post = post
+    self.source_hash = source_hash
+
+  @classmethod
+  def from_results(cls, node):
+    return cls(node['section index'][0], node['heading text'] if 'heading text' in node else None,
+      _text(node, 'section text'), _list(SubSection, node, 'sub-sections'),
+      _list(Paragraph, node, 'paragraphs'), _text(node, 'section post'))
+
+class Act(Node):
+  __slots__ = ('title', 'body')
+
+  def __init__(self, title=None, body=None):
+    self.title = title
+    self.body = body
+
+  @classmethod
+  def from_results(cls, node):
+    return cls(node['title text'] if 'title' in node else None, _list(Section, node, 'body'))
@@ -0,0 +1,82 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Profiles of conversions, to show where the time goes.
+#
+# Pass a Profile to generate_akn to fill it in:
+#
+#   profile = Profile()
+#   generate_akn(text, profile=profile)
+#   print(profile.hot_spots())
+#
+# Profiling is slow: memory is traced while each stage runs, and the
+# pyparsing engines call back into the profile for every attempt to match
+# a named grammar element. Compare timings between profiles, not with
+# unprofiled runs.
+
+import time
+
+class Profile:
+  """A report on one conversion by generate_akn.
+
+  stages maps each stage of the conversion ("indent", "parse" and
+  "generate") to its wall time in seconds, and the peak and retained memory
+  allocated while it ran, in bytes. elements maps the name of each grammar
+  element in build_grammar to the number of attempts to match it, and how
+  many of those matched and failed. Attempts answered from the packrat
+  cache are counted as cache hits instead. The hand-written parser has no
+  grammar elements, so elements stays empty for it."""
+
+  def __init__(self):
+    self.stages = {}
+    self.elements = {}
+
+  def stage(self, name, function, *args):
+    """Run function(*args) as the named stage, and return its result."""
+    import tracemalloc # Only when profiling; it is slow to import.
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+      tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'): # Python 3.9 and later
+      tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+      result = function(*args)
+    finally:
+      seconds = time.perf_counter() - start
+      current, peak = tracemalloc.get_traced_memory()
+      if not tracing:
+        tracemalloc.stop()
+    self.stages[name] = {'seconds': seconds, 'peak memory': peak - base,
+      'retained memory': current - base}
+    return result
+
+  def watch(self, name, element):
+    """Count the attempts to match a grammar element under name. This is
+    the watch argument of build_grammar."""
+    counts = self.elements.setdefault(name,
+      {'attempts': 0, 'matches': 0, 'failures': 0, 'cache hits': 0})
+
+    def start(instring, loc, expr, cache_hit=False):
+      if cache_hit:
+        counts['cache hits'] += 1
+      else:
+        counts['attempts'] += 1
+
+    def success(instring, start, end, expr, tokens, cache_hit=False):
+      if not cache_hit:
+        counts['matches'] += 1
+
+    def failure(instring, loc, expr, exception, cache_hit=False):
+      if not cache_hit:
+        counts['failures'] += 1
+
+    element.set_debug_actions(start, success, failure)
+
+  def hot_spots(self, count=5):
+    """Return the (name, counts) of the count elements that failed to
+    match most often, which is where a parse spends its time backtracking."""
+    return sorted(self.elements.items(), key=lambda item: -item[1]['failures'])[:count]
+
+  def as_dict(self):
+    """Return the profile as a dict that can be saved as JSON."""
+    return {'stages': self.stages, 'elements': self.elements}
@@ -0,0 +1,330 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# A long-running conversion server.
+#
+#   python -m clean.server --port 8000 --workers 4
+#
+# serves POST /convert on localhost, and
+#
+#   python -m clean.server --stdio
+#
+# reads one JSON request per line from standard input, and writes one JSON
+# response per line to standard output. Either way, the conversions run in
+# a pool of worker processes that are started, with the grammar built,
+# before the first request, so no request pays for either.
+#
+# A request is a JSON object:
+#
+#   {"text": "<CLEAN text>", "engine": "fast", "id": 1}
+#
+# where only text is required. engine defaults to the server's engine, and
+# id, if given, is copied into the response. A response is either
+#
+#   {"id": 1, "akn": "<Akoma Ntoso>"}
+#
+# or, if the request could not be converted,
+#
+#   {"id": 1, "error": {"kind": "parse", "type": "ParseException",
+#     "message": "...", "line": 1, "column": 1}}
+#
+# where kind is one of the keys of HTTP_STATUS, and line and column are
+# only given for errors that have them. Over stdio, responses are written
+# as their conversions finish, which may not be the order of the requests.
+#
+# With --lint, the text of each request is checked by lint first, and if it
+# has mistakes, the error has type "LintError", the place of the first,
+# and a list of all of them as "diagnostics", and the text is not parsed.
+
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .clean import ENGINES, generate_akn
+from .lint import check
+
+# The largest request, in bytes, that is read by default.
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+# The HTTP status of a response with each kind of error.
+HTTP_STATUS = {
+  'request': 400, # The request was not a valid conversion request.
+  'not found': 404,
+  'too large': 413,
+  'parse': 422, # The text could not be converted.
+  'busy': 503, # Too many requests were already waiting.
+  'server': 500,
+}
+
+def _warm(engine):
+  # Build the grammar an engine uses in a new worker process, and run
+  # through the rest of a conversion once.
+  generate_akn("Act\n\n1. Section.", engine=engine)
+
+def _ready():
+  return os.getpid()
+
+def _error(kind, message, **details):
+  return {'error': dict(kind=kind, message=message, **details)}
+
+def _convert(text, engine, lint=False):
+  # Run in a worker. Errors are returned as dicts, because not every
+  # exception can be sent back from a worker process.
+  try:
+    if lint:
+      check(text)
+    return {'akn': generate_akn(text, engine=engine)}
+  except Exception as error:
+    details = {'type': type(error).__name__}
+    if hasattr(error, 'lineno') and hasattr(error, 'col'): # pyparsing and lint errors
+      details.update(line=error.lineno, column=error.col)
+    if hasattr(error, 'diagnostics'):
+      details['diagnostics'] = [diagnostic.as_dict() for diagnostic in error.diagnostics]
+    return _error('parse', str(error), **details)
+
+class _RequestError(Exception):
+  def __init__(self, kind, message, request_id=None):
+    super().__init__(message)
+    self.kind = kind
+    self.request_id = request_id
+
+class Conversions:
+  """A pool of worker processes that convert requests, with at most
+  max_pending requests waiting for or being converted at once. With lint,
+  requests are linted before they are parsed. If a worker dies, the
+  requests that the pool had get 'server' errors, and a new pool converts
+  the ones after them."""
+
+  def __init__(self, workers=None, engine="fast", max_size=MAX_REQUEST_SIZE, max_pending=None, lint=False):
+    if engine not in ENGINES:
+      raise ValueError("Unknown parser engine: " + str(engine))
+    self.workers = workers or os.cpu_count() or 1
+    self.engine = engine
+    self.max_size = max_size
+    self.max_pending = max_pending or 2 * self.workers
+    self.lint = lint
+    self._slots = threading.BoundedSemaphore(self.max_pending)
+    self._restarting = threading.Lock()
+    self._pool = self._start()
+    # Start every worker now, rather than at the first requests.
+    wait([self._pool.submit(_ready) for _ in range(self.workers)])
+
+  def _start(self):
+    return ProcessPoolExecutor(max_workers=self.workers,
+      initializer=_warm, initargs=(self.engine,))
+
+  def _restart(self, broken):
+    # Replace the pool broken, after one of its workers died, unless it has
+    # been replaced already. Its workers start with the next requests.
+    with self._restarting:
+      if self._pool is broken:
+        self._pool = self._start()
+        broken.shutdown(wait=False)
+
+  def _read(self, raw):
+    # Return the text, engine and id of a request, or raise _RequestError.
+    if len(raw) > self.max_size:
+      raise _RequestError('too large', "Requests must be at most %d bytes" % self.max_size)
+    try:
+      request = json.loads(raw)
+    except ValueError as error:
+      raise _RequestError('request', "Request is not JSON: " + str(error))
+    if not isinstance(request, dict):
+      raise _RequestError('request', "Request must be a JSON object")
+    request_id = request.get('id')
+    unknown = set(request) - {'text', 'engine', 'id'}
+    if unknown:
+      raise _RequestError('request', "Unknown request fields: " + ", ".join(sorted(unknown)), request_id)
+    if not isinstance(request.get('text'), str):
+      raise _RequestError('request', "Request must have text, as a string", request_id)
+    engine = request.get('engine', self.engine)
+    if engine not in ENGINES:
+      raise _RequestError('request', "Unknown parser engine: " + str(engine), request_id)
+    return request['text'], engine, request_id
+
+  def submit(self, raw, block=True):
+    """Start converting raw, the bytes or text of one JSON request, and
+    return a Future of the response. If max_pending requests are already
+    pending, wait for one to finish, or with block=False, respond that the
+    server is busy."""
+    future = Future()
+    def respond(response, request_id):
+      if request_id is not None:
+        response = dict(id=request_id, **response)
+      future.set_result(response)
+    try:
+      text, engine, request_id = self._read(raw)
+    except _RequestError as error:
+      respond(_error(error.kind, str(error)), error.request_id)
+      return future
+    if not self._slots.acquire(blocking=block):
+      respond(_error('busy', "Too many requests are pending"), request_id)
+      return future
+    def server_error(error):
+      respond(_error('server', str(error) or type(error).__name__, type=type(error).__name__), request_id)
+    def done(work, pool):
+      self._slots.release()
+      try:
+        response = work.result()
+      except BrokenProcessPool as error: # A worker process died.
+        self._restart(pool)
+        server_error(error)
+      except Exception as error:
+        server_error(error)
+      else:
+        respond(response, request_id)
+    # If the pool broke since the last request, try again with a new one.
+    for attempt in range(2):
+      pool = self._pool
+      try:
+        work = pool.submit(_convert, text, engine, self.lint)
+      except BrokenProcessPool as error:
+        self._restart(pool)
+        if attempt:
+          self._slots.release()
+          server_error(error)
+        continue
+      except Exception:
+        self._slots.release()
+        raise
+      work.add_done_callback(lambda work, pool=pool: done(work, pool))
+      break
+    return future
+
+  def convert(self, raw, block=True):
+    """Convert one request, and return the response."""
+    return self.submit(raw, block).result()
+
+  def close(self):
+    # Pending requests are bounded by max_pending, so finish them.
+    self._pool.shutdown()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+class _Handler(BaseHTTPRequestHandler):
+  server_version = "clean"
+  protocol_version = "HTTP/1.1"
+
+  def _reply(self, status, response):
+    body = json.dumps(response).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def _error(self, kind, message):
+    self._reply(HTTP_STATUS[kind], _error(kind, message))
+
+  def do_GET(self):
+    if self.path == "/health":
+      conversions = self.server.conversions
+      self._reply(200, {'status': 'ok', 'workers': conversions.workers,
+        'engine': conversions.engine, 'max size': conversions.max_size})
+    else:
+      self._error('not found', "No such path: " + self.path)
+
+  def do_POST(self):
+    if self.path != "/convert":
+      self.close_connection = True
+      return self._error('not found', "No such path: " + self.path)
+    conversions = self.server.conversions
+    try:
+      length = int(self.headers["Content-Length"])
+    except (TypeError, ValueError):
+      self.close_connection = True
+      return self._error('request', "Requests need a Content-Length")
+    if length > conversions.max_size:
+      # The body is not read, so the connection can't be used again.
+      self.close_connection = True
+      return self._error('too large', "Requests must be at most %d bytes" % conversions.max_size)
+    response = conversions.convert(self.rfile.read(length), block=False)
+    self._reply(HTTP_STATUS[response['error']['kind']] if 'error' in response else 200, response)
+
+  def log_message(self, format, *args):
+    if self.server.verbose:
+      super().log_message(format, *args)
+
+def http_server(conversions, host="127.0.0.1", port=8000, verbose=False):
+  """Return an HTTP server for conversions, which handles each request in
+  its own thread. Call its serve_forever method to start it. With port 0,
+  it listens on a free port, which is server.server_address[1]."""
+  server = ThreadingHTTPServer((host, port), _Handler)
+  server.daemon_threads = True
+  server.conversions = conversions
+  server.verbose = verbose
+  return server
+
+def serve_lines(conversions, input, output):
+  """Convert one JSON request from each line of input, a binary stream,
+  and write a JSON response line to output, a text stream, as each is
+  done. Returns when input ends and every response has been written."""
+  lock = threading.Lock()
+  def write(future):
+    with lock:
+      output.write(json.dumps(future.result()) + "\n")
+      output.flush()
+  pending = []
+  while True:
+    line = input.readline(conversions.max_size + 1)
+    if not line:
+      break
+    if len(line) > conversions.max_size:
+      # Respond that it is too large, without reading the rest of it.
+      rest = line
+      while rest and not rest.endswith(b"\n"):
+        rest = input.readline(conversions.max_size)
+    elif not line.strip():
+      continue
+    # Waiting for a free slot here stops reading until a request is done.
+    future = conversions.submit(line)
+    future.add_done_callback(write)
+    pending.append(future)
+    pending = [f for f in pending if not f.done()]
+  wait(pending)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="clean.server",
+    description="Serve CLEAN to Akoma Ntoso conversions from a pool of warm workers.")
+  parser.add_argument("--host", default="127.0.0.1",
+    help="the address to listen on (default: 127.0.0.1)")
+  parser.add_argument("--port", type=int, default=8000,
+    help="the port to listen on (default: 8000)")
+  parser.add_argument("--stdio", action="store_true",
+    help="read JSON requests from standard input, one per line, instead of serving HTTP")
+  parser.add_argument("-w", "--workers", type=int,
+    help="the number of worker processes (default: the number of CPUs)")
+  parser.add_argument("--engine", choices=ENGINES, default="fast",
+    help="the parser engine for requests that don't name one (default: fast)")
+  parser.add_argument("--max-size", type=int, default=MAX_REQUEST_SIZE,
+    help="the largest request to accept, in bytes (default: %d)" % MAX_REQUEST_SIZE)
+  parser.add_argument("--max-pending", type=int,
+    help="the most requests to convert or queue at once (default: twice the workers)")
+  parser.add_argument("--lint", action="store_true",
+    help="reject requests whose text lint finds mistakes in, without parsing them")
+  parser.add_argument("-v", "--verbose", action="store_true",
+    help="log each HTTP request")
+  args = parser.parse_args(argv)
+
+  with Conversions(args.workers, args.engine, args.max_size, args.max_pending, args.lint) as conversions:
+    if args.stdio:
+      serve_lines(conversions, sys.stdin.buffer, sys.stdout)
+      return 0
+    server = http_server(conversions, args.host, args.port, args.verbose)
+    print("Serving on http://%s:%d/convert with %d workers" %
+      (server.server_address[0], server.server_address[1], conversions.workers), file=sys.stderr)
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      server.server_close()
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,146 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Sidecar indexes of generated Akoma Ntoso, which give the byte offsets of
+# each element with an eId, so that one provision can be read from a large
+# file without parsing the XML.
+#
+#   write_indexed_akn(parse(text), "act.xml")  # also writes act.xml.idx
+#
+#   with ProvisionReader("act.xml") as reader:
+#     print(reader["sec_34__subsec_1__para_b"])
+#
+# The offsets are recorded while the Akoma Ntoso is written: the write_*
+# functions in clean.py call OffsetWriter.mark where each element with an
+# eId starts and ends.
+#
+# An index file is INDEX_MAGIC, followed by an entry for each element, in
+# the order they start in the output: the start and end byte offsets as
+# little-endian 64-bit numbers, the length of the eId as a 16-bit number,
+# then the eId in UTF-8. Where two elements have the same eId, such as two
+# spans with the same name in one paragraph, the index has the first.
+
+import mmap
+import os
+import struct
+from .clean import write_act, write_section
+from .nodes import Act
+
+INDEX_MAGIC = b"CLEANIDX1\n"
+_ENTRY = struct.Struct("<QQH")
+
+class OffsetWriter:
+  """A write function that writes UTF-8 to a binary stream (or appends to a
+  list), and records the byte offsets of each element with an eId in
+  offsets, a dict from eId to (start, end)."""
+
+  def __init__(self, write):
+    self.write = write
+    self.offset = 0
+    self.offsets = {}
+    self._open = []
+
+  def __call__(self, fragment):
+    data = fragment.encode("utf-8")
+    self.offset += len(data)
+    self.write(data)
+
+  def mark(self, eId):
+    """Record that the element with eId starts here, or with None, that
+    the innermost element that has started ends here."""
+    if eId is not None:
+      self._open.append((eId, self.offset))
+    else:
+      eId, start = self._open.pop()
+      if eId not in self.offsets:
+        self.offsets[eId] = (start, self.offset)
+
+  def write_section(self, node, write):
+    # A section_writer for write_act.
+    write_section(node, write, self.mark)
+
+def generate_indexed_akn(node):
+  """Return the Akoma Ntoso for an Act, as bytes of UTF-8, and the offsets
+  of its elements, as OffsetWriter records them."""
+  if not isinstance(node, Act):
+    node = Act.from_results(node)
+  output = []
+  writer = OffsetWriter(output.append)
+  write_act(node, writer, writer.write_section)
+  return b"".join(output), writer.offsets
+
+def write_index(offsets, file):
+  """Write offsets, a dict from eId to (start, end), to a binary stream."""
+  file.write(INDEX_MAGIC)
+  for eId, (start, end) in sorted(offsets.items(), key=lambda item: item[1][0]):
+    name = eId.encode("utf-8")
+    file.write(_ENTRY.pack(start, end, len(name)))
+    file.write(name)
+
+def read_index(data):
+  """Return the dict of offsets in the bytes of an index file."""
+  if not data.startswith(INDEX_MAGIC):
+    raise ValueError("Not a CLEAN sidecar index")
+  offsets = {}
+  p = len(INDEX_MAGIC)
+  while p < len(data):
+    start, end, length = _ENTRY.unpack_from(data, p)
+    p += _ENTRY.size
+    offsets[data[p:p+length].decode("utf-8")] = (start, end)
+    p += length
+  return offsets
+
+def index_path(path):
+  """The sidecar index file for an Akoma Ntoso file."""
+  return path + ".idx"
+
+def write_indexed_akn(node, path, index=None):
+  """Write the Akoma Ntoso for an Act to the file path, and its index to
+  index, by default index_path(path)."""
+  if not isinstance(node, Act):
+    node = Act.from_results(node)
+  with open(path, "wb") as file:
+    writer = OffsetWriter(file.write)
+    write_act(node, writer, writer.write_section)
+  with open(index or index_path(path), "wb") as file:
+    write_index(writer.offsets, file)
+
+class ProvisionReader:
+  """Read single provisions, by eId, from an Akoma Ntoso file with a
+  sidecar index. The file is memory-mapped, so reading a provision only
+  reads its own pages."""
+
+  def __init__(self, path, index=None):
+    with open(index or index_path(path), "rb") as file:
+      self.offsets = read_index(file.read())
+    self._file = open(path, "rb")
+    if os.fstat(self._file.fileno()).st_size:
+      self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+      self._map = b"" # mmap can't map an empty file.
+
+  def bytes(self, eId):
+    """The UTF-8 of the element with eId. Raises KeyError if there is none."""
+    start, end = self.offsets[eId]
+    return self._map[start:end]
+
+  def __getitem__(self, eId):
+    return self.bytes(eId).decode("utf-8")
+
+  def __contains__(self, eId):
+    return eId in self.offsets
+
+  def __iter__(self):
+    return iter(self.offsets)
+
+  def __len__(self):
+    return len(self.offsets)
+
+  def close(self):
+    if isinstance(self._map, mmap.mmap):
+      self._map.close()
+    self._file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
@@ -0,0 +1,173 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Random access to the top-level sections of large .clean files.
+#
+#   section = parse_section("act.clean", "34")
+#
+# parses only section 34. The first time a file is used, it is parsed
+# once, by the hand-written parser, for the byte offsets of its sections,
+# and the index is saved beside it, as source_index_path(path), for later
+# runs. An index is made again when the size or modification time of its
+# file changes.
+#
+# The index is made with the same split_pieces and parse_piece as parse,
+# so it has exactly the sections that parse finds. A piece that holds more
+# than one section, such as one whose sections may be inside a span, is
+# the source of each of them. The file is memory-mapped and read a line
+# at a time, so only the lines of one piece are in memory at once.
+
+import json
+import mmap
+import os
+from .clean import explicit_indents, parse_with
+from .fastparse import parse_piece, split_pieces
+from .nodes import Act
+
+# The format of saved indexes. Change it when the index changes.
+SOURCE_INDEX_FORMAT = 2
+
+def section_key(index):
+  """The key of a section index in a SectionIndex: the index without
+  spaces, such as "1.1" for "1 . 1"."""
+  return "".join(index.split())
+
+def source_index_path(path):
+  """The file that the SectionIndex of a .clean file is saved in."""
+  return path + ".sections"
+
+class SectionIndex:
+  """The top-level sections of a .clean file. sections is a dict from the
+  section_key of each section's index to its heading (or None), and the
+  start and end byte offsets of its source, heading included. Where
+  sections have the same index, it has the first."""
+
+  def __init__(self, sections, size, mtime):
+    self.sections = sections
+    self.size = size
+    self.mtime = mtime
+
+  def __getitem__(self, index):
+    return self.sections[section_key(index)]
+
+  def __contains__(self, index):
+    return section_key(index) in self.sections
+
+  def __iter__(self):
+    return iter(self.sections)
+
+  def __len__(self):
+    return len(self.sections)
+
+  def fresh(self, path):
+    """Whether the index is still the index of the file path."""
+    stat = os.stat(path)
+    return stat.st_size == self.size and stat.st_mtime_ns == self.mtime
+
+  def save(self, path):
+    with open(path, "w", encoding="utf-8") as file:
+      json.dump({'format': SOURCE_INDEX_FORMAT, 'size': self.size, 'mtime': self.mtime,
+        'sections': [[key] + list(entry) for key, entry in self.sections.items()]}, file)
+
+  @classmethod
+  def load(cls, path):
+    """Read a saved index. Raises ValueError if it has another format."""
+    with open(path, encoding="utf-8") as file:
+      saved = json.load(file)
+    if saved.get('format') != SOURCE_INDEX_FORMAT:
+      raise ValueError("Not a CLEAN section index of format %d" % SOURCE_INDEX_FORMAT)
+    return cls({key: (heading, start, end) for key, heading, start, end in saved['sections']},
+      saved['size'], saved['mtime'])
+
+def _tokens(data, starts):
+  # The tokens of explicit_indents for data, a memory-mapped .clean file,
+  # and for each, the byte offset of the line it comes from, appended to
+  # starts. The lines are read one at a time, and split as iter_lines
+  # would split the decoded text.
+  offset = 0
+  def lines():
+    nonlocal offset
+    for line in iter(data.readline, b""):
+      text = line.decode("utf-8")
+      parts = text.splitlines()
+      if len(parts) == 1:
+        yield parts[0]
+        offset += len(line)
+        continue
+      # A line read up to "\n" may hold other line breaks, such as "\r".
+      for part in text.splitlines(keepends=True):
+        yield part.splitlines()[0]
+        offset += len(part.encode("utf-8"))
+  for token in explicit_indents(lines()):
+    starts.append(offset)
+    yield token
+
+def _scan(data):
+  # Return a dict of (heading, start, end) for the sections in data, a
+  # memory-mapped .clean file. Only the lines of one piece are kept at once.
+  sections = {}
+  starts = [] # The byte offsets of the tokens from the piece's first on
+  tokens = _tokens(data, starts)
+  if next(tokens, None) is None: # The title
+    return sections
+  del starts[:1]
+  first = True
+  for piece, last in split_pieces(tokens):
+    found, complete = parse_piece(piece, first, last)
+    if found:
+      skip = 0 # A piece may start with blank lines, which are left out.
+      while not piece[skip].strip(" \t"):
+        skip += 1
+      end = len(data) if last else starts[len(piece)]
+      for section in found:
+        sections.setdefault(section_key(section.index), (section.heading, starts[skip], end))
+    if not complete: # The body ends in this piece.
+      break
+    first = False
+    del starts[:len(piece)]
+  return sections
+
+def index_source(path):
+  """Parse the .clean file path, as parse does, and return its
+  SectionIndex. Raises the parser's errors if it can't be parsed."""
+  with open(path, "rb") as file:
+    stat = os.fstat(file.fileno())
+    if not stat.st_size: # An empty file can't be mapped.
+      return SectionIndex({}, stat.st_size, stat.st_mtime_ns)
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+      return SectionIndex(_scan(data), stat.st_size, stat.st_mtime_ns)
+
+def section_index(path, save=True):
+  """Return the SectionIndex of the .clean file path: the saved one, if it
+  is fresh, or a new one, which is saved if save is true."""
+  try:
+    index = SectionIndex.load(source_index_path(path))
+    if index.fresh(path):
+      return index
+  except (OSError, ValueError, KeyError, TypeError):
+    pass
+  index = index_source(path)
+  if save:
+    try:
+      index.save(source_index_path(path))
+    except OSError: # The directory may be read-only.
+      pass
+  return index
+
+def parse_section(path, index, engine="fast", sections=None):
+  """Parse only the top-level section of the .clean file path with index,
+  such as "34", and return it as a Section. sections is the file's
+  SectionIndex, by default section_index(path). Raises KeyError if there
+  is no such section."""
+  if sections is None:
+    sections = section_index(path)
+  _, start, end = sections[index]
+  with open(path, "rb") as file:
+    file.seek(start)
+    text = file.read(end - start).decode("utf-8")
+  # The section, with a title and blank line before it, is a document.
+  parsed = parse_with("Section\n\n" + text, engine)
+  if not isinstance(parsed, Act):
+    parsed = Act.from_results(parsed)
+  for sec in parsed.body:
+    if section_key(sec.index) == section_key(index):
+      return sec
+  raise KeyError(index)
@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from ..clean import *
+from ..aio import generate_akn_async, generate_akn_many
+
+TEXTS = ["Act %d\n\n1. Section %d.\n  (a) [s]{span}" % (i, i) for i in range(6)]
+
+@pytest.fixture(scope="module")
+def executor():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+def collect(texts, executor, **options):
+    async def run():
+        return [result async for result in generate_akn_many(texts, executor=executor, **options)]
+    return asyncio.run(run())
+
+def test_generate_akn_async(executor):
+    assert asyncio.run(generate_akn_async(TEXTS[0], executor=executor)) == generate_akn(TEXTS[0], engine="fast")
+
+def test_many_in_order(executor):
+    results = collect(TEXTS, executor, concurrency=3)
+    assert results == [(i, generate_akn(text, engine="fast")) for i, text in enumerate(TEXTS)]
+
+def test_many_as_completed(executor):
+    results = collect(TEXTS, executor, concurrency=3, ordered=False)
+    assert sorted(results) == [(i, generate_akn(text, engine="fast")) for i, text in enumerate(TEXTS)]
+
+def test_many_from_async_iterable(executor):
+    async def texts():
+        for text in TEXTS:
+            yield text
+    assert [i for i, _ in collect(texts(), executor, concurrency=2)] == list(range(len(TEXTS)))
+
+def test_many_takes_texts_as_needed(executor):
+    taken = []
+    def texts():
+        for text in TEXTS:
+            taken.append(text)
+            yield text
+    async def first():
+        results = generate_akn_many(texts(), concurrency=2, executor=executor)
+        result = await results.__anext__()
+        await results.aclose()
+        return result
+    assert asyncio.run(first())[0] == 0
+    assert len(taken) == 2
+
+def test_many_errors(executor):
+    texts = [TEXTS[0], "not a title", TEXTS[1]]
+    with pytest.raises(ParseException):
+        collect(texts, executor)
+    results = collect(texts, executor, return_exceptions=True)
+    assert isinstance(results[1][1], ParseException)
+    assert results[2] == (2, generate_akn(TEXTS[1], engine="fast"))
+
+def test_cancel(executor):
+    async def run():
+        task = asyncio.ensure_future(generate_akn_async(TEXTS[0], executor=executor))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(run())
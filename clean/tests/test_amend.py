@@ -0,0 +1,60 @@
+import pytest
+from ..clean import *
+from ..amend import AmendableAct, index_key
+from ..nodes import Section, SubSection, Paragraph, SubParagraph, LegalText
+
+TEXT = "Act\n\n1. First.\n3. Third\n  (1) sub-section\n    (a) paragraph\n    (c) another\n  (2) second\n4. Fourth."
+
+def test_index_key_orders_insert_indexes():
+    keys = [index_key(i, Section) for i in ["3", "3.1", "3 . 1 . 1", "3.2", "4"]]
+    assert keys == sorted(keys)
+    assert index_key("3.1", Section) == (3, (1,))
+    assert index_key("b.2", Paragraph) == (2, (2,))
+    assert index_key("aa", Paragraph) > index_key("z", Paragraph)
+    assert index_key("iv", SubParagraph) == (4, ())
+    assert index_key("ix.1", SubParagraph) < index_key("x", SubParagraph)
+
+def test_amendments_match_parsing_the_amended_text():
+    act = AmendableAct(parse(TEXT))
+    act.insert_after("sec_1", Section("1.1", text=LegalText(["Inserted."])))
+    act.insert_after("sec_3__subsec_1__para_a", Paragraph("b", text=LegalText(["new"])))
+    act.repeal("sec_3__subsec_2")
+    act.replace_text("sec_4", "Replaced with a [s]{span}.")
+    act.insert("sec_3__subsec_1__para_c", SubParagraph("i", text=LegalText(["sub"])))
+    amended = "Act\n\n1. First.\n1.1. Inserted.\n3. Third\n  (1) sub-section\n    (a) paragraph\n    (b) new\n    (c) another\n      (i) sub\n4. Replaced with a [s]{span}."
+    assert act.akn() == generate_akn(amended)
+    assert act.akn() == generate_act(act.act)
+
+def test_amendments_only_regenerate_changed_sections():
+    act = AmendableAct(parse(TEXT))
+    act.akn()
+    cached = dict(act._akn)
+    act.replace_text("sec_3__subsec_1__para_c", LegalText(["changed"]))
+    assert act.act.body[1].source_hash is None
+    assert id(act.act.body[1]) not in act._akn
+    assert act._akn[id(act.act.body[0])] is cached[id(act.act.body[0])]
+    assert "changed" in act.akn()
+
+def test_amendments_must_keep_order():
+    act = AmendableAct(parse(TEXT))
+    with pytest.raises(ValueError):
+        act.insert_after("sec_1", Section("4.1"))
+    with pytest.raises(ValueError):
+        act.insert_after("sec_1", Section("3"))
+    with pytest.raises(ValueError):
+        act.insert_after("sec_1", SubSection("1.1"))
+    with pytest.raises(ValueError):
+        act.insert("sec_3", Paragraph("a"))
+    with pytest.raises(KeyError):
+        act.repeal("sec_2")
+    with pytest.raises(KeyError):
+        act.part("sec_3__subsec_1__para_b")
+    assert act.akn() == generate_akn(TEXT)
+
+def test_replace_post_needs_indented_parts():
+    act = AmendableAct(parse(TEXT))
+    for eId in ["sec_1", "sec_3__subsec_2", "sec_3__subsec_1__para_a"]:
+        with pytest.raises(ValueError):
+            act.replace_text(eId, "wrapped up", post=True)
+    act.replace_text("sec_3__subsec_1", "wrapped up", post=True)
+    assert act.akn() == generate_akn(TEXT.replace("  (2) second", "  wrapped up\n  (2) second"))
@@ -48,6 +48,14 @@ def test_gen_legal_text_with_nested_span():
     an = generate_legal_text(parse)
     assert an == 'This is outside <span eId="one">inside one <span eId="one__span_two">inside two</span> one</span> none.'
 
+def test_gen_escapes_text():
+    text = "Act & <Co>\n\nA & B\n1. If x < y & [s]{y > z}."
+    for engine in ENGINES:
+        an = generate_akn(text, engine=engine)
+        assert "<shortTitle>Act &amp; &lt;Co&gt;</shortTitle>" in an
+        assert "<heading>A &amp; B</heading>" in an
+        assert '<p>If x &lt; y &amp; <span eId="sec_1__span_s">y &gt; z</span> .</p>' in an
+
 def tests_r34_span():
     with open('clean/tests/r34span.clean','r') as file:
         parse = act.parse_string(addExplicitIndents(file.read()),parse_all=True)
@@ -0,0 +1,88 @@
+import os
+import shutil
+import pytest
+from ..clean import *
+from ..cli import main
+
+@pytest.fixture
+def sources(tmp_path):
+    source = tmp_path / "acts"
+    (source / "sub").mkdir(parents=True)
+    shutil.copy('clean/tests/rps.clean', source)
+    shutil.copy('clean/tests/r34span.clean', source / "sub")
+    return source
+
+@pytest.mark.parametrize("jobs",["1","2"])
+def test_convert_directory(sources, tmp_path, jobs):
+    output = tmp_path / "akn"
+    assert main([str(sources), "-o", str(output), "-j", jobs]) == 0
+    with open('clean/tests/r34span.clean','r') as file:
+        assert (output / "sub" / "r34span.xml").read_text() == generate_akn(file.read())
+    assert (output / "rps.xml").exists()
+
+def test_skip_up_to_date(sources, tmp_path, capsys):
+    output = tmp_path / "akn"
+    main([str(sources), "-o", str(output)])
+    os.utime(sources / "rps.clean", (0, 0))
+    capsys.readouterr()
+    assert main([str(sources), "-o", str(output)]) == 0
+    assert "0 converted, 2 skipped, 0 failed" in capsys.readouterr().out
+    assert main([str(sources / "*.clean"), "-o", str(output), "--force"]) == 0
+    assert "1 converted, 0 skipped" in capsys.readouterr().out
+
+def test_failures(sources, tmp_path, capsys):
+    (sources / "bad.clean").write_text("not a title\n")
+    assert main([str(sources), str(tmp_path / "missing"), "-j", "2"]) == 1
+    captured = capsys.readouterr()
+    assert "2 converted, 0 skipped, 2 failed" in captured.out
+    assert "bad.clean: ParseException" in captured.err
+    assert (sources / "rps.xml").exists()
+
+def test_lint(sources, tmp_path, capsys):
+    (sources / "bad.clean").write_text("Act\n\n1. One\n  (a) Para\n    (iivivi) Sub\n")
+    output = tmp_path / "akn"
+    assert main([str(sources), "-o", str(output), "--lint"]) == 1
+    assert "bad.clean: LintError: 5:5: (iivivi) is not a well-formed roman numeral" in capsys.readouterr().err
+    assert (output / "rps.xml").exists() and not (output / "bad.xml").exists()
+
+def test_main_module_uses_explicit_indents():
+    import subprocess, sys
+    result = subprocess.run([sys.executable, "-W", "ignore", "-m", "clean.clean", "clean/tests/rps.clean"],
+        capture_output=True, text=True)
+    with open('clean/tests/rps.clean','r') as file:
+        assert result.stdout == generate_akn(file.read()) + "\n"
+
+def test_index(sources, tmp_path):
+    from ..sidecar import ProvisionReader
+    output = tmp_path / "akn"
+    assert main([str(sources), "-o", str(output), "--index"]) == 0
+    with open('clean/tests/rps.clean','r') as file:
+        text = file.read()
+    assert (output / "rps.xml").read_text() == generate_akn(text)
+    with ProvisionReader(str(output / "rps.xml")) as reader:
+        assert reader["sec_1"] == generate_section(parse(text).body[0])
+    assert not list(output.glob("*.tmp*"))
+
+def test_index_after_plain_run(sources, tmp_path, capsys):
+    output = tmp_path / "akn"
+    os.utime(sources / "rps.clean", (0, 0))
+    os.utime(sources / "sub" / "r34span.clean", (0, 0))
+    main([str(sources), "-o", str(output)])
+    capsys.readouterr()
+    assert main([str(sources), "-o", str(output), "--index"]) == 0
+    assert "2 converted, 0 skipped" in capsys.readouterr().out
+    assert (output / "rps.xml.idx").exists()
+    assert main([str(sources), "-o", str(output), "--index"]) == 0
+    assert "0 converted, 2 skipped" in capsys.readouterr().out
+
+def test_file_named_twice_is_converted_once(sources, tmp_path, capsys):
+    output = tmp_path / "akn"
+    other = tmp_path / "other"
+    other.mkdir()
+    shutil.copy('clean/tests/rps.clean', other)
+    assert main([str(sources), str(sources / "rps.clean"), "-o", str(output), "-j", "2"]) == 0
+    assert "2 converted, 0 skipped, 0 failed" in capsys.readouterr().out
+    assert main([str(sources / "rps.clean"), str(other / "rps.clean"), "-o", str(output), "--force"]) == 1
+    captured = capsys.readouterr()
+    assert "1 converted, 0 skipped, 1 failed" in captured.out
+    assert "rps.clean: same output as " in captured.err
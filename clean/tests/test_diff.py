@@ -0,0 +1,40 @@
+from ..clean import *
+from ..diff import diff_acts, diff_texts, hash_cache, main
+
+OLD = "Act\n\n1. First.\n2. Second\n  (a) one\n  (b) two [s]{span}\n3. Third.\n5. Fifth\n  (1) x\n  (2) y"
+NEW = "Act\n\n1. First, amended.\n2. Second\n  (a) one\n  (c) two [s]{span}\n3. Third.\n4. New\n  (1) z\n6. Fifth\n  (1) x\n  (2) y"
+
+def test_diff_texts():
+    for engine in ENGINES:
+        diff = diff_texts(OLD, NEW, engine)
+        assert diff.added == ["sec_4", "sec_4__subsec_1"]
+        assert diff.removed == []
+        assert diff.modified == ["sec_1"]
+        assert diff.moved == [("sec_2__para_b", "sec_2__para_c"), ("sec_5", "sec_6"),
+            ("sec_5__subsec_1", "sec_6__subsec_1"), ("sec_5__subsec_2", "sec_6__subsec_2")]
+    assert not diff_texts(OLD, OLD)
+
+def test_diff_finds_changes_inside_spans_and_parts():
+    diff = diff_texts(OLD, OLD.replace("[s]{span}", "[s]{spin}").replace("(1) x", "(1) x\n  (3) w"))
+    assert diff.modified == ["sec_2__para_b"]
+    assert diff.added == ["sec_5__subsec_3"]
+    diff = diff_texts(OLD, OLD.replace("  (b) two [s]{span}\n", ""))
+    assert diff.removed == ["sec_2__para_b"] and not diff.added
+
+def test_diff_skips_unchanged_sections():
+    hash_cache.clear()
+    old, new = parse(OLD), parse(OLD.replace("Third", "Tertiary"))
+    assert diff_acts(old, new).modified == ["sec_3"]
+    assert hash_cache.stats()['misses'] == 2
+    # The same sections are hashed once.
+    assert diff_acts(new, old).modified == ["sec_3"]
+    assert hash_cache.stats()['misses'] == 2
+
+def test_main(tmp_path, capsys):
+    old, new = tmp_path / "old.clean", tmp_path / "new.clean"
+    old.write_text(OLD)
+    new.write_text(NEW)
+    assert main([str(old), str(old)]) == 0
+    assert main([str(old), str(new)]) == 1
+    out = capsys.readouterr().out.splitlines()
+    assert "+ sec_4" in out and "~ sec_1" in out and "> sec_5 -> sec_6" in out
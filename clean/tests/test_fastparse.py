@@ -0,0 +1,126 @@
+import pytest
+from ..clean import *
+from ..clean import _chunks
+from ..fastparse import parse_act, scan_legal_text
+from ..nodes import LegalText, Span
+
+@pytest.mark.parametrize("filename",[
+    'clean/tests/rps.clean',
+    'clean/tests/r34.clean',
+    'clean/tests/r34span.clean'
+])
+def test_engines_agree_on_corpus(filename):
+    with open(filename,'r') as file:
+        text = file.read()
+    assert generate_akn(text,engine="fast") == generate_akn(text)
+
+@pytest.mark.parametrize("text",[
+    "Act\n\n1.1. First section.",
+    "Act\n\nHeading\n1. Section text.\n\n",
+    # A blank line before a section without a heading ends the body.
+    "Act\n\n1. One.\n\n2. Two.",
+    # An unclosed span is ordinary text.
+    "Act\n\n1. This [is]{not closed\n\nanymore.",
+    # Spans run across lines, even onto lines that look like indexes.
+    "Act\n\n1. A [span]{across\n(a) lines} here.",
+    # Index text keeps its inner whitespace.
+    "Act\n\n1 . 2 . Spaced index.",
+    # Unindenting part way leaves the rest unparsed.
+    "Act\n\n1. Section\n  (1) Sub\n    (a) Para\n  text é\n2. Two",
+    "Act\n\nHeading\n3.\n  (a) paragraphs\n    (i) sub\n  (b) more\nand sandwich text.",
+    # Words with a [ that does not start a span, and spans nested deeply.
+    "Act\n\n1. A\tword[s]{x} and [x] {y [z]{w [v]{u}\n t}} [end.\n  (a) x[y] [q]{",
+    # An unclosed inner span leaves the outer one unclosed too.
+    "Act\n\n1. An [a]{unclosed [b]{inner span} here\n  (a) para [s]{x}",
+])
+def test_engines_agree(text):
+    assert generate_akn(text,engine="fast") == generate_akn(text)
+
+def test_scan_legal_text():
+    text = "(a) one  two\n  three [s]{x [t]{y}\n z}four\n(b) next"
+    assert scan_legal_text(text, 3) == (LegalText(["one two three",
+        Span("s", LegalText(["x", Span("t", LegalText(["y"])), "z"])), "four"]), text.index("\n(b)"))
+    # Text stops at a blank line, and before a word that is not printable ASCII.
+    assert scan_legal_text("one\n\ntwo", 0) == (LegalText(["one"]), 3)
+    assert scan_legal_text("one two\u00e9", 0) == (LegalText(["one two"]), 7)
+    # An unclosed span is words, up to the next span.
+    assert scan_legal_text("a [s]{b [t]{c}", 0) == (LegalText(["a [s]{b", Span("t", LegalText(["c"]))]), 14)
+
+def test_parse_act_structure():
+    parse = parse_act(addExplicitIndents("Act\n\n1. Section\n  (a) [s]{para}"))
+    assert parse.title == "Act"
+    assert parse.body[0].index == '1'
+    assert parse.body[0].paragraphs[0].text == (Span('s', LegalText(['para'])),)
+
+def test_parse_act_needs_title():
+    with pytest.raises(ParseException):
+        parse_act("not a title\n")
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        generate_akn("Act\n", engine="other")
+
+@pytest.mark.parametrize("filename",[
+    'clean/tests/rps.clean',
+    'clean/tests/r34.clean',
+    'clean/tests/r34span.clean'
+])
+def test_stream_same_as_whole(filename):
+    with open(filename,'r') as file:
+        text = file.read()
+    with open(filename,'r') as file:
+        assert list(iter_sections(file)) == parse_act(addExplicitIndents(text)).body
+    with open(filename,'r') as file:
+        assert generate_act(stream_act(file)) == generate_akn(text,engine="fast")
+
+def test_stream_yields_before_reading_everything():
+    lines = ["Act\n", "\n", "Heading\n", "1. One.\n", "2. Two,\n", "  (a) para.\n", "\n", "Heading\n", "3. Three.\n"]
+    read = []
+    def source():
+        for line in lines:
+            read.append(line)
+            yield line
+    sections = iter_sections(source())
+    assert next(sections).index == '1'
+    assert len(read) < len(lines)
+    assert [s.index for s in sections] == ['2', '3']
+
+def test_stream_stops_where_whole_parse_stops():
+    text = "Act\n\n1. One.\n\n2. Two."
+    assert len(list(iter_sections(text.splitlines(True)))) == 1
+
+def test_explicit_indents():
+    assert list(explicit_indents(["1.", "  (1) a", "    (a) b", "2."])) == [
+        ("1.", 0), ("INDENT", 1), ("(1) a", 1), ("INDENT", 2), ("(a) b", 2),
+        ("UNDENT", 1), ("UNDENT", 0), ("2.", 0)]
+
+@pytest.mark.parametrize("filename",[
+    'clean/tests/rps.clean',
+    'clean/tests/r34span.clean'
+])
+def test_parallel_same_as_serial(filename):
+    with open(filename,'r') as file:
+        text = file.read()
+    # Repeat the sections, so that there are several chunks to parse.
+    title, body = text.split("\n", 1)
+    text = title + "\n" + body * 4
+    assert generate_akn(text,engine="fast",jobs=2) == generate_akn(text,engine="fast")
+    assert parse(text,jobs=3) == parse(text)
+
+def test_parallel_stops_where_serial_stops():
+    text = "Act\n\n1. One.\n\n2. Two.\n\nHeading\n3. Three.\n  (a) para.\n (b) unindent."
+    assert generate_akn(text,engine="fast",jobs=2) == generate_akn(text,engine="fast")
+
+def test_parallel_needs_fast_engine():
+    with pytest.raises(ValueError):
+        generate_akn("Act\n", jobs=2)
+
+@pytest.mark.parametrize("newline",["\n","\r\n"])
+def test_parallel_chunks_without_empty_lines(newline):
+    body = "".join("%d. Section.\n  (a) para.\n" % i for i in range(1, 41))
+    text = ("Act\n\n" + body).replace("\n", newline)
+    chunks = _chunks(text, 4)
+    assert len(chunks) == 4 and "".join(chunks) == text
+    assert all(chunk[0].isdigit() for chunk in chunks[1:])
+    assert len(parse(text).body) == 40
+    assert parse(text,jobs=2) == parse(text)
@@ -0,0 +1,50 @@
+import json
+import pytest
+from xml.etree import ElementTree
+from ..clean import *
+from ..formats import render, generate_formats, Format, JsonFormat, FORMATS
+
+TEXT = "Act & Co\n\nHeading\n1. Section with a [s]{span [t]{inner}} <here>.\n  (a) paragraph\n    (i) sub\n  and post.\n2.\n  (1) sub-section"
+
+@pytest.mark.parametrize("filename",[
+    'clean/tests/rps.clean',
+    'clean/tests/r34.clean',
+    'clean/tests/r34span.clean'
+])
+def test_render_akn_same_as_generate(filename):
+    with open(filename,'r') as file:
+        text = file.read()
+    for engine in ENGINES:
+        assert generate_formats(text, ("akn",), engine) == [generate_akn(text)]
+
+def test_render_formats_in_one_walk():
+    akn, tree, page = render(parse(TEXT), ("akn", "json", "html"))
+    assert akn == generate_akn(TEXT)
+    tree = json.loads(tree)
+    assert tree['title'] == "Act & Co"
+    first = tree['body'][0]
+    assert (first['eId'], first['type'], first['num'], first['heading']) == ("sec_1", "section", "1", "Heading")
+    assert first['intro'] == ["Section with a", {'eId': "sec_1__span_s", 'name': "s",
+        'text': ["span", {'eId': "sec_1s__span_t", 'name': "t", 'text': ["inner"]}]}, "<here>."]
+    assert first['parts'][0]['wrapup'] == ["and post."]
+    assert first['parts'][0]['parts'][0]['eId'] == "sec_1__para_a__subpara_i"
+    assert tree['body'][1]['parts'][0]['type'] == "subSection"
+    page = ElementTree.fromstring(page)
+    assert page.find("h1").text == "Act & Co"
+    assert [section.get("id") for section in page.iter("section")] == \
+        ["sec_1", "sec_1__para_a", "sec_1__para_a__subpara_i", "sec_2", "sec_2__subsec_1"]
+
+def test_custom_format():
+    class Outline(Format):
+        def __init__(self):
+            self.lines = []
+        def start_part(self, kind, eId, node):
+            self.lines.append(eId)
+        def result(self):
+            return self.lines
+    outline = Outline()
+    assert render(parse(TEXT), (outline, JsonFormat(indent=2)))[0] == \
+        ["sec_1", "sec_1__para_a", "sec_1__para_a__subpara_i", "sec_2", "sec_2__subsec_1"]
+    with pytest.raises(ValueError):
+        render(parse(TEXT), ("pdf",))
+    assert set(FORMATS) == {"akn", "json", "html"}
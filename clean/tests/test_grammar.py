@@ -0,0 +1,100 @@
+import pytest
+from ..clean import *
+
+# The fast grammar must give the same results as the default grammar.
+
+@pytest.mark.parametrize("filename",[
+    'clean/tests/rps.clean',
+    'clean/tests/r34.clean',
+    'clean/tests/r34span.clean'
+])
+def test_fast_grammar_same_act(filename):
+    with open(filename,'r') as file:
+        text = addExplicitIndents(file.read())
+    parse = act.parse_string(text,parse_all=True)
+    fast_parse = fast_grammar().act.parse_string(text,parse_all=True)
+    assert fast_parse.as_list() == parse.as_list()
+    assert fast_parse.as_dict() == parse.as_dict()
+    assert generate_act(fast_parse) == generate_act(parse)
+
+@pytest.mark.parametrize("element,text",[
+    ("numbered_part", "\n(i)"),
+    ("numbered_part", "\n(a)"),
+    ("numbered_part", "\n1."),
+    ("numbered_part", "\nUNDENT"),
+    ("legal_text", "This is outside [one]{inside one [two]{inside two} one} none."),
+    ("legal_text", "This is a test\n[of] {a paragraph with} including\nacross lines."),
+    ("span", "[text]{outer span has [inner]{another span} in it}"),
+    ("sub_paragraph", "\n(i.1) Test"),
+    ("paragraph", "\n(a) This is the intro\nINDENT\n(i) this is the sub-para, and\nUNDENT\nthere is concluding sandwich text."),
+    ("sub_section", "\n(1) this is a subsection, with\nINDENT\n(a) this as a paragraph, and\nUNDENT\nand this closing text."),
+    ("section", "\n1.\nINDENT\n(1) This is text of the subsection.\nUNDENT"),
+    ("section", "\n3. This is a section\nINDENT\n(a) with direct paragraphs,\n(b) like this,\nUNDENT"),
+    ("section", "\n1. This is start\nINDENT\n(1) this is sub\nUNDENT\ntarget sandwich\n\nthis is not sandwich"),
+])
+def test_fast_grammar_same_elements(element,text):
+    parse = globals()[element].parse_string(text)
+    fast_parse = getattr(fast_grammar(),element).parse_string(text)
+    assert fast_parse.dump() == parse.dump()
+
+def test_fast_grammar_cache_stats():
+    # Each index is tried as a section, sub-section, paragraph and
+    # sub-paragraph index, so the cache is hit when it is read again.
+    text = "Act\n\n1. Section\n  (1) sub\n    (a) para\n      (i) subpara\n  and post.\n2. Two."
+    fast_grammar().act.parse_string(addExplicitIndents(text))
+    stats = grammar_cache_stats()
+    assert stats['misses'] > 0
+    assert stats['hits'] > 0
+
+def test_fast_grammar_engine():
+    text = "Act\n\nHeading\n1. Section\n  (1) sub-section"
+    assert generate_akn(text,engine="fast_grammar") == generate_akn(text)
+
+@pytest.mark.parametrize("engine",["pyparsing","fast_grammar"])
+def test_profile_grammar_elements(engine):
+    text = "Act\n\nHeading\n1. Section with a [s]{span}\n  (a) paragraph, and\n  (b) another.\n2. Two."
+    profile = Profile()
+    assert generate_akn(text,engine=engine,profile=profile) == generate_akn(text)
+    assert list(profile.stages) == ["indent", "parse", "generate"]
+    assert all(stage['seconds'] > 0 and stage['peak memory'] > 0 for stage in profile.stages.values())
+    for name in ("legal_text", "numbered_part", "heading", "section_index", "paragraph_index"):
+        counts = profile.elements[name]
+        assert counts['attempts'] + counts['cache hits'] > 0
+        assert counts['matches'] + counts['failures'] == counts['attempts']
+    # Legal text, spans and all, is read by the scanner, not the span element.
+    assert profile.elements['legal_text']['matches'] == profile.elements['legal_text']['attempts']
+    assert profile.elements['span']['attempts'] == 0
+    assert len(profile.hot_spots(3)) == 3
+    # The shared grammar is not slowed down by the profile.
+    assert not legal_text.debug
+
+def test_profile_fast_engine():
+    profile = Profile()
+    generate_akn("Act\n\n1. Section.", engine="fast", profile=profile)
+    assert list(profile.stages) == ["indent", "parse", "generate"]
+    assert profile.elements == {}
+    with pytest.raises(ValueError):
+        generate_akn("Act\n\n1. Section.", engine="fast", jobs=2, profile=profile)
+
+def test_parser_builds_grammar_when_used():
+    lazy = Parser()
+    assert not lazy.built
+    text = addExplicitIndents("Act\n\n1. Section\n  (a) para")
+    assert lazy.act.parse_string(text).as_list() == act.parse_string(text).as_list()
+    assert lazy.built
+
+def test_grammar_keeps_default_whitespace():
+    import pyparsing
+    whitespace = pyparsing.ParserElement.DEFAULT_WHITE_CHARS
+    assert "\n" in whitespace
+    build_grammar()
+    assert pyparsing.ParserElement.DEFAULT_WHITE_CHARS == whitespace
+
+def test_grammar_names():
+    assert set(vars(build_grammar())) == GRAMMAR_NAMES
+
+def test_pyparsing_names_do_not_build_grammar():
+    import subprocess, sys
+    script = "from clean.clean import ParseException, parser; print(parser.built)"
+    assert subprocess.run([sys.executable, "-c", script], capture_output=True,
+        text=True, check=True).stdout.strip() == "False"
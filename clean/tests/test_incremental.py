@@ -0,0 +1,63 @@
+import pytest
+from ..clean import *
+from ..incremental import Document
+
+TEXT = "Act\n\nHeading\n1. One.\n2. Two,\n  (a) para.\n\nHeading\n3. Three [s]{span}.\n"
+
+def test_document_same_as_parse():
+    doc = Document(TEXT)
+    assert doc.act == parse(TEXT)
+    assert doc.akn() == generate_akn(TEXT)
+
+@pytest.mark.parametrize("old,new",[
+    ("One.", "One, changed."),
+    ("  (a) para.", "  (a) para.\n  (b) another."),
+    # Removing the blank line joins two pieces.
+    ("para.\n\n", "para.\n"),
+    # A blank line before a section without a heading ends the body.
+    ("2. Two,", "\n2. Two,"),
+    ("Act", "New title"),
+    ("span}", "span"),
+])
+def test_edit_same_as_parse(old,new):
+    doc = Document(TEXT)
+    start = TEXT.index(old)
+    doc.edit(start, start + len(old), new)
+    text = TEXT.replace(old, new, 1)
+    assert doc.text == text
+    assert doc.act == parse(text)
+    assert doc.akn() == generate_akn(text, engine="fast")
+
+def test_edit_reparses_only_enclosing_section():
+    doc = Document(TEXT)
+    doc.akn()
+    start = TEXT.index("Three")
+    assert [s.index for s in doc.edit(start, start + 5, "Third")] == ['3']
+    # An edit to the first line of a piece parses the piece before it too.
+    start = TEXT.rindex("\n\nHeading") + 1
+    assert [s.index for s in doc.edit(start, start, "More text.")] == ['2', '3']
+    assert doc.act == parse(doc.text)
+    assert [s.index for s in doc.edit(0, 3, "Title")] == ['1']
+    assert doc.act == parse(doc.text)
+
+@pytest.mark.parametrize("filename",[
+    'clean/tests/rps.clean',
+    'clean/tests/r34span.clean'
+])
+def test_edits_to_corpus(filename):
+    with open(filename,'r') as file:
+        text = file.read()
+    doc = Document(text)
+    newlines = [i for i, c in enumerate(text) if c == "\n"]
+    for start in reversed(newlines[1::9]):
+        doc.edit(start, start, " x")
+        assert doc.akn() == generate_akn(doc.text, engine="fast")
+
+def test_failed_edit_keeps_document():
+    doc = Document(TEXT)
+    start = TEXT.index("(a)")
+    with pytest.raises(Exception):
+        doc.edit(start, start, "  (b) x\n  ")
+    assert doc.text == TEXT
+    with pytest.raises(IndexError):
+        doc.edit(5, len(TEXT) + 1, "")
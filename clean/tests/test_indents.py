@@ -1,5 +1,5 @@
 import pytest
-from ..clean import addExplicitIndents
+from ..clean import addExplicitIndents, explicit_indents, iter_lines
 
 def test_hanging_indents():
     text = """Title
@@ -109,4 +109,28 @@ INDENT
 UNDENT
 UNDENT
 4.
-"""
\ No newline at end of file
+"""
+
+def test_empty_document():
+    assert addExplicitIndents("") == ""
+
+
+def test_bad_unindent():
+    with pytest.raises(Exception):
+        addExplicitIndents("1.\n    (1) a\n  (2) b")
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "one line",
+    "two\nlines\n",
+    "mixed\r\nline\rbreaks\x0cand\n\nblanks",
+])
+def test_iter_lines(text):
+    assert list(iter_lines(text, chunk_size=2)) == text.splitlines()
+
+
+def test_explicit_indents_match_string():
+    text = "Title\n1. Section\n  (1) Subsection\n    (a) Paragraph\n\n2. Section"
+    tokens = explicit_indents(text.splitlines())
+    assert "".join(line + "\n" for line, depth in tokens) == addExplicitIndents(text)
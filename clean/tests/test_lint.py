@@ -0,0 +1,49 @@
+import pytest
+from ..clean import *
+from ..lint import lint, check, LintError, main
+
+@pytest.mark.parametrize("filename",[
+    'clean/tests/rps.clean',
+    'clean/tests/r34.clean',
+    'clean/tests/r34span.clean'
+])
+def test_lint_corpus(filename):
+    with open(filename,'r') as file:
+        assert lint(file.read()) == []
+
+@pytest.mark.parametrize("text,kind,line,column",[
+    ("Act\n\n1. One\n    (1) Sub\n  (2) Sub", 'indent', 5, 3),
+    ("Act\n\n1. One\n  (1) Sub\n    (2) not a paragraph", 'index', 5, 5),
+    ("Act\n\n1. One\n  (1) Sub\n  (a) mixed with a paragraph", 'index', 5, 3),
+    ("Act\n\n(a) at the top", 'index', 3, 1),
+    ("Act\n\n1. One\n  (a) Para\n    (b) not roman", 'index', 5, 5),
+    ("Act\n\n1. One\n  (a) Para\n    (i) Sub\n      (1) under a sub-paragraph", 'index', 6, 7),
+    ("Act\n\n2. Two\n3. Three\n3. Three again", 'numbering', 5, 1),
+    ("Act\n\n1. One\n  (a) Para\n  (a.1) Inserted\n  (a.2) Inserted\n  (a.1.1) Out of order", 'numbering', 7, 3),
+    ("Act\n\n1. One\n  (a) Para\n    (iivivi) Sub", 'roman', 5, 5),
+    ("Act\n\n1. A [s]{span\n\n2. Two", 'span', 3, 9),
+    ("Act\n\n1. A span} closes nothing", 'span', 3, 10),
+])
+def test_lint_finds(text, kind, line, column):
+    diagnostics = lint(text)
+    assert [(d.kind, d.line, d.column) for d in diagnostics] == [(kind, line, column)]
+
+def test_lint_finds_everything():
+    text = "Act\n\n2. Two [s]{\n1. One\n  (a) Para\n    (iivivi) Sub\n (b) Para"
+    diagnostics = lint(text)
+    assert [d.kind for d in diagnostics] == ['span', 'numbering', 'roman', 'indent']
+    assert [d.line for d in diagnostics] == sorted(d.line for d in diagnostics)
+    with pytest.raises(LintError) as error:
+        check(text)
+    assert (error.value.lineno, error.value.col) == (3, 11)
+    assert [d.as_dict() for d in error.value.diagnostics] == [d.as_dict() for d in diagnostics]
+    assert "(and 3 more)" in str(error.value)
+    check("Act\n\n1. Fine.")
+
+def test_main(tmp_path, capsys):
+    good, bad = tmp_path / "good.clean", tmp_path / "bad.clean"
+    good.write_text("Act\n\n1. One.\n2. Two.")
+    bad.write_text("Act\n\n2. Two.\n1. One.")
+    assert main([str(good)]) == 0
+    assert main([str(good), str(bad)]) == 1
+    assert capsys.readouterr().out == str(bad) + ":4:1: 1. is out of order after 2. [numbering]\n"
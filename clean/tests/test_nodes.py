@@ -0,0 +1,38 @@
+import pytest
+from ..clean import *
+
+def test_parse_returns_act():
+    parse_result = parse("""Act
+
+Heading
+1. Section with
+  (1) a sub-section, and
+    (a) a [name]{paragraph}.""")
+    assert isinstance(parse_result, Act)
+    assert parse_result.title == "Act"
+    section = parse_result.body[0]
+    assert isinstance(section, Section)
+    assert section.heading == "Heading"
+    assert section.text == ("Section with",)
+    assert section.paragraphs is None
+    assert section.sub_sections[0].index == "1"
+    paragraph = section.sub_sections[0].paragraphs[0]
+    assert isinstance(paragraph, Paragraph)
+    assert paragraph.text == ("a", Span("name", LegalText(["paragraph"])), ".")
+
+@pytest.mark.parametrize("filename",[
+    'clean/tests/rps.clean',
+    'clean/tests/r34span.clean'
+])
+def test_nodes_from_results(filename):
+    with open(filename,'r') as file:
+        text = file.read()
+    results = act.parse_string(addExplicitIndents(text),parse_all=True)
+    assert Act.from_results(results) == parse(text)
+    assert generate_act(parse(text)) == generate_act(results)
+
+def test_nodes_have_slots():
+    section = Section("1")
+    assert not hasattr(section, '__dict__')
+    with pytest.raises(AttributeError):
+        section.other = None
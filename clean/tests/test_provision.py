@@ -0,0 +1,21 @@
+import pytest
+from ..clean import *
+
+def test_generate_provision():
+    with open('clean/tests/r34span.clean') as file:
+        text = file.read()
+    akn = generate_akn(text)
+    for parse_result in (parse(text), act.parseString(addExplicitIndents(text))):
+        for eId in ("sec_34", "sec_34__subsec_1", "sec_34__subsec_1__para_d", "sec_34__subsec_1__para_d__span_fees"):
+            provision = generate_provision(parse_result, eId)
+            assert provision.startswith('<') and 'eId="' + eId + '"' in provision.split(">")[0]
+            assert provision in akn
+
+def test_generate_provision_nested_spans():
+    text = "Act\n\n1. Text\n  (a) para [s]{x [t]{y}}\n    (i) sub [u]{z}"
+    parse_result = parse(text)
+    assert generate_provision(parse_result, "sec_1__para_as__span_t") == '<span eId="sec_1__para_as__span_t">y</span>'
+    assert generate_provision(parse_result, "sec_1__para_a__subpara_i__span_u") == '<span eId="sec_1__para_a__subpara_i__span_u">z</span>'
+    assert generate_provision(parse_result, "sec_1__para_a__subpara_i") in generate_akn(text)
+    with pytest.raises(KeyError):
+        generate_provision(parse_result, "sec_1__para_b")
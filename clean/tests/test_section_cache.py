@@ -0,0 +1,24 @@
+from ..clean import *
+
+def test_section_cache():
+    section_cache.clear()
+    text = "Act\n\n1. One.\n2. Two [s]{span}."
+    first = generate_akn(text, engine="fast")
+    assert section_cache_stats()['misses'] == 2
+    # Each section is found by its source text, whichever act it is in.
+    assert generate_akn(text.replace("One.", "Changed."), engine="fast") != first
+    assert section_cache_stats()['hits'] == 1
+    assert generate_akn(text, engine="fast") == first == generate_akn(text)
+    assert section_cache_stats()['hits'] == 3
+    # Sections from the pyparsing grammar are not cached.
+    assert section_cache_stats()['size'] == 3
+
+def test_section_cache_evicts_least_recently_used():
+    cache = FragmentCache(2)
+    assert cache.get('a', lambda: "A") == "A"
+    cache.get('b', lambda: "B")
+    cache.get('a', lambda: "A")
+    cache.get('c', lambda: "C")
+    assert cache.get('b', lambda: "new B") == "new B"
+    assert cache.get('a', lambda: "new A") == "new A"
+    assert cache.stats() == {'hits': 1, 'misses': 5, 'size': 2, 'hit rate': 1 / 6}
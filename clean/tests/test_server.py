@@ -0,0 +1,109 @@
+import io
+import json
+import threading
+import urllib.request
+import urllib.error
+import pytest
+from ..clean import *
+from ..server import Conversions, http_server, serve_lines
+
+TEXT = "Act\n\nHeading\n1. Section with a [s]{span}\n  (a) paragraph."
+
+@pytest.fixture(scope="module")
+def conversions():
+    with Conversions(workers=1, max_size=1000, max_pending=2) as conversions:
+        yield conversions
+
+def request(**fields):
+    return json.dumps(fields).encode()
+
+def test_convert(conversions):
+    assert conversions.convert(request(text=TEXT, id=7)) == {'id': 7, 'akn': generate_akn(TEXT, engine="fast")}
+    assert conversions.convert(request(text=TEXT, engine="pyparsing"))['akn'] == generate_akn(TEXT)
+
+@pytest.mark.parametrize("raw,kind",[
+    (b"not json", 'request'),
+    (b"[]", 'request'),
+    (request(text=TEXT, engine="other"), 'request'),
+    (request(text=TEXT, colour="red"), 'request'),
+    (request(text=7), 'request'),
+    (request(text="x" * 1000), 'too large'),
+    (request(text="not a title"), 'parse'),
+])
+def test_convert_errors(conversions, raw, kind):
+    assert conversions.convert(raw)['error']['kind'] == kind
+
+def test_parse_error_location(conversions):
+    error = conversions.convert(request(text="not a title", id="a"))
+    assert error['id'] == "a"
+    assert error['error']['type'] == "ParseException"
+    assert (error['error']['line'], error['error']['column']) == (1, 1)
+
+def test_lint_requests():
+    with Conversions(workers=1, lint=True) as conversions:
+        assert 'akn' in conversions.convert(request(text=TEXT))
+        error = conversions.convert(request(text="Act\n\n2. Two.\n1. One [s]{span"))['error']
+        assert (error['kind'], error['type']) == ('parse', 'LintError')
+        assert (error['line'], error['column']) == (4, 1)
+        assert [d['kind'] for d in error['diagnostics']] == ['numbering', 'span']
+
+def test_serve_lines(conversions):
+    lines = [request(text=TEXT, id=i) for i in range(5)] + [b"", b"{", b"x" * 2000]
+    output = io.StringIO()
+    serve_lines(conversions, io.BytesIO(b"\n".join(lines) + b"\n"), output)
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(r['id'] for r in responses if 'akn' in r) == list(range(5))
+    assert sorted(r['error']['kind'] for r in responses if 'error' in r) == ['request', 'too large']
+
+def test_http(conversions):
+    server = http_server(conversions, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    url = "http://127.0.0.1:%d" % server.server_address[1]
+    def post(path, body):
+        try:
+            with urllib.request.urlopen(url + path, body) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            return error.code, json.load(error)
+    try:
+        assert post("/convert", request(text=TEXT)) == (200, {'akn': generate_akn(TEXT, engine="fast")})
+        assert post("/convert", request(text="not a title"))[0] == 422
+        assert post("/convert", request(text="x" * 1000))[0] == 413
+        assert post("/other", request(text=TEXT))[0] == 404
+        with urllib.request.urlopen(url + "/health") as response:
+            assert json.load(response)['status'] == 'ok'
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+def test_busy():
+    # A long act keeps the only slot taken while the second request comes.
+    long = "Act\n\n" + "1. Section text.\n" * 20000
+    with Conversions(workers=1, max_pending=1) as conversions:
+        first = conversions.submit(request(text=long))
+        assert conversions.convert(request(text=TEXT), block=False)['error']['kind'] == 'busy'
+        assert 'akn' in first.result()
+        assert 'akn' in conversions.convert(request(text=TEXT), block=False)
+
+def test_stdio_command():
+    import subprocess, sys
+    completed = subprocess.run([sys.executable, "-m", "clean.server", "--stdio", "-w", "1"],
+        input=request(text=TEXT, id=1) + b"\n", capture_output=True, check=True)
+    assert json.loads(completed.stdout) == {'id': 1, 'akn': generate_akn(TEXT, engine="fast")}
+
+def test_worker_dies():
+    import os
+    from concurrent.futures import wait
+    with Conversions(workers=1) as conversions:
+        with pytest.raises(Exception):
+            conversions._pool.submit(os._exit, 1).result()
+        assert 'akn' in conversions.convert(request(text=TEXT))
+        # A request whose worker dies gets a server error, and the ones
+        # after it a new pool.
+        work = conversions.submit(request(text=TEXT, id=1))
+        wait([conversions._pool.submit(os._exit, 1)])
+        response = work.result()
+        assert response['id'] == 1 and ('akn' in response or response['error']['kind'] == 'server')
+        assert 'akn' in conversions.convert(request(text=TEXT))
@@ -0,0 +1,42 @@
+import pytest
+from ..clean import *
+from ..sidecar import OffsetWriter, ProvisionReader, generate_indexed_akn, read_index, write_index, write_indexed_akn
+
+TEXT = "Act\n\nHeading\n34. Section\n  (1) sub-section\n    (b) paragraph\n      (i) sub-paragraph with a [s]{span [t]{inner}}\n35. Another."
+
+def test_offsets_slice_elements():
+    akn, offsets = generate_indexed_akn(parse(TEXT))
+    assert akn.decode("utf-8") == generate_akn(TEXT)
+    for eId, (start, end) in offsets.items():
+        element = akn[start:end].decode("utf-8")
+        assert element.startswith("<") and element.endswith(">")
+        assert 'eId="' + eId + '"' in element.split(">", 1)[0]
+    assert akn[slice(*offsets["sec_34__subsec_1__para_b"])] == \
+        generate_paragraph(parse(TEXT).body[0].sub_sections[0].paragraphs[0], "sec_34__subsec_1").encode("utf-8")
+    assert akn[slice(*offsets["sec_35"])].decode("utf-8") == generate_section(parse(TEXT).body[1])
+    assert {"sec_34__subsec_1__para_b__subpara_i__span_s", "sec_34__subsec_1__para_b__subpara_i", "sec_35"} <= set(offsets)
+
+def test_offsets_from_grammar():
+    parsed = act.parseString(addExplicitIndents(TEXT))
+    assert generate_indexed_akn(parsed) == generate_indexed_akn(parse(TEXT))
+
+def test_index_round_trip():
+    import io
+    offsets = {"sec_1": (10, 200), "sec_1__para_a": (50, 90), "sec_é": (200, 300)}
+    file = io.BytesIO()
+    write_index(offsets, file)
+    assert read_index(file.getvalue()) == offsets
+    with pytest.raises(ValueError):
+        read_index(b"not an index")
+
+def test_provision_reader(tmp_path):
+    path = str(tmp_path / "act.xml")
+    write_indexed_akn(parse(TEXT), path)
+    with open(path, encoding="utf-8") as file:
+        assert file.read() == generate_akn(TEXT)
+    with ProvisionReader(path) as reader:
+        assert reader["sec_35"] == generate_section(parse(TEXT).body[1])
+        assert reader["sec_34__subsec_1__para_b__subpara_i"].startswith('<subParagraph eId="sec_34__subsec_1__para_b__subpara_i">')
+        assert "sec_34" in reader and "sec_36" not in reader
+        with pytest.raises(KeyError):
+            reader["sec_36"]
@@ -0,0 +1,84 @@
+import os
+import pytest
+from ..clean import *
+from ..source import SectionIndex, index_source, parse_section, section_index, source_index_path
+
+@pytest.fixture
+def rps(tmp_path):
+    path = tmp_path / "rps.clean"
+    with open('clean/tests/rps.clean', 'r') as file:
+        path.write_text(file.read())
+    return str(path)
+
+def test_index_source(rps):
+    index = index_source(rps)
+    assert list(index) == ["1", "2", "3", "4"]
+    with open(rps, 'rb') as file:
+        data = file.read()
+    heading, start, end = index["3"]
+    assert heading == "Defeating Relationships"
+    assert data[start:end].decode().startswith("Defeating Relationships\n3.\n  (1)")
+    assert index["1"][0] == "Players" and index["2"][0] is None
+    assert index["4"][2] == len(data)
+
+def test_parse_section(rps):
+    with open(rps, 'r') as file:
+        full = parse(file.read())
+    for engine in ENGINES:
+        for section in full.body:
+            assert parse_section(rps, section.index, engine) == section
+    with pytest.raises(KeyError):
+        parse_section(rps, "5")
+
+def test_index_is_saved_and_refreshed(rps):
+    index = section_index(rps)
+    assert os.path.exists(source_index_path(rps))
+    assert SectionIndex.load(source_index_path(rps)).sections == index.sections
+    with open(rps, 'a') as file:
+        file.write("\n5. A new section.")
+    stat = os.stat(rps)
+    os.utime(rps, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert "5" in section_index(rps)
+    assert parse_section(rps, "5").text == LegalText(["A new section."])
+
+@pytest.mark.parametrize("text,keys", [
+    ("Act\n\n1. a\n\n2. not a section after a blank line", ["1"]),
+    ("Act\n\n\nHeading\n1. a\n  \n  (1) b\n\n\nHeading\n2. c", ["1"]),
+    ("Act\n1. no blank line after the title", []),
+    ("Act\n\n1. a\n  (1) x\n  \n2. b\n", ["1"]),
+    ("Act\n\n1. a\n(a) x\n2. b\n", ["1"]),
+    ("Act\n\n  1. indented\n", ["1"]),
+])
+def test_index_follows_the_grammar(tmp_path, text, keys):
+    path = tmp_path / "act.clean"
+    path.write_text(text)
+    index = index_source(str(path))
+    assert [key for key in index] == keys
+    full = parse(text)
+    assert [s.index for s in full.body] == keys
+    for section in full.body:
+        assert parse_section(str(path), section.index, sections=index) == section
+
+def test_sections_that_may_be_in_a_span(tmp_path):
+    path = tmp_path / "act.clean"
+    path.write_text("Act\n\n1. a [s]{span\n2. continues}\n3. b")
+    index = index_source(str(path))
+    # 2. is inside the span, so the piece with 1 in it also has 3.
+    assert list(index) == ["1", "3"]
+    assert index["1"][1:] == index["3"][1:]
+    assert parse_section(str(path), "1").text[1].body == LegalText(["span 2. continues"])
+    with pytest.raises(KeyError):
+        parse_section(str(path), "2")
+    assert parse_section(str(path), "3").text == LegalText(["b"])
+
+def test_index_reads_one_piece_at_a_time(tmp_path):
+    import tracemalloc
+    path = tmp_path / "act.clean"
+    path.write_bytes(b"Act\n\n" + b"".join(b"%d. Section\r\n" % i for i in range(1, 20001)))
+    tracemalloc.start()
+    index = index_source(str(path))
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(index) == 20000 and index["2"][1] == len(b"Act\n\n1. Section\r\n")
+    # Beyond the index itself, the file is not held in memory.
+    assert peak - kept < os.path.getsize(path) // 4
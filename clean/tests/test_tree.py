@@ -0,0 +1,32 @@
+import pytest
+import xml.etree.ElementTree as ET
+from ..clean import *
+from ..tree import AKN_NAMESPACE, generate_akn_tree, generate_element
+
+TEXTS = ["Act & <Co>\n\nA & B\n1. If x < y & [s]{y > z [t]{inner}} end.\n  (a) one\n    (i) two\n  three",
+    "Act\n\n1. Section\n  (1) sub-section\n    (a) paragraph\n  after\n2.\n3. [s]{span}"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tree_matches_parsed_output(engine):
+    sources = TEXTS[:]
+    for name in ("r34", "r34span", "rps"):
+        with open('clean/tests/' + name + '.clean', 'r') as file:
+            sources.append(file.read())
+    for text in sources:
+        expected = ET.tostring(ET.fromstring(generate_akn(text, engine=engine)))
+        assert ET.tostring(generate_akn_tree(text, engine, ET)) == expected
+
+def test_tree_elements():
+    root = generate_element(parse(TEXTS[0]), ET)
+    akn = {"akn": AKN_NAMESPACE}
+    assert root.find("akn:act/akn:preface/akn:p/akn:shortTitle", akn).text == "Act & <Co>"
+    span = root.find(".//akn:span[@eId='sec_1__span_s']", akn)
+    assert span.text == "y > z " and span.tail == " end."
+    assert [e.get("eId") for e in root.iter("{%s}paragraph" % AKN_NAMESPACE)] == ["sec_1__para_a"]
+
+def test_lxml_tree():
+    etree = pytest.importorskip("lxml.etree")
+    root = generate_akn_tree(TEXTS[0], "fast", etree)
+    assert root.nsmap == {None: AKN_NAMESPACE}
+    expected = ET.tostring(ET.fromstring(generate_akn(TEXTS[0], engine="fast")))
+    assert ET.tostring(ET.fromstring(etree.tostring(root))) == expected
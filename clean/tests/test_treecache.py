@@ -0,0 +1,125 @@
+import os
+import pytest
+from ..clean import *
+from ..clean import _parse_act
+from ..treecache import TreeCache, encode_tree, decode_tree, main
+
+@pytest.fixture
+def cache(tmp_path):
+    yield use_tree_cache(str(tmp_path / "cache"))
+    use_tree_cache(None)
+
+def read(name):
+    with open('clean/tests/' + name, 'r') as file:
+        return file.read()
+
+@pytest.mark.parametrize("name",["r34.clean","r34span.clean","rps.clean"])
+@pytest.mark.parametrize("engine",["pyparsing","fast"])
+def test_encode_tree(name, engine):
+    node = _parse_act(read(name), engine)
+    back = decode_tree(encode_tree(node))
+    assert back == node
+    assert [s.source_hash for s in back.body] == [s.source_hash for s in node.body]
+
+def test_decode_damaged_tree():
+    data = encode_tree(parse(read('rps.clean')))
+    with pytest.raises(ValueError, match="Not a CLEAN parse tree"):
+        decode_tree(data[1:])
+    with pytest.raises(ValueError, match="Damaged"):
+        decode_tree(data[:-10])
+
+@pytest.mark.parametrize("engine",["pyparsing","fast"])
+def test_generate_akn_uses_cache(cache, engine):
+    text = read('r34span.clean')
+    expected = generate_akn(text, engine=engine)
+    use_tree_cache(cache.directory)
+    assert generate_akn(text, engine=engine) == expected
+    assert generate_akn(text, engine=engine) == expected
+    assert cache.get(text, lambda: pytest.fail("parsed again")) == parse(text)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (3, 1, 1)
+    assert (stats['total lookups'], stats['total hits']) == (4, 3)
+
+def test_version_is_part_of_key(cache):
+    text = read('rps.clean')
+    other = TreeCache(cache.directory, version="other")
+    assert other.path(text) != cache.path(text)
+    assert cache.path(text) != cache.path(text + "\n")
+
+def test_damaged_entry_is_parsed_again(cache):
+    text = read('rps.clean')
+    cache.get(text, lambda: parse(text))
+    with open(cache.path(text), 'wb') as file:
+        file.write(b"CLEANTREE1\nnot a tree")
+    assert cache.get(text, lambda: parse(text)) == parse(text)
+    assert cache.get(text, lambda: pytest.fail("parsed again")) == parse(text)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_evict_least_recently_used(tmp_path):
+    texts = [read(name) for name in ("r34.clean", "r34span.clean", "rps.clean")]
+    sizes = [len(encode_tree(parse(text))) for text in texts]
+    cache = TreeCache(str(tmp_path), max_size=sizes[0] + sizes[1])
+    for i, text in enumerate(texts[:2]):
+        cache.get(text, lambda: parse(text))
+        os.utime(cache.path(text), (i, i))
+    cache.get(texts[0], lambda: pytest.fail("parsed again")) # Now the most recent
+    cache.get(texts[2], lambda: parse(texts[2]))
+    assert [os.path.exists(cache.path(text)) for text in texts] == [True, False, True]
+    assert cache.stats()['bytes'] == sizes[0] + sizes[2]
+
+def test_cli_cache(cache, tmp_path, capsys):
+    from ..cli import main as convert
+    source = tmp_path / "rps.clean"
+    source.write_text(read('rps.clean'))
+    for output in ("akn", "again"):
+        assert convert([str(source), "-o", str(tmp_path / output), "--cache", cache.directory]) == 0
+    capsys.readouterr()
+    assert main(["stats", cache.directory]) == 0
+    out = capsys.readouterr().out
+    assert "1 entries" in out and "2 lookups, 1 hits, hit rate 50.0%" in out
+    assert (tmp_path / "again" / "rps.xml").read_text() == generate_akn(read('rps.clean'))
+    assert main(["clear", cache.directory]) == 0
+    assert cache.stats()['entries'] == cache.stats()['total lookups'] == 0
+
+def test_cache_errors_are_misses(cache, monkeypatch):
+    text = read('rps.clean')
+    cache.get(text, lambda: parse(text))
+    def fail(*args, **kwargs):
+        raise PermissionError("read-only")
+    monkeypatch.setattr(os, "utime", fail)
+    assert cache.get(text, lambda: pytest.fail("parsed again")) == parse(text)
+    cache.clear()
+    monkeypatch.setattr(os, "open", fail)
+    monkeypatch.setattr(os, "replace", fail)
+    assert cache.get(text, lambda: parse(text)) == parse(text)
+    monkeypatch.undo()
+    assert cache.stats()['entries'] == 0
+    assert os.listdir(cache.directory) == []
+
+def test_rewritten_entry_counted_once(cache):
+    text = read('rps.clean')
+    cache.get(text, lambda: parse(text))
+    cache.get(read('r34.clean'), lambda: parse(read('r34.clean')))
+    # As when two processes miss the same document at once.
+    cache._store(cache.path(text), encode_tree(parse(text)))
+    assert cache._size == cache.stats()['bytes']
+
+def test_stats_log_is_rotated(cache, monkeypatch):
+    from .. import treecache
+    monkeypatch.setattr(treecache, "STATS_LOG_SIZE", 4)
+    monkeypatch.setattr(treecache, "RECENT_LOOKUPS", 3)
+    text = read('rps.clean')
+    for _ in range(10):
+        cache.get(text, lambda: parse(text))
+    assert os.path.getsize(os.path.join(cache.directory, "stats")) < 4
+    stats = cache.stats()
+    assert (stats['total lookups'], stats['total hits']) == (10, 9)
+    assert (stats['recent lookups'], stats['recent hit rate']) == (3, 1.0)
+    cache.clear()
+    assert cache.stats()['total lookups'] == 0
+
+def test_import_leaves_cache_out():
+    import subprocess, sys
+    script = "import sys, clean.clean; print('clean.treecache' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", script], capture_output=True,
+        text=True, check=True).stdout.strip() == "False"
@@ -0,0 +1,30 @@
+from ..clean import *
+from ..walk import Format, part_eId, span_eId, walk
+
+TEXT = "Act\n\n1. Section with a [s]{span [t]{inner}}.\n  (a) paragraph\n    (i) sub\n  and post.\n2.\n  (1.1) sub-section"
+
+class Events(Format):
+    def __init__(self):
+        self.events = []
+    def start_part(self, kind, eId, node):
+        self.events.append((kind, eId))
+    def text(self, text):
+        self.events.append(text)
+    def start_span(self, eId, name):
+        self.events.append(("span", eId))
+
+def test_eIds():
+    act = parse(TEXT)
+    assert part_eId(act.body[0]) == "sec_1"
+    assert part_eId(act.body[1].sub_sections[0], "sec_2") == "sec_2__subsec_1_1"
+    assert span_eId("s") == "s"
+    assert span_eId("t", "sec_1s") == "sec_1s__span_t"
+
+def test_walk_events_in_order():
+    act = parse(TEXT)
+    events, other = Events(), Events()
+    walk(act, (events, other))
+    assert events.events == other.events == [("section", "sec_1"), "Section with a",
+        ("span", "sec_1__span_s"), "span", ("span", "sec_1s__span_t"), "inner", ".",
+        ("paragraph", "sec_1__para_a"), "paragraph", ("subParagraph", "sec_1__para_a__subpara_i"),
+        "sub", "and post.", ("section", "sec_2"), ("subSection", "sec_2__subsec_1_1"), "sub-section"]
@@ -0,0 +1,11 @@
+import io
+from ..clean import *
+
+def test_write_akn():
+    with open('clean/tests/r34span.clean','r') as file:
+        parse = act.parse_string(addExplicitIndents(file.read()),parse_all=True)
+    stream = io.StringIO()
+    write_akn(parse, stream)
+    fragments = []
+    write_akn(parse, fragments)
+    assert stream.getvalue() == "".join(fragments) == generate_act(parse)
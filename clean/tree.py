@@ -0,0 +1,115 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# Akoma Ntoso as an element tree, built directly from the parse, for
+# programs that would otherwise parse the output of generate_akn again.
+#
+#   root = generate_akn_tree(text)
+#   root.find("akn:act/akn:body/akn:section", {"akn": AKN_NAMESPACE})
+#
+# The tree has the same elements, attributes and text as parsing the
+# output of generate_akn would give, with tags in AKN_NAMESPACE. It is
+# built with lxml.etree if it is installed, and xml.etree.ElementTree if
+# not, unless an etree module is given.
+
+from .clean import parse_with
+from .nodes import Act
+from .walk import Format, walk
+
+AKN_NAMESPACE = "http://docs.oasis-open.org/legaldocml/ns/akn/3.0"
+
+def _tag(name):
+  return "{" + AKN_NAMESPACE + "}" + name
+
+_AKOMA_NTOSO, _ACT, _PREFACE, _P, _SHORT_TITLE, _BODY, _SPAN, _NUM, _HEADING = map(_tag, (
+  "akomaNtoso", "act", "preface", "p", "shortTitle", "body", "span", "num", "heading"))
+# The tags of the kinds of provision and the blocks, by name.
+_TAGS = {name: _tag(name) for name in ("section", "subSection", "paragraph",
+  "subParagraph", "intro", "content", "wrapup")}
+
+def default_etree():
+  """lxml.etree if it is installed, otherwise xml.etree.ElementTree."""
+  try:
+    from lxml import etree
+  except ImportError:
+    from xml.etree import ElementTree as etree
+  return etree
+
+def _add_text(parent, text):
+  # Add text after the last child of parent, or inside it if it has none.
+  if len(parent):
+    last = parent[-1]
+    last.tail = last.tail + text if last.tail else text
+  else:
+    parent.text = parent.text + text if parent.text else text
+
+class ElementFormat(Format):
+  """The Format that builds the akomaNtoso element with etree, with the
+  elements that write_act writes."""
+
+  def __init__(self, etree=None):
+    self.etree = etree or default_etree()
+    self.sub = self.etree.SubElement
+    self._open = [] # The open elements, innermost last
+
+  def start_act(self, node):
+    if hasattr(self.etree, 'LXML_VERSION'):
+      # So that lxml serializes the namespace as the default, as
+      # generate_akn does.
+      self.root = self.etree.Element(_AKOMA_NTOSO, nsmap={None: AKN_NAMESPACE})
+    else:
+      self.root = self.etree.Element(_AKOMA_NTOSO)
+    self._open.append(self.sub(self.root, _ACT))
+
+  def title(self, title):
+    sub = self.sub
+    sub(sub(sub(self._open[-1], _PREFACE), _P, {'class': 'title'}), _SHORT_TITLE).text = title
+
+  def start_body(self):
+    self._open.append(self.sub(self._open[-1], _BODY))
+
+  def end_body(self):
+    self._open.pop()
+
+  def start_part(self, kind, eId, node):
+    element = self.sub(self._open[-1], _TAGS[kind], eId=eId)
+    self.sub(element, _NUM).text = node.index
+    self._open.append(element)
+
+  def heading(self, heading):
+    self.sub(self._open[-1], _HEADING).text = heading
+
+  def end_part(self, kind, eId, node):
+    self._open.pop()
+
+  def start_block(self, block):
+    # A <block><p>text</p></block>.
+    self._open.append(self.sub(self.sub(self._open[-1], _TAGS[block]), _P))
+
+  def end_block(self, block):
+    self._open.pop()
+
+  def text(self, text):
+    _add_text(self._open[-1], text)
+
+  def start_span(self, eId, name):
+    _add_text(self._open[-1], " ")
+    self._open.append(self.sub(self._open[-1], _SPAN, eId=eId))
+
+  def end_span(self, eId, name):
+    self._open.pop().tail = " "
+
+  def result(self):
+    return self.root
+
+def generate_element(node, etree=None):
+  """Return the akomaNtoso element for an Act, or the results of parsing
+  one, built with etree (by default, default_etree())."""
+  if not isinstance(node, Act):
+    node = Act.from_results(node)
+  output = ElementFormat(etree)
+  walk(node, (output,))
+  return output.result()
+
+def generate_akn_tree(text, engine="pyparsing", etree=None):
+  """Parse a CLEAN document with engine, as generate_akn would, and return
+  its akomaNtoso element."""
+  return generate_element(parse_with(text, engine), etree)
@@ -0,0 +1,307 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# A cache of parse trees on disk, so that documents that have not changed
+# since they were last converted are not parsed again.
+#
+#   use_tree_cache("cache/")   # in clean.py
+#   generate_akn(text)         # parses text once, then reads its tree
+#
+#   python -m clean.treecache stats cache/
+#
+# Each entry is a file in the cache directory, named after a digest of a
+# document's text and the version of the parsers that read it, so that
+# trees from older parsers are never reused. A file is TREE_MAGIC, followed
+# by the Act as nested tuples, in marshal's format, compressed with zlib.
+# Loading that is several times faster than the hand-written parser, and
+# far faster than the pyparsing grammar.
+#
+# The files take at most about max_size bytes: when there are more, the
+# ones that were least recently used are removed. Each lookup adds a byte
+# to the directory's stats file, h for a hit or m for a miss, so that the
+# hit rates count every process that used the cache. Once the stats file
+# has STATS_LOG_SIZE bytes, the process that added the last one adds its
+# hits and misses to the totals file, as a line of two numbers, and moves
+# it to stats.old, where stats still finds the recent lookups.
+#
+# A cache is only ever an optimization, so a cache file that can't be read
+# or written is a miss, or is not written, rather than an error.
+
+import argparse
+import marshal
+import os
+import sys
+import zlib
+from hashlib import blake2b
+from .nodes import Act, Section, SubSection, Paragraph, SubParagraph, Span, LegalText, EMPTY_TEXT
+
+TREE_MAGIC = b"CLEANTREE1\n"
+# The default size of a cache, in bytes.
+TREE_CACHE_SIZE = 256 << 20
+# The number of lookups that stats gives the recent hit rate of.
+RECENT_LOOKUPS = 1000
+# The most bytes, so lookups, that the stats file holds before it is
+# moved aside.
+STATS_LOG_SIZE = 1 << 16
+
+_SUFFIX = ".tree"
+_STATS = "stats"
+_OLD_STATS = "stats.old"
+_TOTALS = "totals"
+_MARSHAL_VERSION = 4
+
+# Encoding: each node is a tuple of its fields, lists of parts are tuples
+# or None, and legal text is a tuple of strings and (name, body) spans.
+
+def _encode_text(text):
+  return tuple(element if type(element) == str else (element.name, _encode_text(element.body))
+    for element in text)
+
+def _encode_parts(encode, parts):
+  return None if parts is None else tuple(encode(part) for part in parts)
+
+def _encode_sub_paragraph(node):
+  return (node.index, _encode_text(node.text))
+
+def _encode_paragraph(node):
+  return (node.index, _encode_text(node.text),
+    _encode_parts(_encode_sub_paragraph, node.sub_paragraphs), _encode_text(node.post))
+
+def _encode_sub_section(node):
+  return (node.index, node.heading, _encode_text(node.text),
+    _encode_parts(_encode_paragraph, node.paragraphs), _encode_text(node.post))
+
+def _encode_section(node):
+  return (node.index, node.heading, _encode_text(node.text),
+    _encode_parts(_encode_sub_section, node.sub_sections),
+    _encode_parts(_encode_paragraph, node.paragraphs), _encode_text(node.post), node.source_hash)
+
+def encode_tree(node):
+  """Return the bytes of a cache entry for an Act."""
+  tree = (node.title, _encode_parts(_encode_section, node.body))
+  return TREE_MAGIC + zlib.compress(marshal.dumps(tree, _MARSHAL_VERSION), 1)
+
+def _text(text):
+  if not text:
+    return EMPTY_TEXT
+  return LegalText([element if type(element) == str else Span(element[0], _text(element[1]))
+    for element in text])
+
+def _sub_paragraph(tree):
+  return SubParagraph(tree[0], _text(tree[1]))
+
+def _paragraph(tree):
+  return Paragraph(tree[0], _text(tree[1]),
+    None if tree[2] is None else [_sub_paragraph(part) for part in tree[2]], _text(tree[3]))
+
+def _sub_section(tree):
+  return SubSection(tree[0], tree[1], _text(tree[2]),
+    None if tree[3] is None else [_paragraph(part) for part in tree[3]], _text(tree[4]))
+
+def _section(tree):
+  return Section(tree[0], tree[1], _text(tree[2]),
+    None if tree[3] is None else [_sub_section(part) for part in tree[3]],
+    None if tree[4] is None else [_paragraph(part) for part in tree[4]], _text(tree[5]), tree[6])
+
+def decode_tree(data):
+  """Return the Act in the bytes of a cache entry. Raises ValueError if
+  they are not one."""
+  if not data.startswith(TREE_MAGIC):
+    raise ValueError("Not a CLEAN parse tree")
+  try:
+    title, body = marshal.loads(zlib.decompress(data[len(TREE_MAGIC):]))
+    return Act(title, None if body is None else [_section(part) for part in body])
+  except (zlib.error, EOFError, TypeError, IndexError, ValueError) as error:
+    raise ValueError("Damaged CLEAN parse tree: " + str(error))
+
+class TreeCache:
+  """A cache of the Acts parsed from documents, kept in files in directory,
+  which take at most about max_size bytes. version is part of the key of
+  each document, with its text."""
+
+  def __init__(self, directory, max_size=TREE_CACHE_SIZE, version=""):
+    self.directory = directory
+    self.max_size = max_size
+    self.version = version
+    self.hits = 0
+    self.misses = 0
+    self._size = None # The size of the entries, once it has been counted
+    os.makedirs(directory, exist_ok=True)
+
+  def path(self, text):
+    """The file that the tree for text is kept in."""
+    digest = blake2b(self.version.encode("utf-8") + b"\n", digest_size=16)
+    digest.update(text.encode("utf-8"))
+    return os.path.join(self.directory, digest.hexdigest() + _SUFFIX)
+
+  def get(self, text, parse):
+    """Return the Act for text, calling parse() to make it if it is not in
+    the cache. Damaged entries are parsed again."""
+    path = self.path(text)
+    try:
+      with open(path, "rb") as file:
+        node = decode_tree(file.read())
+    except (OSError, ValueError):
+      node = None
+    else:
+      try:
+        os.utime(path) # Most recently used
+      except OSError: # Evicted by another process, or a read-only cache
+        pass
+    self._count(node is not None)
+    if node is None:
+      node = parse()
+      self._store(path, encode_tree(node))
+    return node
+
+  def _count(self, hit):
+    if hit:
+      self.hits += 1
+    else:
+      self.misses += 1
+    try:
+      # One write of one byte with O_APPEND, so processes never mix them up.
+      log = os.open(os.path.join(self.directory, _STATS), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+      try:
+        os.write(log, b"h" if hit else b"m")
+        full = os.fstat(log).st_size >= STATS_LOG_SIZE
+      finally:
+        os.close(log)
+      if full:
+        self._rotate()
+    except OSError:
+      pass
+
+  def _rotate(self):
+    # Move the stats file to a name of this process's own first, so that
+    # only one process counts each file.
+    log = os.path.join(self.directory, _STATS)
+    moved = "%s.%d" % (log, os.getpid())
+    try:
+      os.rename(log, moved)
+    except FileNotFoundError: # Moved by another process
+      return
+    with open(moved, "rb") as file:
+      lookups = file.read()
+    totals = os.open(os.path.join(self.directory, _TOTALS), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+      os.write(totals, b"%d %d\n" % (lookups.count(b"h"), lookups.count(b"m")))
+    finally:
+      os.close(totals)
+    os.replace(moved, os.path.join(self.directory, _OLD_STATS))
+
+  def _store(self, path, data):
+    # Write to a temporary file first, so that no process ever reads half
+    # an entry.
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    try:
+      try:
+        replaced = os.stat(path).st_size # A damaged entry
+      except FileNotFoundError:
+        replaced = 0
+      with open(temporary, "wb") as file:
+        file.write(data)
+      os.replace(temporary, path)
+      if self._size is None:
+        self._size = sum(size for path, size, used in self._entries())
+      else:
+        self._size += len(data) - replaced
+      if self._size > self.max_size:
+        self.evict()
+    except OSError:
+      try:
+        os.remove(temporary)
+      except OSError:
+        pass
+
+  def _entries(self):
+    # (path, size, time last used) for each entry.
+    with os.scandir(self.directory) as entries:
+      for entry in entries:
+        if entry.name.endswith(_SUFFIX):
+          try:
+            stat = entry.stat()
+          except FileNotFoundError: # Evicted by another process
+            continue
+          yield entry.path, stat.st_size, stat.st_mtime
+
+  def evict(self, max_size=None):
+    """Remove the least recently used entries until they take at most
+    max_size bytes, by default the cache's max_size."""
+    if max_size is None:
+      max_size = self.max_size
+    entries = sorted(self._entries(), key=lambda entry: entry[2])
+    size = sum(entry[1] for entry in entries)
+    for path, entry_size, used in entries:
+      if size <= max_size:
+        break
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      size -= entry_size
+    self._size = size
+
+  def clear(self):
+    """Remove every entry, and the hit and miss counts."""
+    self.evict(0)
+    for name in (_STATS, _OLD_STATS, _TOTALS):
+      try:
+        os.remove(os.path.join(self.directory, name))
+      except FileNotFoundError:
+        pass
+    self.hits = 0
+    self.misses = 0
+
+  def stats(self):
+    """Return the hits, misses and hit rate of this TreeCache, the number
+    of entries and bytes they take, and the lookups, hits and hit rate of
+    every process that used the directory, overall and recently."""
+    entries = list(self._entries())
+    lookups = self.hits + self.misses
+    log = self._read(_STATS)
+    total_hits, total_lookups = log.count(b"h"), len(log)
+    for line in self._read(_TOTALS).splitlines():
+      hits, misses = map(int, line.split())
+      total_hits += hits
+      total_lookups += hits + misses
+    recent = log[-RECENT_LOOKUPS:]
+    if len(recent) < RECENT_LOOKUPS:
+      recent = self._read(_OLD_STATS)[len(recent) - RECENT_LOOKUPS:] + recent
+    return {'hits': self.hits, 'misses': self.misses,
+      'hit rate': self.hits / lookups if lookups else 0.0,
+      'entries': len(entries), 'bytes': sum(entry[1] for entry in entries),
+      'total lookups': total_lookups, 'total hits': total_hits,
+      'total hit rate': total_hits / total_lookups if total_lookups else 0.0,
+      'recent lookups': len(recent),
+      'recent hit rate': recent.count(b"h") / len(recent) if recent else 0.0}
+
+  def _read(self, name):
+    try:
+      with open(os.path.join(self.directory, name), "rb") as file:
+        return file.read()
+    except FileNotFoundError:
+      return b""
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="clean.treecache",
+    description="Report on, or clear, a cache of CLEAN parse trees.")
+  parser.add_argument("command", choices=("stats", "clear"),
+    help="stats to report the cache's size and hit rates, or clear to empty it")
+  parser.add_argument("directory", help="the cache directory")
+  args = parser.parse_args(argv)
+
+  if not os.path.isdir(args.directory):
+    print("No cache in " + args.directory, file=sys.stderr)
+    return 1
+  cache = TreeCache(args.directory)
+  if args.command == "clear":
+    cache.clear()
+    return 0
+  stats = cache.stats()
+  print("%d entries, %.1f MB" % (stats['entries'], stats['bytes'] / (1 << 20)))
+  print("%d lookups, %d hits, hit rate %.1f%%" %
+    (stats['total lookups'], stats['total hits'], 100 * stats['total hit rate']))
+  print("last %d lookups: hit rate %.1f%%" % (stats['recent lookups'], 100 * stats['recent hit rate']))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
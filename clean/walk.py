@@ -0,0 +1,206 @@
+# CLEAN - Canadian Legal Enactments in Akoma Ntoso
+# The walk over a parsed act that the output formats are made by, and the
+# eIds that every output gives its provisions and spans.
+#
+#   walk(act, (JsonFormat(), HtmlFormat()))
+#
+# walks the act once, works out the eId of each provision and span, and
+# calls the same methods of each Format as it goes. The element trees of
+# tree.py and the formats of formats.py are Formats. The write_* functions
+# in clean.py write Akoma Ntoso directly, as that is faster, but take their
+# eIds from part_eId and span_eId, as the walk does.
+#
+# The walk follows the Akoma Ntoso, so a paragraph's wrapup comes after
+# each of its sub-paragraphs, as it always has.
+
+from .nodes import Section, SubSection, Paragraph, SubParagraph
+
+# The eId of a provision is its parent's eId, "__", the prefix of its kind
+# and its index, with the dots of insert indexes as underscores.
+EID_PREFIXES = {Section: "sec", SubSection: "subsec", Paragraph: "para", SubParagraph: "subpara"}
+
+# What comes between a parent's eId and the index of each kind of part.
+_SEPARATORS = {cls: "__" + kind + "_" for cls, kind in EID_PREFIXES.items()}
+
+def part_eId(node, prefix=""):
+  """The eId of a section, sub-section, paragraph or sub-paragraph inside
+  the provision with the eId prefix."""
+  index = node.index
+  if '.' in index: # Most parts have no insert index.
+    index = index.replace('.','_')
+  if prefix:
+    return prefix + _SEPARATORS[type(node)] + index
+  return EID_PREFIXES[type(node)] + "_" + index
+
+def span_eId(name, prefix=""):
+  """The eId of the span with name in the provision or span with the eId
+  prefix. A span's own prefix is prefix + name."""
+  return prefix + ("__span_" if prefix else "") + name
+
+class Format:
+  """An output of a walk. The walk calls these methods in document order,
+  for the act, its title and body, each provision (part), and the heading
+  and text blocks in it. kind is the Akoma Ntoso name of a provision,
+  such as "subSection", and a block is "intro", "content" or "wrapup".
+  Legal text comes as text, with start_span and end_span around each span.
+  Methods that a format does not override are never called."""
+
+  def start_act(self, node):
+    pass
+
+  def title(self, title):
+    pass
+
+  def start_body(self):
+    pass
+
+  def end_body(self):
+    pass
+
+  def end_act(self):
+    pass
+
+  def start_part(self, kind, eId, node):
+    pass
+
+  def heading(self, heading):
+    pass
+
+  def end_part(self, kind, eId, node):
+    pass
+
+  def start_block(self, block):
+    pass
+
+  def end_block(self, block):
+    pass
+
+  def text(self, text):
+    pass
+
+  def start_span(self, eId, name):
+    pass
+
+  def end_span(self, eId, name):
+    pass
+
+  def result(self):
+    """Return the output, once the act has been walked."""
+    raise NotImplementedError
+
+_EVENTS = ('start_act', 'title', 'start_body', 'end_body', 'end_act', 'start_part',
+  'heading', 'end_part', 'start_block', 'end_block', 'text', 'start_span', 'end_span')
+
+class _Events:
+  # For each event, a tuple of the methods of that name of the formats
+  # that override it. The walk calls each in turn itself, rather than
+  # through one function per event, as events come for every piece of
+  # text.
+
+  def __init__(self, formats):
+    for name in _EVENTS:
+      setattr(self, name, tuple(getattr(output, name) for output in formats
+        if getattr(type(output), name) is not getattr(Format, name)))
+
+def _legal_text(text, prefix, events):
+  for element in text:
+    if type(element) == str:
+      if element:
+        for call in events.text:
+          call(element)
+    else: # the only other option is a span
+      eId = span_eId(element.name, prefix)
+      for call in events.start_span:
+        call(eId, element.name)
+      _legal_text(element.body, prefix + element.name, events)
+      for call in events.end_span:
+        call(eId, element.name)
+
+def _block(block, text, prefix, events):
+  for call in events.start_block:
+    call(block)
+  _legal_text(text, prefix, events)
+  for call in events.end_block:
+    call(block)
+
+def _sub_paragraph(node, prefix, events):
+  eId = part_eId(node, prefix)
+  for call in events.start_part:
+    call("subParagraph", eId, node)
+  _block("content", node.text, eId, events)
+  for call in events.end_part:
+    call("subParagraph", eId, node)
+
+def _paragraph(node, prefix, events):
+  eId = part_eId(node, prefix)
+  for call in events.start_part:
+    call("paragraph", eId, node)
+  if node.sub_paragraphs:
+    _block("intro", node.text, eId, events)
+    for sp in node.sub_paragraphs:
+      _sub_paragraph(sp, eId, events)
+      if len(node.post):
+        _block("wrapup", node.post, eId, events)
+  else:
+    _block("content", node.text, eId, events)
+  for call in events.end_part:
+    call("paragraph", eId, node)
+
+def _sub_section(node, prefix, events):
+  eId = part_eId(node, prefix)
+  for call in events.start_part:
+    call("subSection", eId, node)
+  if node.heading:
+    for call in events.heading:
+      call(node.heading)
+  if node.paragraphs:
+    _block("intro", node.text, eId, events)
+    for p in node.paragraphs:
+      _paragraph(p, eId, events)
+    if len(node.post):
+      _block("wrapup", node.post, eId, events)
+  else:
+    _block("content", node.text, eId, events)
+  for call in events.end_part:
+    call("subSection", eId, node)
+
+def _section(node, events):
+  eId = part_eId(node)
+  for call in events.start_part:
+    call("section", eId, node)
+  if node.heading:
+    for call in events.heading:
+      call(node.heading)
+  if node.sub_sections is not None or node.paragraphs is not None:
+    if len(node.text):
+      _block("intro", node.text, eId, events)
+    if node.sub_sections:
+      for p in node.sub_sections:
+        _sub_section(p, eId, events)
+    elif node.paragraphs:
+      for p in node.paragraphs:
+        _paragraph(p, eId, events)
+    if len(node.post):
+      _block("wrapup", node.post, eId, events)
+  elif len(node.text):
+    _block("content", node.text, eId, events)
+  for call in events.end_part:
+    call("section", eId, node)
+
+def walk(node, formats):
+  """Walk an Act, calling the methods of formats."""
+  events = _Events(formats)
+  for call in events.start_act:
+    call(node)
+  if node.title is not None:
+    for call in events.title:
+      call(node.title)
+  if node.body is not None:
+    for call in events.start_body:
+      call()
+    for sec in node.body:
+      _section(sec, events)
+    for call in events.end_body:
+      call()
+  for call in events.end_act:
+    call()